@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, users, projects, progress, blog, community, messages, admin
+from app.api.v1.endpoints import auth, users, projects, progress, blog, community, messages, admin, suggest
 
 api_router = APIRouter()
 
@@ -24,5 +24,8 @@ api_router.include_router(community.router, prefix="/community", tags=["Communit
 # Routes messages
 api_router.include_router(messages.router, prefix="/messages", tags=["Messages"])
 
+# Routes autocomplétion
+api_router.include_router(suggest.router, prefix="/suggest", tags=["Suggest"])
+
 # Routes administration
 api_router.include_router(admin.router, prefix="/admin", tags=["Admin"])
\ No newline at end of file
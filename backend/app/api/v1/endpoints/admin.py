@@ -3,8 +3,14 @@ from typing import List, Dict, Any
 from datetime import datetime, timedelta
 from bson import ObjectId
 
-from app.core.security import get_admin_user
+from app.core.security import get_admin_user, password_hash_pool, user_cache, token_cache
 from app.core.database import get_database
+from app.core.realtime import connection_manager
+from app.core.write_buffer import write_buffer
+from app.core.presence import presence
+from app.core.typeahead import typeahead
+from app.services.message_service import bastion_members_cache
+from app.services.project_service import project_catalog, project_facets_cache
 
 router = APIRouter()
 
@@ -33,6 +39,24 @@ async def admin_dashboard(
         "admin_name": admin_user.get("full_name", admin_user.get("username", "Admin"))
     }
 
+@router.get("/metrics", response_model=Dict[str, Any])
+async def admin_metrics(admin_user = Depends(get_admin_user)):
+    """
+    Métriques internes du serveur (pools, caches)
+    """
+    return {
+        "password_hash_pool": password_hash_pool.stats(),
+        "user_cache": user_cache.stats(),
+        "token_cache": token_cache.stats(),
+        "bastion_members_cache": bastion_members_cache.stats(),
+        "project_catalog": project_catalog.stats(),
+        "project_facets_cache": project_facets_cache.stats(),
+        "write_buffer": write_buffer.stats(),
+        "websockets": connection_manager.stats(),
+        "presence": presence.stats(),
+        "typeahead": typeahead.stats()
+    }
+
 @router.get("/users", response_model=List[Dict[str, Any]])
 async def list_all_users(
     admin_user = Depends(get_admin_user),
@@ -78,6 +102,7 @@ async def toggle_admin_status(
         {"_id": ObjectId(user_id)},
         {"$set": {"is_admin": new_status, "updated_at": datetime.utcnow()}}
     )
+    user_cache.invalidate(user["email"])
     
     return {
         "user_id": str(user["_id"]),
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, WebSocket, WebSocketDisconnect
 from typing import List, Optional
 from datetime import datetime
+from bson import ObjectId
+import json
 
 from app.core.database import get_database
-from app.core.security import get_current_user_token
+from app.core.security import get_current_user_token, verify_token
+from app.core.realtime import connection_manager, chat_channel
+from app.core.presence import presence
 from app.models.messages import (
     ConversationCreate, ConversationResponse, MessageCreate, MessageResponse,
-    BastionCreate, BastionResponse, BastionJoinRequest
+    BastionCreate, BastionResponse, BastionJoinRequest, BastionTagFacet, SyncResponse
 )
-from app.services.message_service import MessageService
+from app.services.message_service import MessageService, InvalidCursorError
 
 router = APIRouter()
 
@@ -47,8 +51,11 @@ async def create_conversation(
 @router.get("/conversations/{conversation_id}/messages", response_model=List[MessageResponse])
 async def get_conversation_messages(
     conversation_id: str,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
     current_user=Depends(get_current_user_token),
     db=Depends(get_database)
 ):
@@ -60,9 +67,21 @@ async def get_conversation_messages(
         )
     
     message_service = MessageService(db)
-    return await message_service.get_conversation_messages(
-        conversation_id, current_user.email, skip, limit
-    )
+    try:
+        messages = await message_service.get_conversation_messages(
+            conversation_id, current_user.email, skip, limit, before, after
+        )
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Curseur invalide"
+        )
+    
+    # Curseur opaque de la page suivante (pagination par position)
+    next_cursor = message_service.next_cursor(messages, limit, after)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return messages
 
 @router.post("/conversations/{conversation_id}/messages", response_model=MessageResponse)
 async def send_message(
@@ -109,6 +128,16 @@ async def get_my_bastions(
     message_service = MessageService(db)
     return await message_service.get_user_bastions(current_user.email)
 
+@router.get("/bastions/tags", response_model=List[BastionTagFacet])
+async def get_bastion_tags(
+    search: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db=Depends(get_database)
+):
+    """Récupérer les tags les plus utilisés par les bastions disponibles"""
+    message_service = MessageService(db)
+    return await message_service.get_bastion_tags(search, limit)
+
 @router.post("/bastions", response_model=BastionResponse)
 async def create_bastion(
     bastion_data: BastionCreate,
@@ -167,8 +196,11 @@ async def leave_bastion(
 @router.get("/bastions/{bastion_id}/messages", response_model=List[MessageResponse])
 async def get_bastion_messages(
     bastion_id: str,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
     current_user=Depends(get_current_user_token),
     db=Depends(get_database)
 ):
@@ -180,9 +212,21 @@ async def get_bastion_messages(
         )
     
     message_service = MessageService(db)
-    return await message_service.get_bastion_messages(
-        bastion_id, current_user.email, skip, limit
-    )
+    try:
+        messages = await message_service.get_bastion_messages(
+            bastion_id, current_user.email, skip, limit, before, after
+        )
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Curseur invalide"
+        )
+    
+    # Curseur opaque de la page suivante (pagination par position)
+    next_cursor = message_service.next_cursor(messages, limit, after)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return messages
 
 @router.post("/bastions/{bastion_id}/messages", response_model=MessageResponse)
 async def send_bastion_message(
@@ -218,4 +262,94 @@ async def add_message_reaction(
         )
     
     message_service = MessageService(db)
-    return await message_service.add_reaction(message_id, emoji, current_user.email)
\ No newline at end of file
+    return await message_service.add_reaction(message_id, emoji, current_user.email)
+
+# SYNCHRONISATION
+@router.get("/sync", response_model=SyncResponse)
+async def sync_messages(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000),
+    current_user=Depends(get_current_user_token),
+    db=Depends(get_database)
+):
+    """Récupérer en une fois tout ce qui a changé depuis la dernière synchronisation"""
+    if current_user.user_type == "guest":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Connexion requise"
+        )
+    
+    message_service = MessageService(db)
+    try:
+        return await message_service.sync(current_user.email, since, limit)
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Curseur invalide"
+        )
+
+# TEMPS RÉEL
+@router.websocket("/ws")
+async def messages_websocket(
+    websocket: WebSocket,
+    token: str = Query(...),
+    db=Depends(get_database)
+):
+    """Recevoir en temps réel les messages des conversations et bastions de l'utilisateur"""
+    try:
+        token_data = verify_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    if token_data.user_type == "guest":
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    message_service = MessageService(db)
+    conversation_ids, bastion_ids = await message_service.get_user_chats(token_data.email)
+    # Type de chaque discussion, pour les accusés de lecture (un bastion rejoint après la
+    # connexion est traité comme une conversation : son écriture ne trouve aucune inbox)
+    bastion_ids = set(bastion_ids)
+
+    await websocket.accept()
+    connection_manager.connect(
+        websocket, token_data.email, [chat_channel(chat_id) for chat_id in [*conversation_ids, *bastion_ids]]
+    )
+    await presence.connect(token_data.email)
+    try:
+        while True:
+            try:
+                event = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+
+            if not isinstance(event, dict):
+                continue
+
+            event_type = event.get("type")
+            if event_type == "ping":
+                await presence.heartbeat(token_data.email)
+                await websocket.send_json({"type": "pong"})
+            elif event_type in ("typing", "read"):
+                # Signaux éphémères : autorisés par les abonnements de la connexion, sans requête
+                conversation_id = str(event.get("conversation_id", ""))
+                if not connection_manager.is_subscribed(websocket, chat_channel(conversation_id)):
+                    continue
+                if event_type == "typing":
+                    await message_service.send_typing(conversation_id, token_data.email)
+                else:
+                    message_id = event.get("message_id")
+                    if message_id is not None and not ObjectId.is_valid(str(message_id)):
+                        continue
+                    await message_service.mark_read(
+                        conversation_id,
+                        token_data.email,
+                        str(message_id) if message_id is not None else None,
+                        is_bastion=conversation_id in bastion_ids
+                    )
+    except WebSocketDisconnect:
+        pass
+    finally:
+        connection_manager.disconnect(websocket)
+        await presence.disconnect(token_data.email)
@@ -1,18 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from typing import List, Optional
 from datetime import datetime
 
 from app.core.database import get_database
 from app.core.security import get_current_user_token
 from app.models.project import (
-    ProjectCreate, ProjectUpdate, ProjectResponse, Project
+    ProjectCreate, ProjectUpdate, ProjectResponse, Project, ProjectStepsPage, ProjectFacets
 )
-from app.services.project_service import ProjectService
+from app.services.project_service import ProjectService, project_catalog
 
 router = APIRouter()
 
+async def not_modified(request: Request, response: Response, db) -> bool:
+    """Poser l'ETag du catalogue; vrai si le client a déjà cette version"""
+    # Charger d'abord : un catalogue expiré change de version en se rechargeant
+    await project_catalog.get(db.projects)
+    etag = project_catalog.etag
+    response.headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
 @router.get("/", response_model=List[ProjectResponse])
 async def get_projects(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     language: Optional[str] = None,
@@ -22,6 +33,10 @@ async def get_projects(
     db=Depends(get_database)
 ):
     """Récupérer la liste des projets avec filtres"""
+    # La recherche interroge MongoDB : seules les listes issues du catalogue sont versionnées
+    if not search and await not_modified(request, response, db):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=response.headers)
+
     project_service = ProjectService(db)
     return await project_service.get_projects(
         skip=skip,
@@ -32,6 +47,28 @@ async def get_projects(
         search=search
     )
 
+@router.get("/facets", response_model=ProjectFacets)
+async def get_project_facets(
+    request: Request,
+    response: Response,
+    language: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    project_type: Optional[str] = None,
+    search: Optional[str] = None,
+    db=Depends(get_database)
+):
+    """Nombre de projets par langage, difficulté et type (barre de filtres)"""
+    if await not_modified(request, response, db):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=response.headers)
+
+    project_service = ProjectService(db)
+    return await project_service.get_facets(
+        language=language,
+        difficulty=difficulty,
+        project_type=project_type,
+        search=search
+    )
+
 @router.get("/{project_id}", response_model=Project)
 async def get_project(project_id: str, db=Depends(get_database)):
     """Récupérer un projet par ID avec toutes ses étapes"""
@@ -44,6 +81,23 @@ async def get_project(project_id: str, db=Depends(get_database)):
         )
     return project
 
+@router.get("/{project_id}/steps", response_model=ProjectStepsPage)
+async def get_project_steps(
+    project_id: str,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(1, ge=1, le=20),
+    db=Depends(get_database)
+):
+    """Récupérer une page d'étapes d'un projet"""
+    project_service = ProjectService(db)
+    page = await project_service.get_project_steps(project_id, skip, limit)
+    if not page:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Projet non trouvé"
+        )
+    return page
+
 @router.post("/", response_model=Project)
 async def create_project(
     project_data: ProjectCreate,
@@ -84,13 +138,19 @@ async def update_project(
     return project
 
 @router.get("/languages/")
-async def get_languages(db=Depends(get_database)):
+async def get_languages(request: Request, response: Response, db=Depends(get_database)):
     """Récupérer tous les langages disponibles"""
+    if await not_modified(request, response, db):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=response.headers)
+
     project_service = ProjectService(db)
     return await project_service.get_languages()
 
 @router.get("/categories/")
-async def get_categories(db=Depends(get_database)):
+async def get_categories(request: Request, response: Response, db=Depends(get_database)):
     """Récupérer toutes les catégories de projets"""
+    if await not_modified(request, response, db):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=response.headers)
+
     project_service = ProjectService(db)
     return await project_service.get_categories()
\ No newline at end of file
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Query
+from typing import List, Optional
+
+from app.core.database import get_database
+from app.models.suggest import Suggestion, SuggestionKindEnum
+from app.services.suggest_service import SuggestService
+
+router = APIRouter()
+
+@router.get("", response_model=List[Suggestion])
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(10, ge=1, le=20),
+    kind: Optional[SuggestionKindEnum] = None,
+    db=Depends(get_database)
+):
+    """Autocomplétion : tags, noms d'utilisateur et catégories commençant par q"""
+    suggest_service = SuggestService(db)
+    return suggest_service.suggest(q, limit, kind.value if kind else None)
@@ -5,6 +5,7 @@ from bson import ObjectId
 from app.models.user import UserInDB, UserResponse, UserUpdate
 from app.core.security import get_current_user
 from app.core.database import get_database
+from app.services.user_service import UserService
 
 router = APIRouter()
 
@@ -38,13 +39,8 @@ async def update_user_me(
     """
     Met à jour les informations de l'utilisateur connecté
     """
-    user_data = user_update.dict(exclude_unset=True)
-    
-    if user_data:
-        update_result = await db["users"].update_one(
-            {"_id": current_user["_id"]}, {"$set": user_data}
-        )
-        if update_result.modified_count == 1:
-            return {**current_user, **user_data}
+    user = await UserService(db).update_user(str(current_user["_id"]), user_update)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
     
-    return current_user
+    return user
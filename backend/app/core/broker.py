@@ -0,0 +1,173 @@
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import json
+import logging
+
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+# Nouvel essai après un envoi en échec : délai doublé à chaque échec, plafonné
+RETRY_DELAY_SECONDS = 0.5
+MAX_RETRY_DELAY_SECONDS = 30
+# Événements gardés par canal pendant une panne (les plus anciens sont abandonnés au-delà)
+MAX_PENDING_EVENTS = 1000
+
+# handler(channel, events) : livre les événements d'un canal aux connexions locales
+BatchHandler = Callable[[str, List[Dict[str, Any]]], Awaitable[None]]
+
+class Broker(ABC):
+    """Diffusion des événements temps réel entre les workers.
+
+    Les événements publiés pendant qu'un envoi est en cours sont regroupés par
+    canal, puis envoyés ensemble : un canal ne coûte qu'une publication par lot,
+    quel que soit le nombre d'abonnés. Un lot dont l'envoi échoue est remis en
+    tête de file et renvoyé après un délai.
+    """
+
+    def __init__(self, handler: BatchHandler):
+        self.handler = handler
+        self.published = 0
+        self.sends = 0
+        self.failures = 0
+        self.dropped = 0
+        self._pending: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sender: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Démarrer le broker (connexion, abonnements)"""
+
+    async def publish(self, channel: str, event: Dict[str, Any]):
+        """Publier un événement sur un canal (envoi groupé en arrière-plan)"""
+        if self._sender is None or self._sender.get_loop() is not asyncio.get_running_loop():
+            self._wakeup = asyncio.Event()
+            self._sender = asyncio.create_task(self._send_loop())
+
+        self._pending[channel].append(event)
+        self.published += 1
+        self._wakeup.set()
+
+    async def _send_loop(self):
+        retry_delay = RETRY_DELAY_SECONDS
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            batch, self._pending = self._pending, defaultdict(list)
+            try:
+                await self._send(batch)
+                self.sends += len(batch)
+                retry_delay = RETRY_DELAY_SECONDS
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"❌ Erreur lors de la publication temps réel (nouvel essai dans {retry_delay:g} s): {e}")
+                self._requeue(batch)
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY_SECONDS)
+                self._wakeup.set()
+
+    def _requeue(self, batch: Dict[str, List[Dict[str, Any]]]):
+        """Remettre un lot non envoyé devant les événements publiés depuis"""
+        for channel, events in batch.items():
+            events = events + self._pending[channel]
+            if len(events) > MAX_PENDING_EVENTS:
+                self.dropped += len(events) - MAX_PENDING_EVENTS
+                events = events[-MAX_PENDING_EVENTS:]
+            self._pending[channel] = events
+
+    @abstractmethod
+    async def _send(self, batch: Dict[str, List[Dict[str, Any]]]):
+        """Envoyer un lot (canal -> événements); lever une exception si l'envoi échoue"""
+
+    async def close(self):
+        if self._sender is not None:
+            self._sender.cancel()
+            self._sender = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "published_events": self.published,
+            "channel_sends": self.sends,
+            "send_failures": self.failures,
+            "dropped_events": self.dropped,
+        }
+
+class InMemoryBroker(Broker):
+    """Broker d'un seul processus : les lots sont livrés directement aux connexions locales"""
+
+    async def _send(self, batch: Dict[str, List[Dict[str, Any]]]):
+        for channel, events in batch.items():
+            # Une erreur de livraison locale n'est pas une panne du transport : pas de nouvel essai
+            try:
+                await self.handler(channel, events)
+            except Exception as e:
+                logger.error(f"❌ Erreur de livraison temps réel ({channel}): {e}")
+
+class RedisBroker(Broker):
+    """Broker partagé entre workers via le pub/sub Redis.
+
+    ``client`` permet de fournir un client déjà construit (par exemple un
+    ``fakeredis.aioredis.FakeRedis`` dans les tests) à la place de ``url``.
+    """
+
+    def __init__(self, handler: BatchHandler, url: Optional[str] = None, client=None, prefix: str = "codeswitch:"):
+        super().__init__(handler)
+        self.url = url
+        self.prefix = prefix
+        self._redis = client
+        # Un client fourni par l'appelant reste à sa charge : close() ne ferme que celui créé ici
+        self._owns_client = client is None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._redis is None:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(self.url)
+
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.psubscribe(f"{self.prefix}*")
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _send(self, batch: Dict[str, List[Dict[str, Any]]]):
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for channel, events in batch.items():
+                pipe.publish(f"{self.prefix}{channel}", json.dumps(jsonable_encoder(events)))
+            await pipe.execute()
+
+    async def _listen(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+
+                # Regrouper par canal tout ce qui est déjà arrivé avant de livrer
+                received: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+                while message is not None:
+                    channel = message["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    received[channel[len(self.prefix):]].extend(json.loads(message["data"]))
+                    message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=0)
+
+                for channel, events in received.items():
+                    await self.handler(channel, events)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Erreur de réception temps réel: {e}")
+                await asyncio.sleep(1)
+
+    async def close(self):
+        await super().close()
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        if self._redis is not None and self._owns_client:
+            await self._redis.aclose()
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Optional
+import time
+
+
+class TTLCache:
+    """Cache LRU en mémoire avec expiration (TTL) par entrée"""
+
+    def __init__(self, max_size: int, ttl: float, enabled: bool = True):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Récupérer une valeur (None si absente, expirée ou cache désactivé)"""
+        if not self.enabled:
+            return None
+
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Stocker une valeur; ttl remplace la durée de vie par défaut"""
+        if not self.enabled:
+            return
+
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, *keys: Hashable):
+        """Retirer des entrées du cache"""
+        for key in keys:
+            self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    @contextmanager
+    def bypass(self):
+        """Désactiver temporairement le cache (tests)"""
+        previous = self.enabled
+        self.enabled = False
+        self.clear()
+        try:
+            yield self
+        finally:
+            self.enabled = previous
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs de succès/échecs"""
+        return {
+            "enabled": self.enabled,
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
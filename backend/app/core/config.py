@@ -18,10 +18,50 @@ class Settings(BaseModel):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     
+    # Hachage des mots de passe (bcrypt hors de la boucle d'événements)
+    PASSWORD_HASH_WORKERS: int = os.cpu_count() or 1
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    
+    # Cache des utilisateurs authentifiés (get_current_user)
+    USER_CACHE_ENABLED: bool = True
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_MAX_SIZE: int = 10000
+    
+    # Cache des tokens JWT déjà vérifiés
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+    
+    # Cache des membres des bastions (autorisation des messages); sans broker, les autres
+    # workers ne reçoivent pas les invalidations : la durée de vie courte s'applique
+    BASTION_MEMBERS_CACHE_TTL_SECONDS: int = 300
+    BASTION_MEMBERS_CACHE_TTL_WITHOUT_BROKER_SECONDS: int = 10
+    BASTION_MEMBERS_CACHE_MAX_SIZE: int = 10000
+    
+    # Facettes de tags des bastions publics
+    BASTION_TAGS_CACHE_TTL_SECONDS: int = 60
+    
+    # Catalogue des projets en mémoire : relu au plus tard après ce délai (écritures des autres workers sans broker)
+    PROJECT_CATALOG_TTL_SECONDS: int = 300
+    
+    # Écritures différées (last_activity des bastions, ...) : au plus une par clé et par intervalle
+    WRITE_BUFFER_FLUSH_SECONDS: float = 5
+    
+    # Indicateurs de frappe relayés au plus une fois par intervalle
+    TYPING_THROTTLE_SECONDS: float = 2
+    
+    # Présence : un utilisateur est hors ligne sans battement (ping WebSocket) pendant ce délai
+    PRESENCE_TTL_SECONDS: int = 60
+    
     # Database
     MONGODB_URL: str = "mongodb://localhost:27017"
     DATABASE_NAME: str = "codeswitch"
     
+    # Stockage des messages : "document" (un document par message) ou "bucket"
+    MESSAGE_STORAGE: str = os.getenv("MESSAGE_STORAGE", "document")
+    MESSAGE_BUCKET_SIZE: int = 200
+    # Compaction des anciens messages en buckets (mode "bucket")
+    MESSAGE_COMPACT_AFTER_HOURS: int = 24
+    MESSAGE_COMPACT_INTERVAL_SECONDS: int = 3600
+    
     # CORS
     ALLOWED_HOSTS: List[str] = [
         "http://localhost:5174",  # React dev server
@@ -30,6 +70,9 @@ class Settings(BaseModel):
         "http://127.0.0.1:5173"
     ]
     
+    # Temps réel et présence : URL Redis partagée entre workers (vide = un seul worker, en mémoire)
+    BROKER_URL: str = os.getenv("BROKER_URL", "")
+    
     # Environment
     ENVIRONMENT: str = "development"
     DEBUG: bool = True
@@ -2,6 +2,7 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ConnectionFailure
 import logging
 from app.core.config import settings
+from app.core.indexes import reconcile_indexes
 
 logger = logging.getLogger(__name__)
 
@@ -38,24 +39,10 @@ async def close_mongo_connection():
         logger.info("🔌 Connexion MongoDB fermée")
 
 async def create_indexes():
-    """Création des index pour optimiser les performances"""
+    """Création des index déclarés par les services pour optimiser les performances"""
     try:
-        # Index pour les utilisateurs
-        await db.database.users.create_index("email", unique=True)
-        await db.database.users.create_index("username", unique=True)
-        
-        # Index pour les projets
-        await db.database.projects.create_index("language")
-        await db.database.projects.create_index("difficulty")
-        await db.database.projects.create_index("type")
-        
-        # Index pour les progressions
-        await db.database.user_progress.create_index([("user_id", 1), ("project_id", 1)], unique=True)
-        
-        # Index pour les badges
-        await db.database.user_badges.create_index("user_id")
-        
+        await reconcile_indexes(db.database)
         logger.info("📊 Index MongoDB créés avec succès")
         
     except Exception as e:
-        logger.error(f"❌ Erreur lors de la création des index: {e}")
\ No newline at end of file
+        logger.error(f"❌ Erreur lors de la création des index: {e}")
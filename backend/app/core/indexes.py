@@ -0,0 +1,128 @@
+"""Registre déclaratif des index MongoDB.
+
+Chaque service déclare les index de ses collections dans une variable de module
+``INDEXES`` (collection -> liste de ``IndexModel``). Au démarrage, ``reconcile_indexes``
+crée les index manquants et signale ceux qui existent en base sans être déclarés,
+ou sous le même nom avec d'autres clés ou options. Seule la ligne de commande
+(``--apply``) supprime et recrée ces derniers.
+
+Usage en ligne de commande (affiche les changements sans les appliquer) :
+    python -m app.core.indexes
+    python -m app.core.indexes --apply
+"""
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import logging
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import IndexModel, TEXT
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Options qui changent le comportement d'un index : une différence impose de le recréer
+COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+def collect_index_specs() -> Dict[str, List[IndexModel]]:
+    """Rassembler les index déclarés par tous les services"""
+    from app.services import (
+        user_service, project_service, blog_service, community_service,
+        message_service, message_store, inbox_service
+    )
+
+    modules = (
+        user_service, project_service, blog_service, community_service,
+        message_service, message_store, inbox_service
+    )
+
+    specs: Dict[str, List[IndexModel]] = {}
+    for module in modules:
+        for collection, models in module.INDEXES.items():
+            specs.setdefault(collection, []).extend(models)
+    return specs
+
+def index_signature(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Clés et options comparables d'un index, déclaré (``IndexModel.document``) ou lu en base
+    (``index_information``)"""
+    key = [(field, kind if isinstance(kind, str) else int(kind)) for field, kind in dict(spec["key"]).items()]
+    signature = {option: spec[option] for option in COMPARED_OPTIONS if spec.get(option)}
+
+    text_fields = [field for field, kind in key if kind == TEXT and field != "_fts"]
+    if text_fields or ("_fts", TEXT) in key:
+        if text_fields:
+            # Forme stockée par le serveur : champs texte remplacés par _fts/_ftsx, poids à part
+            first = next(position for position, (_, kind) in enumerate(key) if kind == TEXT)
+            key = key[:first] + [("_fts", TEXT), ("_ftsx", 1)] + [item for item in key[first:] if item[1] != TEXT]
+        signature["weights"] = {**dict.fromkeys(text_fields, 1), **(spec.get("weights") or {})}
+        signature["default_language"] = spec.get("default_language", "english")
+        signature["language_override"] = spec.get("language_override", "language")
+
+    signature["key"] = key
+    return signature
+
+async def reconcile_indexes(
+    database: AsyncIOMotorDatabase,
+    apply: bool = True,
+    rebuild: bool = False
+) -> Dict[str, Dict[str, List[str]]]:
+    """Comparer les index déclarés à ceux présents en base.
+
+    Retourne, par collection, les index manquants, modifiés (même nom, autres
+    clés ou options) et en trop. Si ``apply`` est vrai, les index manquants
+    sont créés; si ``rebuild`` est vrai, les index modifiés sont supprimés puis
+    recréés. Les index en trop sont seulement signalés, jamais supprimés.
+    """
+    plan = {}
+    for collection, models in collect_index_specs().items():
+        wanted = {model.document["name"]: model for model in models}
+        existing = await database[collection].index_information()
+
+        missing = [name for name in wanted if name not in existing]
+        changed = [
+            name for name, model in wanted.items()
+            if name in existing and index_signature(model.document) != index_signature(existing[name])
+        ]
+        extra = sorted(name for name in existing if name != "_id_" and name not in wanted)
+
+        if rebuild and changed:
+            for name in changed:
+                await database[collection].drop_index(name)
+            await database[collection].create_indexes([wanted[name] for name in changed])
+            logger.info(f"📊 {collection}: index recréés {changed}")
+        else:
+            for name in changed:
+                logger.warning(f"⚠️ {collection}: index '{name}' différent de sa déclaration")
+
+        if apply and missing:
+            await database[collection].create_indexes([wanted[name] for name in missing])
+            logger.info(f"📊 {collection}: index créés {missing}")
+
+        for name in extra:
+            logger.warning(f"⚠️ {collection}: index non déclaré '{name}'")
+
+        plan[collection] = {"missing": missing, "changed": changed, "extra": extra}
+
+    return plan
+
+async def _main(apply: bool):
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    try:
+        plan = await reconcile_indexes(client[settings.DATABASE_NAME], apply=apply, rebuild=apply)
+    finally:
+        client.close()
+
+    for collection, changes in sorted(plan.items()):
+        for name in changes["missing"]:
+            print(f"{'created' if apply else 'create'}  {collection}.{name}")
+        for name in changes["changed"]:
+            print(f"{'rebuilt' if apply else 'rebuild'}  {collection}.{name}")
+        for name in changes["extra"]:
+            print(f"extra   {collection}.{name}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Réconcilier les index MongoDB déclarés par les services")
+    parser.add_argument("--apply", action="store_true", help="créer les index manquants, recréer les index modifiés")
+    args = parser.parse_args()
+    asyncio.run(_main(args.apply))
@@ -0,0 +1,194 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+import math
+import time
+
+from app.core.config import settings
+
+class InMemoryPresenceBackend:
+    """Dates d'expiration de présence d'un seul processus, réparties en shards.
+
+    Chaque shard garde un dict email -> expiration (lecture en O(1) par email)
+    et un tas des expirations : les entrées expirées sont retirées au fil de
+    l'eau, ce qui permet de tenir le nombre de présents à jour sans parcours.
+    """
+
+    def __init__(self, shards: int = 16):
+        self._expires: List[Dict[str, float]] = [{} for _ in range(shards)]
+        self._heaps: List[List[Tuple[float, str]]] = [[] for _ in range(shards)]
+        self._connections: Dict[str, int] = {}
+        self._size = 0
+
+    def _shard(self, email: str) -> int:
+        return hash(email) % len(self._expires)
+
+    async def connect(self, email: str, expires_at: float):
+        self._connections[email] = self._connections.get(email, 0) + 1
+        await self.touch(email, expires_at)
+
+    async def touch(self, email: str, expires_at: float):
+        shard = self._shard(email)
+        expires, heap = self._expires[shard], self._heaps[shard]
+        if email not in expires:
+            self._size += 1
+        expires[email] = expires_at
+        heapq.heappush(heap, (expires_at, email))
+        # Chaque battement ajoute une entrée au tas : au-delà de deux par utilisateur,
+        # le tas est reconstruit avec la seule expiration courante de chacun
+        if len(heap) > 2 * len(expires) + 16:
+            heap[:] = [(expires_at, email) for email, expires_at in expires.items()]
+            heapq.heapify(heap)
+
+    async def disconnect(self, email: str):
+        remaining = self._connections.get(email, 0) - 1
+        if remaining > 0:
+            self._connections[email] = remaining
+            return
+        self._connections.pop(email, None)
+        if self._expires[self._shard(email)].pop(email, None) is not None:
+            self._size -= 1
+
+    async def online(self, emails: List[str], now: float) -> Set[str]:
+        return {
+            email for email in emails
+            if self._expires[self._shard(email)].get(email, 0) > now
+        }
+
+    async def count(self, now: float) -> int:
+        for expires, heap in zip(self._expires, self._heaps):
+            while heap and heap[0][0] <= now:
+                expires_at, email = heapq.heappop(heap)
+                # Entrée périmée du tas : l'utilisateur a renouvelé sa présence depuis
+                if expires.get(email) == expires_at:
+                    del expires[email]
+                    self._size -= 1
+        return self._size
+
+    async def close(self):
+        pass
+
+class RedisPresenceBackend:
+    """Présence partagée entre workers : un sorted set Redis email -> expiration.
+
+    Le nombre de connexions ouvertes de chaque utilisateur, tous workers
+    confondus, est compté dans Redis : fermer une connexion ne retire la
+    présence que s'il n'en reste aucune. Le compteur expire avec la présence,
+    au cas où un worker s'arrêterait sans fermer ses connexions.
+
+    ``client`` permet de fournir un client déjà construit (par exemple un
+    ``fakeredis.aioredis.FakeRedis`` dans les tests) à la place de ``url``.
+    """
+
+    def __init__(self, url: Optional[str] = None, client=None, prefix: str = "codeswitch:"):
+        # Un client fourni par l'appelant reste à sa charge : close() ne ferme que celui créé ici
+        self._owns_client = client is None
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url)
+        self._redis = client
+        self.key = f"{prefix}presence"
+        self.prefix = prefix
+
+    def _connections_key(self, email: str) -> str:
+        return f"{self.prefix}presence:connections:{email}"
+
+    async def connect(self, email: str, expires_at: float):
+        key = self._connections_key(email)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.incr(key)
+            pipe.expireat(key, math.ceil(expires_at))
+            pipe.zadd(self.key, {email: expires_at})
+            await pipe.execute()
+
+    async def touch(self, email: str, expires_at: float):
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.expireat(self._connections_key(email), math.ceil(expires_at))
+            pipe.zadd(self.key, {email: expires_at})
+            await pipe.execute()
+
+    async def disconnect(self, email: str):
+        from redis.exceptions import WatchError
+
+        key = self._connections_key(email)
+        if await self._redis.decr(key) > 0:
+            return
+
+        # Dernière connexion : retirer la présence, sauf si une connexion s'ouvre entre-temps
+        async with self._redis.pipeline() as pipe:
+            try:
+                await pipe.watch(key)
+                remaining = await pipe.get(key)
+                if remaining is not None and int(remaining) > 0:
+                    return
+                pipe.multi()
+                pipe.delete(key)
+                pipe.zrem(self.key, email)
+                await pipe.execute()
+            except WatchError:
+                pass
+
+    async def online(self, emails: List[str], now: float) -> Set[str]:
+        if not emails:
+            return set()
+        scores = await self._redis.zmscore(self.key, emails)
+        return {email for email, score in zip(emails, scores) if score is not None and score > now}
+
+    async def count(self, now: float) -> int:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self.key, "-inf", now)
+            pipe.zcard(self.key)
+            _, size = await pipe.execute()
+        return size
+
+    async def close(self):
+        if self._owns_client:
+            await self._redis.aclose()
+
+class PresenceService:
+    """Présence des utilisateurs, entretenue par leurs connexions WebSocket.
+
+    Un utilisateur est en ligne tant qu'il a une connexion ouverte et qu'il
+    envoie un battement (ping) avant l'expiration de ``ttl`` secondes.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.backend = InMemoryPresenceBackend()
+        self._local_connections: Dict[str, int] = {}
+
+    async def use_backend(self, backend):
+        """Remplacer le stockage (par exemple Redis quand plusieurs workers tournent)"""
+        await self.backend.close()
+        self.backend = backend
+
+    async def connect(self, email: str):
+        self._local_connections[email] = self._local_connections.get(email, 0) + 1
+        await self.backend.connect(email, time.time() + self.ttl)
+
+    async def heartbeat(self, email: str):
+        await self.backend.touch(email, time.time() + self.ttl)
+
+    async def disconnect(self, email: str):
+        remaining = self._local_connections.get(email, 0) - 1
+        if remaining > 0:
+            self._local_connections[email] = remaining
+        else:
+            self._local_connections.pop(email, None)
+        # Le stockage compte les connexions de tous les workers
+        await self.backend.disconnect(email)
+
+    async def online_emails(self, emails: Iterable[str]) -> Set[str]:
+        """Parmi ces emails, ceux des utilisateurs en ligne (une seule lecture pour tout le lot)"""
+        return await self.backend.online(list(set(emails)), time.time())
+
+    async def count(self) -> int:
+        """Nombre d'utilisateurs en ligne"""
+        return await self.backend.count(time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "local_users": len(self._local_connections),
+        }
+
+presence = PresenceService(settings.PRESENCE_TTL_SECONDS)
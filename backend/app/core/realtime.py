@@ -0,0 +1,124 @@
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Set
+import asyncio
+import json
+import logging
+
+from fastapi import WebSocket
+from fastapi.encoders import jsonable_encoder
+
+from app.core.broker import Broker, InMemoryBroker
+
+logger = logging.getLogger(__name__)
+
+def chat_channel(conversation_id: str) -> str:
+    """Canal d'une conversation directe ou d'un bastion"""
+    return f"chat:{conversation_id}"
+
+def user_channel(email: str) -> str:
+    """Canal personnel d'un utilisateur (abonnements, notifications)"""
+    return f"user:{email}"
+
+class ConnectionManager:
+    """Connexions WebSocket actives de ce processus, regroupées par canal"""
+
+    def __init__(self):
+        self._channels: Dict[str, Set[WebSocket]] = defaultdict(set)
+        self._subscriptions: Dict[WebSocket, Set[str]] = {}
+        self._listeners: Dict[str, List[Callable[[List[Dict[str, Any]]], None]]] = defaultdict(list)
+        self.broker: Broker = InMemoryBroker(self.dispatch)
+
+    async def use_broker(self, broker: Broker):
+        """Remplacer le broker (par exemple Redis quand plusieurs workers tournent)"""
+        await self.broker.close()
+        self.broker = broker
+        await broker.start()
+
+    def listen(self, channel: str, callback: Callable[[List[Dict[str, Any]]], None]):
+        """Recevoir dans ce processus les événements d'un canal interne (invalidation de caches, ...)"""
+        self._listeners[channel].append(callback)
+
+    def connect(self, websocket: WebSocket, email: str, channels: Iterable[str]):
+        """Enregistrer une connexion et l'abonner à ses canaux"""
+        self._subscriptions[websocket] = set()
+        for channel in [user_channel(email), *channels]:
+            self._subscribe(websocket, channel)
+
+    def disconnect(self, websocket: WebSocket):
+        for channel in self._subscriptions.pop(websocket, set()):
+            sockets = self._channels.get(channel)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets:
+                    del self._channels[channel]
+
+    def is_subscribed(self, websocket: WebSocket, channel: str) -> bool:
+        """La connexion est-elle abonnée à ce canal (autorisation des signaux envoyés par le client)"""
+        return channel in self._subscriptions.get(websocket, ())
+
+    def _subscribe(self, websocket: WebSocket, channel: str):
+        self._channels[channel].add(websocket)
+        self._subscriptions[websocket].add(channel)
+
+    def _unsubscribe(self, websocket: WebSocket, channel: str):
+        self._subscriptions[websocket].discard(channel)
+        sockets = self._channels.get(channel)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self._channels[channel]
+
+    async def subscribe_users(self, emails: Iterable[str], channel: str):
+        """Abonner les connexions de ces utilisateurs à un nouveau canal"""
+        for email in emails:
+            await self.publish(user_channel(email), {"type": "subscribe", "target": channel})
+
+    async def unsubscribe_users(self, emails: Iterable[str], channel: str):
+        for email in emails:
+            await self.publish(user_channel(email), {"type": "unsubscribe", "target": channel})
+
+    async def publish(self, channel: str, event: Dict[str, Any]):
+        """Diffuser un événement à toutes les connexions abonnées au canal, sur tous les workers"""
+        await self.broker.publish(channel, event)
+
+    async def dispatch(self, channel: str, events: List[Dict[str, Any]]):
+        """Livrer les événements d'un canal aux connexions locales, en une seule trame"""
+        for callback in self._listeners.get(channel, ()):
+            callback(events)
+
+        sockets = list(self._channels.get(channel, ()))
+        if not sockets:
+            return
+
+        # Les changements d'abonnement sont appliqués ici, là où vivent les connexions
+        for event in events:
+            if event.get("type") == "subscribe":
+                for websocket in sockets:
+                    self._subscribe(websocket, event["target"])
+            elif event.get("type") == "unsubscribe":
+                for websocket in sockets:
+                    self._unsubscribe(websocket, event["target"])
+
+        # Sérialiser une seule fois pour tous les destinataires
+        frames = [{**jsonable_encoder(event), "channel": channel} for event in events]
+        if len(frames) == 1:
+            payload = json.dumps(frames[0])
+        else:
+            payload = json.dumps({"type": "batch", "channel": channel, "events": frames})
+        results = await asyncio.gather(
+            *(websocket.send_text(payload) for websocket in sockets),
+            return_exceptions=True
+        )
+        for websocket, result in zip(sockets, results):
+            if isinstance(result, Exception):
+                logger.info(f"🔌 WebSocket fermé pendant l'envoi: {result}")
+                self.disconnect(websocket)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "connections": len(self._subscriptions),
+            "channels": len(self._channels),
+            "broker": self.broker.stats(),
+        }
+
+connection_manager = ConnectionManager()
@@ -0,0 +1,176 @@
+"""Recherche plein texte sur les index texte MongoDB.
+
+Chaque collection cherchable déclare un index ``TEXT`` pondéré (voir les
+``INDEXES`` des services). La saisie de l'utilisateur n'est jamais interprétée :
+guillemets (recherche de phrase) et « - » initial (exclusion) sont retirés
+avant d'être passés à ``$text``.
+
+Les contenus des utilisateurs sont en français ou en anglais : chaque document
+porte la langue détectée à l'écriture (``LANGUAGE_FIELD``), utilisée par MongoDB
+pour raciniser ses mots (« projets » et « projet », « tutorials » et « tutorial »).
+Une recherche courte ne contient souvent aucun mot-outil : elle est alors faite
+dans les deux langues (voir ``find_by_relevance``).
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import re
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import IndexModel, DESCENDING, TEXT
+
+# Nombre maximum de termes pris en compte (chaque terme ajoute un parcours d'index)
+MAX_TERMS = 10
+
+# Pertinence calculée par MongoDB pour une requête $text
+TEXT_SCORE = {"$meta": "textScore"}
+
+# Langue de racinisation d'un document (le champ par défaut, « language », désigne
+# le langage de programmation des projets)
+LANGUAGE_FIELD = "search_language"
+DEFAULT_LANGUAGE = "french"
+
+# Mots-outils les plus fréquents, suffisants pour distinguer français et anglais
+FRENCH_STOPWORDS = frozenset(
+    "le la les un une des du de et est sont en dans pour que qui sur pas avec au aux ce cette "
+    "ces son sa ses plus par mais nous vous ils elle je tu comment pourquoi quel quelle".split()
+)
+ENGLISH_STOPWORDS = frozenset(
+    "the an and is are of to in for that with this it be by or not how why what which "
+    "your you from can will have has do does my i".split()
+)
+
+_WORD = re.compile(r"[a-zà-ÿ']+")
+
+def _stopword_counts(texts: Tuple[Optional[str], ...]) -> Tuple[int, int]:
+    """(mots-outils français, mots-outils anglais) des textes"""
+    french = english = 0
+    for text in texts:
+        for word in _WORD.findall((text or "").lower()):
+            french += word in FRENCH_STOPWORDS
+            english += word in ENGLISH_STOPWORDS
+    return french, english
+
+def detect_language(*texts: Optional[str]) -> str:
+    """Langue de racinisation d'un texte : "english" si les mots-outils anglais dominent, sinon le français"""
+    french, english = _stopword_counts(texts)
+    return "english" if english > french else DEFAULT_LANGUAGE
+
+def query_languages(terms: str) -> Tuple[str, ...]:
+    """Langues dans lesquelles chercher : celle que désignent les mots-outils, les deux s'ils ne tranchent pas"""
+    french, english = _stopword_counts((terms,))
+    if french == english:
+        return (DEFAULT_LANGUAGE, "english")
+    return ("english",) if english > french else (DEFAULT_LANGUAGE,)
+
+def text_index(name: str, weights: Dict[str, int]) -> IndexModel:
+    """Index texte pondéré, racinisé selon la langue détectée de chaque document"""
+    return IndexModel(
+        [(field, TEXT) for field in weights],
+        weights=weights,
+        default_language=DEFAULT_LANGUAGE,
+        language_override=LANGUAGE_FIELD,
+        name=name
+    )
+
+def sanitize_text_search(search: Optional[str]) -> str:
+    """Termes de recherche sûrs pour $text (chaîne vide si rien à chercher)"""
+    if not search:
+        return ""
+
+    terms = []
+    for term in search.split():
+        term = term.replace('"', "").replace("\\", "").lstrip("-")
+        if term:
+            terms.append(term)
+    return " ".join(terms[:MAX_TERMS])
+
+def text_filter(terms: str, language: Optional[str] = None) -> dict:
+    """Filtre $text; ``language`` choisit la racinisation des termes recherchés"""
+    if language:
+        return {"$text": {"$search": terms, "$language": language}}
+    return {"$text": {"$search": terms}}
+
+def text_sort(*then: Tuple[str, int]) -> List[tuple]:
+    """Tri par pertinence, puis par les clés données pour départager"""
+    return [("score", TEXT_SCORE), *then]
+
+async def find_by_relevance(
+    collection: AsyncIOMotorCollection,
+    query: dict,
+    projection: Optional[Dict[str, Any]],
+    then: List[Tuple[str, int]],
+    skip: int,
+    limit: int
+) -> List[dict]:
+    """Résultats d'une requête $text, les plus pertinents d'abord puis selon ``then``.
+
+    Si la recherche ne désigne pas de langue, elle est faite racinisée en
+    français et en anglais (deux requêtes) : chaque document garde sa meilleure
+    pertinence.
+    """
+    projection = {**(projection or {}), "score": TEXT_SCORE}
+    terms = query["$text"]["$search"]
+    languages = query_languages(terms)
+
+    if len(languages) == 1:
+        cursor = collection.find({**query, **text_filter(terms, languages[0])}, projection)
+        return await cursor.sort(text_sort(*then)).skip(skip).limit(limit).to_list(length=limit)
+
+    results = await asyncio.gather(*(
+        collection.find({**query, **text_filter(terms, language)}, projection)
+        .sort(text_sort(*then)).limit(skip + limit).to_list(length=skip + limit)
+        for language in languages
+    ))
+    best: Dict[Any, dict] = {}
+    for document in (document for result in results for document in result):
+        known = best.get(document["_id"])
+        if known is None or document["score"] > known["score"]:
+            best[document["_id"]] = document
+
+    # Tris stables : clés secondaires d'abord, pertinence en dernier
+    matches = list(best.values())
+    for field, direction in reversed(then):
+        matches.sort(key=lambda document: document[field], reverse=direction == DESCENDING)
+    matches.sort(key=lambda document: document["score"], reverse=True)
+    return matches[skip:skip + limit]
+
+async def text_match(collection: AsyncIOMotorCollection, query: dict) -> dict:
+    """Filtre équivalent à une requête $text, utilisable dans une agrégation.
+
+    Une recherche qui désigne une langue garde la requête telle quelle; sinon
+    ($text n'est accepté qu'une fois par requête) les documents trouvés dans
+    chaque langue sont désignés par leur _id, comme dans ``find_by_relevance``.
+    """
+    terms = query["$text"]["$search"]
+    languages = query_languages(terms)
+    if len(languages) == 1:
+        return {**query, **text_filter(terms, languages[0])}
+
+    results = await asyncio.gather(*(
+        collection.find({**query, **text_filter(terms, language)}, {"_id": 1}).to_list(length=None)
+        for language in languages
+    ))
+    return {"_id": {"$in": list({document["_id"] for result in results for document in result})}}
+
+async def refresh_search_language(
+    collection: AsyncIOMotorCollection,
+    previous: dict,
+    update: dict,
+    fields: Tuple[str, ...]
+):
+    """Recalculer la langue d'un document modifié à partir de tous ses champs texte.
+
+    ``previous`` est le document avant la modification (avec ``fields`` et
+    ``LANGUAGE_FIELD``), ``update`` les champs modifiés. La langue n'est écrite
+    que si les champs texte n'ont pas changé depuis.
+    """
+    if not any(field in update for field in fields):
+        return
+
+    merged = {field: update.get(field, previous.get(field)) for field in fields}
+    language = detect_language(*merged.values())
+    if language != previous.get(LANGUAGE_FIELD, DEFAULT_LANGUAGE):
+        await collection.update_one(
+            {"_id": previous["_id"], **merged},
+            {"$set": {LANGUAGE_FIELD: language}}
+        )
@@ -1,17 +1,35 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Callable, Dict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
 from app.core.config import settings
+from app.core.cache import TTLCache
 from app.models.auth import TokenData
 from app.core.database import get_database
 
 # Configuration du hachage des mots de passe
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Cache des documents utilisateurs (sans le hash du mot de passe), indexé par email
+user_cache = TTLCache(
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+    enabled=settings.USER_CACHE_ENABLED
+)
+
+# Cache des tokens décodés, indexé par empreinte SHA-256 du token (valide jusqu'à son exp)
+token_cache = TTLCache(
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+
 # Configuration OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
@@ -23,6 +41,61 @@ def get_password_hash(password: str) -> str:
     """Hacher un mot de passe"""
     return pwd_context.hash(password)
 
+class PasswordHashPool:
+    """Exécuteur borné pour bcrypt, afin de ne pas bloquer la boucle d'événements"""
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+
+    async def run(self, func: Callable, *args):
+        """Exécuter une opération de hachage dans le pool (503 si la file est pleine)"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Trop de connexions simultanées, veuillez réessayer",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Métriques du pool (profondeur de file, rejets)"""
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "running": min(self.pending, self.max_workers),
+            "queued": max(0, self.pending - self.max_workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+password_hash_pool = PasswordHashPool(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Vérifier un mot de passe sans bloquer la boucle d'événements"""
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hacher un mot de passe sans bloquer la boucle d'événements"""
+    return await password_hash_pool.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Créer un token JWT"""
     to_encode = data.copy()
@@ -37,6 +110,11 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def verify_token(token: str) -> TokenData:
     """Vérifier et décoder un token JWT"""
+    token_digest = hashlib.sha256(token.encode()).digest()
+    cached = token_cache.get(token_digest)
+    if cached is not None:
+        return cached
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         email: str = payload.get("sub")
@@ -50,6 +128,11 @@ def verify_token(token: str) -> TokenData:
             )
         
         token_data = TokenData(email=email, user_type=user_type)
+        
+        # Mémoriser le résultat jusqu'à l'expiration du token
+        exp = payload.get("exp")
+        if exp is not None:
+            token_cache.set(token_digest, token_data, ttl=exp - time.time())
         return token_data
         
     except JWTError:
@@ -78,15 +161,18 @@ async def get_current_user(token_data: TokenData = Depends(get_current_user_toke
             "created_at": datetime.utcnow()
         }
     
-    # Pour les utilisateurs normaux, chercher dans la base de données
-    user = await db["users"].find_one({"email": token_data.email})
+    # Pour les utilisateurs normaux, chercher dans le cache puis dans la base de données
+    user = user_cache.get(token_data.email)
     if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Utilisateur non trouvé"
-        )
+        user = await db["users"].find_one({"email": token_data.email}, {"hashed_password": 0})
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Utilisateur non trouvé"
+            )
+        user_cache.set(token_data.email, user)
     
-    return user
+    return dict(user)
 
 async def get_admin_user(current_user = Depends(get_current_user)):
     """Vérifier si l'utilisateur actuel est un administrateur"""
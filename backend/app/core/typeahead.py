@@ -0,0 +1,204 @@
+"""Autocomplétion : index de préfixes en mémoire (tags, noms d'utilisateur, catégories).
+
+Les entrées sont gardées dans un tableau trié par clé normalisée (minuscules,
+sans accents) : un préfixe correspond à une tranche contiguë, trouvée par
+recherche dichotomique. Chaque entrée porte son nombre d'utilisations, qui sert
+au classement des suggestions. Les préfixes d'un ou deux caractères couvrent
+une trop grande part de l'index pour être parcourus à chaque requête : leurs
+correspondances sont tenues à jour à chaque changement.
+
+Les services publient les changements d'utilisation sur un canal interne :
+chaque worker les applique à son propre index.
+"""
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import heapq
+import logging
+import unicodedata
+
+from app.core.realtime import connection_manager
+
+logger = logging.getLogger(__name__)
+
+TAG = "tag"
+USER = "user"
+CATEGORY = "category"
+
+# Suggestions mémorisées entre deux changements de l'index (préfixes courts, coûteux à parcourir)
+CACHE_MAX_SIZE = 1000
+
+# Préfixes dont les correspondances sont tenues à jour plutôt que parcourues
+SHORT_PREFIX_LENGTH = 2
+
+# Canal interne : changements d'utilisation, appliqués par tous les workers
+TYPEAHEAD_CHANNEL = "system:typeahead"
+
+def normalize(text: str) -> str:
+    """Clé de recherche : minuscules, sans accents"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold().strip())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+class PrefixIndex:
+    """Suggestions par préfixe, classées par nombre d'utilisations"""
+
+    def __init__(self):
+        self._entries: List[Tuple[str, str, str]] = []  # (clé normalisée, type, valeur), triées
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._cache: Dict[Tuple[str, int, Optional[str]], List[Tuple[str, str, int]]] = {}
+        # (préfixe court, type ou None) -> variantes fusionnées de chaque valeur correspondante
+        self._short: Dict[Tuple[str, Optional[str]], Dict[Tuple[str, str], List]] = {}
+        self.queries = 0
+
+    def replace(self, counts: Dict[Tuple[str, str], int]):
+        """Reconstruire l'index à partir de compteurs complets"""
+        counts = {key: count for key, count in counts.items() if count > 0 and normalize(key[1])}
+        self._entries = sorted((normalize(value), kind, value) for kind, value in counts)
+        self._counts = counts
+        self._cache.clear()
+        self._short = {}
+        group = None
+        for normalized, kind, value in self._entries:
+            count = counts[(kind, value)]
+            if group is not None and group[4] == normalized and group[0] == kind:
+                if count > group[3]:
+                    group[1], group[3] = value, count
+                group[2] += count
+            else:
+                group = [kind, value, count, count, normalized]
+                self._index_short(normalized, kind, group)
+
+    def add(self, kind: str, value: str, delta: int = 1):
+        """Ajouter (ou retirer, delta négatif) des utilisations d'une valeur"""
+        key = (kind, value)
+        entry = (normalize(value), kind, value)
+        if not entry[0]:
+            return
+
+        self._cache.clear()
+        count = self._counts.get(key, 0) + delta
+        if count > 0:
+            if key not in self._counts:
+                insort(self._entries, entry)
+            self._counts[key] = count
+        elif key in self._counts:
+            del self._counts[key]
+            del self._entries[bisect_left(self._entries, entry)]
+        else:
+            return
+        self._index_short(entry[0], kind, self._group(entry[0], kind))
+
+    def _group(self, normalized: str, kind: str) -> Optional[List]:
+        """Variantes d'une valeur (« Python », « python ») fusionnées sous la plus utilisée :
+        [type, valeur, utilisations, utilisations de la valeur, clé normalisée]"""
+        group = None
+        for index in range(bisect_left(self._entries, (normalized, kind)), len(self._entries)):
+            entry_normalized, entry_kind, value = self._entries[index]
+            if entry_normalized != normalized or entry_kind != kind:
+                break
+            count = self._counts[(kind, value)]
+            if group is None:
+                group = [kind, value, count, count, normalized]
+            else:
+                if count > group[3]:
+                    group[1], group[3] = value, count
+                group[2] += count
+        return group
+
+    def _index_short(self, normalized: str, kind: str, group: Optional[List]):
+        """Reporter les variantes fusionnées d'une valeur (None : retirée) dans ses préfixes courts"""
+        for length in range(1, min(len(normalized), SHORT_PREFIX_LENGTH) + 1):
+            for key in ((normalized[:length], kind), (normalized[:length], None)):
+                groups = self._short.setdefault(key, {})
+                if group is None:
+                    groups.pop((normalized, kind), None)
+                else:
+                    groups[(normalized, kind)] = group
+
+    def count(self, kind: str, value: str) -> int:
+        return self._counts.get((kind, value), 0)
+
+    def suggest(self, prefix: str, limit: int = 10, kind: Optional[str] = None) -> List[Tuple[str, str, int]]:
+        """Valeurs commençant par ``prefix`` : (type, valeur, utilisations), les plus utilisées d'abord"""
+        self.queries += 1
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        cache_key = (prefix, limit, kind)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        if len(prefix) <= SHORT_PREFIX_LENGTH:
+            matches = self._short.get((prefix, kind), {}).values()
+        else:
+            # Les variantes d'une même valeur (« Python », « python ») sont adjacentes :
+            # elles sont fusionnées sous la plus utilisée
+            merged: Dict[Tuple[str, str], List] = {}
+            for index in range(bisect_left(self._entries, (prefix,)), len(self._entries)):
+                normalized, entry_kind, value = self._entries[index]
+                if not normalized.startswith(prefix):
+                    break
+                if kind is not None and entry_kind != kind:
+                    continue
+                count = self._counts[(entry_kind, value)]
+                match = merged.get((normalized, entry_kind))
+                if match is None:
+                    merged[(normalized, entry_kind)] = [entry_kind, value, count, count, normalized]
+                else:
+                    if count > match[3]:
+                        match[1], match[3] = value, count
+                    match[2] += count
+            matches = merged.values()
+
+        # À égalité, ordre alphabétique
+        best = heapq.nsmallest(limit, matches, key=lambda match: (-match[2], match[4], match[0]))
+        suggestions = [(entry_kind, value, count) for entry_kind, value, count, _, _ in best]
+
+        if len(self._cache) >= CACHE_MAX_SIZE:
+            self._cache.clear()
+        self._cache[cache_key] = suggestions
+        return suggestions
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "cached": len(self._cache),
+            "queries": self.queries,
+        }
+
+typeahead = PrefixIndex()
+
+def content_usage(tags: Optional[Iterable[str]], category: Optional[str]) -> Counter:
+    """Utilisations (type, valeur) -> nombre apportées par un contenu : ses tags et sa catégorie"""
+    usage = Counter((TAG, tag) for tag in tags or [])
+    if category:
+        usage[(CATEGORY, category)] += 1
+    return usage
+
+async def record_usage(before: Counter, after: Counter):
+    """Publier la différence d'utilisations entre deux versions d'un contenu"""
+    changes = []
+    for kind, value in before.keys() | after.keys():
+        delta = after[(kind, value)] - before[(kind, value)]
+        if delta:
+            changes.append([kind, value, delta])
+    if not changes:
+        return
+
+    # L'écriture du contenu a déjà réussi : une suggestion manquante ne doit pas la faire échouer
+    event = {"type": "usage", "changes": changes}
+    try:
+        await connection_manager.publish(TYPEAHEAD_CHANNEL, event)
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de la publication des suggestions: {e}")
+        # Sans broker, au moins l'index de cette instance reste à jour
+        _apply([event])
+
+def _apply(events: List[Dict[str, Any]]):
+    for event in events:
+        for kind, value, delta in event["changes"]:
+            typeahead.add(kind, value, delta)
+
+connection_manager.listen(TYPEAHEAD_CHANNEL, _apply)
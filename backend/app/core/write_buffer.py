@@ -0,0 +1,72 @@
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Optional, Tuple, Union
+import asyncio
+import logging
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class WriteBuffer:
+    """Mises à jour différées, regroupées par clé et écrites par lots.
+
+    Une nouvelle mise à jour pour une clé déjà en attente remplace la
+    précédente : chaque clé coûte au plus une écriture par intervalle, quel
+    que soit le nombre d'appels. À réserver aux données qui tolèrent quelques
+    secondes de retard (dates d'activité, positions de lecture).
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.scheduled = 0
+        self.written = 0
+        self._pending: Dict[Hashable, Tuple[AsyncIOMotorCollection, UpdateOne]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    def schedule(self, key: Hashable, collection: AsyncIOMotorCollection, filter: dict, update: Union[dict, list]):
+        """Programmer une mise à jour (remplace celle déjà en attente pour la même clé)"""
+        if self._flusher is None or self._flusher.get_loop() is not asyncio.get_running_loop():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+        self._pending[key] = (collection, UpdateOne(filter, update))
+        self.scheduled += 1
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        """Écrire toutes les mises à jour en attente, un bulk_write par collection"""
+        pending, self._pending = self._pending, {}
+        by_collection: Dict[str, list] = defaultdict(list)
+        collections = {}
+        for collection, operation in pending.values():
+            by_collection[collection.name].append(operation)
+            collections[collection.name] = collection
+
+        for name, operations in by_collection.items():
+            try:
+                await collections[name].bulk_write(operations, ordered=False)
+                self.written += len(operations)
+            except Exception as e:
+                logger.error(f"❌ Erreur lors de l'écriture différée ({name}): {e}")
+
+    async def close(self):
+        """Arrêter l'écriture périodique et écrire ce qui reste en attente"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "scheduled": self.scheduled,
+            "written": self.written,
+        }
+
+write_buffer = WriteBuffer(settings.WRITE_BUFFER_FLUSH_SECONDS)
@@ -0,0 +1,59 @@
+"""Migration : créer les entrées d'inbox des conversations existantes.
+
+Les entrées déjà présentes ne sont pas modifiées : le script peut être relancé.
+Il est aussi lancé au démarrage de l'API (voir ``app.jobs.startup``).
+
+    python -m app.jobs.backfill_inbox
+"""
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.services.inbox_service import InboxService
+from app.services.user_service import UserService
+
+BATCH_SIZE = 200
+
+async def backfill_inbox(database: AsyncIOMotorDatabase) -> int:
+    """Créer les entrées d'inbox manquantes; retourne le nombre de conversations reprises"""
+    inbox_service = InboxService(database)
+    user_service = UserService(database)
+
+    async def flush(conversations):
+        # Les entrées d'une conversation sont créées ensemble : ignorer celles qui en ont déjà
+        done = set(await database.inbox.distinct(
+            "conversation_id", {"conversation_id": {"$in": [str(conv["_id"]) for conv in conversations]}}
+        ))
+        conversations = [conv for conv in conversations if str(conv["_id"]) not in done]
+        if not conversations:
+            return 0
+        profiles = await user_service.get_many_by_email(
+            [email for conv in conversations for email in conv["participants"]]
+        )
+        for conv in conversations:
+            await inbox_service.add_conversation(conv, profiles)
+        return len(conversations)
+
+    processed = 0
+    batch = []
+    async for conv in database.conversations.find({}):
+        batch.append(conv)
+        if len(batch) >= BATCH_SIZE:
+            processed += await flush(batch)
+            batch = []
+    if batch:
+        processed += await flush(batch)
+
+    return processed
+
+async def _main():
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    try:
+        processed = await backfill_inbox(client[settings.DATABASE_NAME])
+    finally:
+        client.close()
+    print(f"{processed} conversations reprises")
+
+if __name__ == "__main__":
+    asyncio.run(_main())
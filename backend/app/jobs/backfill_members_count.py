@@ -0,0 +1,37 @@
+"""Migration : ajouter le compteur ``members_count`` (et la capacité ``max_members``
+par défaut, si elle manque) aux bastions existants.
+
+    python -m app.jobs.backfill_members_count
+"""
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.services.message_service import DEFAULT_MAX_MEMBERS
+
+async def backfill_members_count(database: AsyncIOMotorDatabase) -> int:
+    """Recalculer members_count depuis la liste des membres et compléter max_members; retourne le nombre de corrections"""
+    result = await database.bastions.update_many(
+        {"$or": [
+            {"members_count": {"$exists": False}},
+            {"$expr": {"$ne": ["$members_count", {"$size": {"$ifNull": ["$members", []]}}]}}
+        ]},
+        [{"$set": {"members_count": {"$size": {"$ifNull": ["$members", []]}}}}]
+    )
+    capacity = await database.bastions.update_many(
+        {"max_members": {"$exists": False}},
+        {"$set": {"max_members": DEFAULT_MAX_MEMBERS}}
+    )
+    return result.modified_count + capacity.modified_count
+
+async def _main():
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    try:
+        updated = await backfill_members_count(client[settings.DATABASE_NAME])
+    finally:
+        client.close()
+    print(f"{updated} bastions mis à jour")
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,71 @@
+"""Migration : ajouter la clé canonique ``participants_key`` aux conversations directes existantes.
+
+Les doublons (mêmes participants) gardent la conversation la plus ancienne comme
+conversation canonique; les autres restent sans clé et sont listés dans le rapport.
+
+    python -m app.jobs.backfill_participants_key
+"""
+from typing import Dict, List, Tuple
+import asyncio
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.services.message_service import participants_key
+
+BATCH_SIZE = 500
+
+async def backfill_participants_key(database: AsyncIOMotorDatabase) -> Dict[str, List[str]]:
+    """Remplir participants_key sur les conversations directes qui ne l'ont pas encore.
+
+    L'index unique sur participants_key doit exister (il est créé au démarrage de l'API).
+    """
+    cursor = database.conversations.find(
+        {"conversation_type": "direct", "participants_key": {"$exists": False}},
+        {"participants": 1}
+    ).sort("created_at", 1)
+
+    report = {"updated": [], "duplicates": []}
+    batch: List[Tuple[ObjectId, str]] = []
+
+    async def flush():
+        while batch:
+            operations = [
+                UpdateOne({"_id": conv_id}, {"$set": {"participants_key": key}})
+                for conv_id, key in batch
+            ]
+            try:
+                await database.conversations.bulk_write(operations, ordered=True)
+                report["updated"].extend(str(conv_id) for conv_id, _ in batch)
+                batch.clear()
+            except BulkWriteError as e:
+                # Écriture ordonnée : tout ce qui précède l'erreur est appliqué, on reprend après
+                failed_index = e.details["writeErrors"][0]["index"]
+                report["updated"].extend(str(conv_id) for conv_id, _ in batch[:failed_index])
+                report["duplicates"].append(str(batch[failed_index][0]))
+                del batch[:failed_index + 1]
+
+    async for conv in cursor:
+        batch.append((conv["_id"], participants_key(conv["participants"])))
+        if len(batch) >= BATCH_SIZE:
+            await flush()
+    await flush()
+
+    return report
+
+async def _main():
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    try:
+        report = await backfill_participants_key(client[settings.DATABASE_NAME])
+    finally:
+        client.close()
+
+    print(f"{len(report['updated'])} conversations mises à jour")
+    for conv_id in report["duplicates"]:
+        print(f"doublon non migré : {conv_id}")
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,63 @@
+"""Migration : détecter la langue de recherche des projets et articles existants.
+
+Sans ``search_language``, un document est indexé en français : les contenus
+anglais existants sont mal racinisés tant que ce script n'a pas tourné.
+
+    python -m app.jobs.backfill_search_language
+"""
+from typing import Dict, Tuple
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.core.search import LANGUAGE_FIELD, detect_language
+
+# Collection -> champs texte utilisés pour détecter la langue
+TEXT_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "projects": ("title", "description"),
+    "blog_posts": ("title", "excerpt", "content"),
+    "community_posts": ("title", "content"),
+}
+
+BATCH_SIZE = 500
+
+async def backfill_search_language(database: AsyncIOMotorDatabase) -> Dict[str, int]:
+    """Renseigner search_language là où il manque; retourne le nombre de documents mis à jour par collection"""
+    report = {}
+    for collection, fields in TEXT_FIELDS.items():
+        cursor = database[collection].find(
+            {LANGUAGE_FIELD: {"$exists": False}},
+            {field: 1 for field in fields}
+        )
+
+        updated = 0
+        operations = []
+        async for doc in cursor:
+            language = detect_language(*(doc.get(field) for field in fields))
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {LANGUAGE_FIELD: language}}))
+            if len(operations) == BATCH_SIZE:
+                result = await database[collection].bulk_write(operations, ordered=False)
+                updated += result.modified_count
+                operations = []
+        if operations:
+            result = await database[collection].bulk_write(operations, ordered=False)
+            updated += result.modified_count
+
+        report[collection] = updated
+
+    return report
+
+async def _main():
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    try:
+        report = await backfill_search_language(client[settings.DATABASE_NAME])
+    finally:
+        client.close()
+
+    for collection, updated in report.items():
+        print(f"{collection}: {updated} documents mis à jour")
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,165 @@
+"""Compaction : regrouper les anciens messages individuels en buckets.
+
+Les messages plus anciens que MESSAGE_COMPACT_AFTER_HOURS sont déplacés de la
+collection ``messages`` vers ``message_buckets``, par paquets de
+MESSAGE_BUCKET_SIZE messages consécutifs. Chaque bucket reprend l'_id de son
+premier message : relancer la compaction après une interruption ne crée pas
+de doublon. Un message modifié pendant sa copie n'est supprimé qu'une fois sa
+dernière version recopiée dans le bucket.
+
+    python -m app.jobs.compact_messages
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List
+import asyncio
+import logging
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.services.message_store import pack_message, message_sender
+
+logger = logging.getLogger(__name__)
+
+# Tentatives de recopie d'un message modifié pendant la compaction
+REFRESH_ATTEMPTS = 3
+
+async def _write_bucket(database: AsyncIOMotorDatabase, messages: List[dict]) -> int:
+    """Copier les messages dans un bucket puis supprimer les documents; retourne le nombre de messages déplacés"""
+    senders = {message["sender_email"]: message_sender(message) for message in messages}
+    bucket = {
+        "conversation_id": messages[0]["conversation_id"],
+        "open": False,  # Les nouveaux messages vont dans le bucket ouvert de la conversation
+        "count": len(messages),
+        "first_at": messages[0]["created_at"],
+        "last_at": messages[-1]["created_at"],
+        "updated_at": max(message.get("updated_at", message["created_at"]) for message in messages),
+        "senders": list(senders.values()),
+        "messages": [pack_message(message) for message in messages],
+    }
+    bucket_id = messages[0]["_id"]
+    await database.message_buckets.update_one({"_id": bucket_id}, {"$setOnInsert": bucket}, upsert=True)
+
+    # Le bucket peut dater d'une exécution interrompue : seuls les messages qu'il
+    # contient, dans la version copiée, sont supprimés de ``messages``
+    stored = await database.message_buckets.find_one(
+        {"_id": bucket_id},
+        {"messages._id": 1, "messages.updated_at": 1}
+    )
+    copies = [(message["_id"], message.get("updated_at")) for message in stored["messages"]]
+    result = await database.messages.delete_many({
+        "$or": [{"_id": message_id, "updated_at": updated_at} for message_id, updated_at in copies]
+    })
+
+    # Un document modifié entre-temps (réaction...) fait foi : sa version courante
+    # remplace la copie du bucket, puis il est supprimé s'il n'a pas encore changé
+    deleted = result.deleted_count
+    remaining_ids = [message_id for message_id, _ in copies]
+    for attempt in range(REFRESH_ATTEMPTS + 1):
+        remaining = [message async for message in database.messages.find({"_id": {"$in": remaining_ids}})]
+        if not remaining or attempt == REFRESH_ATTEMPTS:
+            break
+        for message in remaining:
+            await database.message_buckets.update_one(
+                {"_id": bucket_id, "messages._id": message["_id"]},
+                {
+                    "$set": {"messages.$": pack_message(message)},
+                    "$addToSet": {"senders": message_sender(message)},
+                    "$max": {"updated_at": message.get("updated_at", message["created_at"])}
+                }
+            )
+        result = await database.messages.delete_many({
+            "$or": [{"_id": message["_id"], "updated_at": message.get("updated_at")} for message in remaining]
+        })
+        deleted += result.deleted_count
+        remaining_ids = [message["_id"] for message in remaining]
+
+    if remaining:
+        # Toujours modifié : le message reste un document, sa copie est retirée du bucket
+        await database.message_buckets.update_one(
+            {"_id": bucket_id},
+            {
+                "$pull": {"messages": {"_id": {"$in": [message["_id"] for message in remaining]}}},
+                "$inc": {"count": -len(remaining)}
+            }
+        )
+        await database.message_buckets.delete_one({"_id": bucket_id, "count": {"$lte": 0}})
+
+    return deleted
+
+async def close_extra_open_buckets(database: AsyncIOMotorDatabase) -> int:
+    """Fermer les buckets ouverts en trop (créés avant l'index unique), sauf le plus récent de chaque conversation"""
+    closed = 0
+    pipeline = [
+        {"$match": {"open": True}},
+        {"$sort": {"last_at": -1}},
+        {"$group": {"_id": "$conversation_id", "buckets": {"$push": "$_id"}}},
+        {"$match": {"buckets.1": {"$exists": True}}},
+    ]
+    async for conversation in database.message_buckets.aggregate(pipeline):
+        result = await database.message_buckets.update_many(
+            {"_id": {"$in": conversation["buckets"][1:]}},
+            {"$set": {"open": False}}
+        )
+        closed += result.modified_count
+    return closed
+
+async def compact_messages(
+    database: AsyncIOMotorDatabase,
+    bucket_size: int = settings.MESSAGE_BUCKET_SIZE,
+    older_than: timedelta = timedelta(hours=settings.MESSAGE_COMPACT_AFTER_HOURS)
+) -> Dict[str, int]:
+    """Compacter les messages antérieurs à ``older_than``; retourne le nombre de messages déplacés par conversation"""
+    cutoff = datetime.utcnow() - older_than
+    report = {}
+
+    closed = await close_extra_open_buckets(database)
+    if closed:
+        logger.info(f"🗜️ {closed} buckets ouverts en trop fermés")
+
+    for conversation_id in await database.messages.distinct("conversation_id"):
+        cursor = database.messages.find(
+            {"conversation_id": conversation_id, "created_at": {"$lt": cutoff}}
+        ).sort([("created_at", 1), ("_id", 1)])
+
+        moved = 0
+        chunk: List[dict] = []
+        async for message in cursor:
+            chunk.append(message)
+            if len(chunk) == bucket_size:
+                moved += await _write_bucket(database, chunk)
+                chunk = []
+        if chunk:
+            moved += await _write_bucket(database, chunk)
+
+        if moved:
+            report[conversation_id] = moved
+
+    return report
+
+async def run_compactor(database: AsyncIOMotorDatabase, interval: float = settings.MESSAGE_COMPACT_INTERVAL_SECONDS):
+    """Tâche de fond : compacter périodiquement les anciens messages"""
+    while True:
+        try:
+            report = await compact_messages(database)
+            if report:
+                logger.info(f"🗜️ {sum(report.values())} messages compactés dans {len(report)} conversations")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la compaction des messages: {e}")
+        await asyncio.sleep(interval)
+
+async def _main():
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    try:
+        report = await compact_messages(client[settings.DATABASE_NAME])
+    finally:
+        client.close()
+
+    for conversation_id, moved in sorted(report.items()):
+        print(f"{conversation_id}: {moved} messages")
+    print(f"{sum(report.values())} messages compactés")
+
+if __name__ == "__main__":
+    asyncio.run(_main())
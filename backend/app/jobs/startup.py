@@ -0,0 +1,29 @@
+"""Migrations relancées à chaque démarrage de l'API, en tâche de fond.
+
+Elles sont idempotentes : une fois les données reprises, chaque exécution ne
+fait que vérifier qu'il ne reste rien à migrer.
+"""
+import logging
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.jobs.backfill_inbox import backfill_inbox
+from app.jobs.backfill_members_count import backfill_members_count
+
+logger = logging.getLogger(__name__)
+
+async def run_startup_migrations(database: AsyncIOMotorDatabase):
+    """Reprendre les données créées avant les dernières évolutions du schéma"""
+    try:
+        processed = await backfill_inbox(database)
+        if processed:
+            logger.info(f"📥 Inbox : {processed} conversations reprises")
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de la reprise des inbox: {e}")
+
+    try:
+        updated = await backfill_members_count(database)
+        if updated:
+            logger.info(f"🏰 {updated} bastions : members_count recalculé")
+    except Exception as e:
+        logger.error(f"❌ Erreur lors du recalcul de members_count: {e}")
@@ -1,11 +1,20 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+import asyncio
 import uvicorn
 
 from app.core.config import settings
 from app.api.v1.api import api_router
-from app.core.database import connect_to_mongo, close_mongo_connection
+from app.core.database import connect_to_mongo, close_mongo_connection, db
+from app.core.security import password_hash_pool
+from app.core.realtime import connection_manager
+from app.core.broker import RedisBroker
+from app.core.write_buffer import write_buffer
+from app.core.presence import presence, RedisPresenceBackend
+from app.jobs.compact_messages import run_compactor
+from app.jobs.startup import run_startup_migrations
+from app.services.suggest_service import SuggestService
 
 app = FastAPI(
     title="CodeSwitch API",
@@ -23,6 +32,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Routes API
@@ -32,11 +42,28 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 async def startup_event():
     """Connexion à MongoDB au démarrage"""
     await connect_to_mongo()
+    if settings.BROKER_URL:
+        await connection_manager.use_broker(
+            RedisBroker(connection_manager.dispatch, url=settings.BROKER_URL)
+        )
+        await presence.use_backend(RedisPresenceBackend(url=settings.BROKER_URL))
+    await SuggestService(db.database).load()
+    app.state.migrations = asyncio.create_task(run_startup_migrations(db.database))
+    app.state.compactor = None
+    if settings.MESSAGE_STORAGE == "bucket":
+        app.state.compactor = asyncio.create_task(run_compactor(db.database))
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Fermeture de la connexion MongoDB"""
+    app.state.migrations.cancel()
+    if app.state.compactor is not None:
+        app.state.compactor.cancel()
+    await write_buffer.close()
     await close_mongo_connection()
+    password_hash_pool.shutdown()
+    await connection_manager.broker.close()
+    await presence.backend.close()
 
 @app.get("/")
 async def root():
@@ -75,6 +75,9 @@ class MessageResponse(BaseModel):
     created_at: datetime
     edited_at: Optional[datetime]
 
+class SyncMessageResponse(MessageResponse):
+    conversation_id: str  # Conversation ou bastion
+
 class ConversationBase(BaseModel):
     name: Optional[str] = None
     conversation_type: ConversationTypeEnum
@@ -87,7 +90,8 @@ class ConversationInDB(ConversationBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     last_message: Optional[str] = None
     last_message_time: Optional[datetime] = None
-    unread_count: Dict[str, int] = {}  # email -> count
+    unread_count: Dict[str, int] = {}  # email -> count (anciennes conversations; les non-lus sont comptés dans l'inbox)
+    participants_key: Optional[str] = None  # Conversations directes : emails triés, unique
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -120,6 +124,7 @@ class BastionInDB(BastionBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     creator_email: str
     members: List[str] = []  # Liste d'emails
+    members_count: int = 0  # Maintenu avec members ($inc), plafonné par max_members
     avatar: str = "🏰"  # Emoji par défaut
     last_activity: datetime = Field(default_factory=datetime.utcnow)
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -141,5 +146,15 @@ class BastionResponse(BaseModel):
     last_activity: datetime
     created_at: datetime
 
+class BastionTagFacet(BaseModel):
+    tag: str
+    count: int  # Nombre de bastions publics portant ce tag
+
 class BastionJoinRequest(BaseModel):
-    message: Optional[str] = None
\ No newline at end of file
+    message: Optional[str] = None
+
+class SyncResponse(BaseModel):
+    messages: List[SyncMessageResponse]  # Nouveaux messages et messages modifiés (réactions)
+    conversations: List[ConversationResponse]  # Conversations modifiées (dernier message, non-lus)
+    cursor: str  # À renvoyer dans ?since= à la prochaine synchronisation
+    has_more: bool
@@ -112,4 +112,20 @@ class ProjectResponse(BaseModel):
     tags: List[str]
     thumbnail_url: Optional[str]
     completed_by: int
-    created_at: datetime
\ No newline at end of file
+    created_at: datetime
+
+class ProjectStepsPage(BaseModel):
+    project_id: str
+    total: int
+    skip: int
+    steps: List[ProjectStep]
+
+
+class ProjectFacetCount(BaseModel):
+    value: str
+    count: int
+
+class ProjectFacets(BaseModel):
+    language: List[ProjectFacetCount]
+    difficulty: List[ProjectFacetCount]
+    type: List[ProjectFacetCount]
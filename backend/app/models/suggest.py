@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from enum import Enum
+
+class SuggestionKindEnum(str, Enum):
+    TAG = "tag"
+    USER = "user"
+    CATEGORY = "category"
+
+class Suggestion(BaseModel):
+    value: str
+    kind: SuggestionKindEnum
+    count: int
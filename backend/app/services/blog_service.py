@@ -1,14 +1,36 @@
+from collections import Counter
 from typing import List, Optional, Dict
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING, DESCENDING, ReturnDocument
 from bson import ObjectId
 from datetime import datetime
-import re
 
 from app.models.blog import (
     BlogPostCreate, BlogPostUpdate, BlogPostInDB, BlogPostResponse,
     CommentCreate, CommentInDB, CommentResponse, AuthorInfo
 )
 from app.services.user_service import UserService
+from app.core.typeahead import USER, content_usage, record_usage
+from app.core.search import (
+    LANGUAGE_FIELD, detect_language, find_by_relevance, refresh_search_language,
+    sanitize_text_search, text_filter, text_index
+)
+
+INDEXES = {
+    "blog_posts": [
+        IndexModel([("published", ASCENDING), ("created_at", DESCENDING)]),
+        # Recherche : titre, tags et résumé pèsent plus que le corps de l'article
+        text_index("blog_posts_text", {"title": 10, "tags": 5, "excerpt": 3, "content": 1}),
+    ],
+    "blog_comments": [
+        IndexModel([("post_id", ASCENDING), ("parent_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+}
+
+POSTS_SORT = [("created_at", DESCENDING)]
+
+# Champs texte d'un article, utilisés pour détecter sa langue
+TEXT_FIELDS = ("title", "excerpt", "content")
 
 class BlogService:
     def __init__(self, database: AsyncIOMotorDatabase):
@@ -26,6 +48,23 @@ class BlogService:
         featured_only: bool = False
     ) -> List[BlogPostResponse]:
         """Récupérer les articles de blog avec filtres"""
+        query = self._build_query(category, search, featured_only)
+
+        if "$text" in query:
+            posts = await find_by_relevance(self.posts_collection, query, None, POSTS_SORT, skip, limit)
+        else:
+            cursor = self.posts_collection.find(query).sort(POSTS_SORT).skip(skip).limit(limit)
+            posts = await cursor.to_list(length=limit)
+        
+        return [self._post_to_response(post) for post in posts]
+
+    @staticmethod
+    def _build_query(
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        featured_only: bool = False
+    ) -> dict:
+        """Construire le filtre MongoDB des articles publiés"""
         query = {"published": True}
         
         if category:
@@ -34,18 +73,11 @@ class BlogService:
         if featured_only:
             query["featured"] = True
             
-        if search:
-            query["$or"] = [
-                {"title": {"$regex": search, "$options": "i"}},
-                {"excerpt": {"$regex": search, "$options": "i"}},
-                {"content": {"$regex": search, "$options": "i"}},
-                {"tags": {"$in": [re.compile(search, re.IGNORECASE)]}}
-            ]
-
-        cursor = self.posts_collection.find(query).sort("created_at", -1).skip(skip).limit(limit)
-        posts = await cursor.to_list(length=limit)
-        
-        return [self._post_to_response(post) for post in posts]
+        terms = sanitize_text_search(search)
+        if terms:
+            query.update(text_filter(terms, detect_language(terms)))
+
+        return query
 
     async def get_post_by_id(self, post_id: str) -> Optional[BlogPostResponse]:
         """Récupérer un article par ID"""
@@ -85,11 +117,17 @@ class BlogService:
             "views": 0,
             "liked_by": [],
             "bookmarked_by": [],
+            LANGUAGE_FIELD: detect_language(post_data.title, post_data.excerpt, post_data.content),
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
 
         result = await self.posts_collection.insert_one(post_dict)
+
+        usage = self._suggestion_usage(post_dict)
+        usage[(USER, user.username)] += 1
+        await record_usage(Counter(), usage)
+
         created_post = await self.posts_collection.find_one({"_id": result.inserted_id})
         return self._post_to_response(created_post)
 
@@ -101,12 +139,16 @@ class BlogService:
         update_data = {k: v for k, v in post_data.dict().items() if v is not None}
         update_data["updated_at"] = datetime.utcnow()
 
-        result = await self.posts_collection.update_one(
+        previous = await self.posts_collection.find_one_and_update(
             {"_id": ObjectId(post_id), "author_email": author_email},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"tags": 1, "category": 1, "published": 1, LANGUAGE_FIELD: 1, **dict.fromkeys(TEXT_FIELDS, 1)},
+            return_document=ReturnDocument.BEFORE
         )
 
-        if result.modified_count:
+        if previous:
+            await refresh_search_language(self.posts_collection, previous, update_data, TEXT_FIELDS)
+            await record_usage(self._suggestion_usage(previous), self._suggestion_usage({**previous, **update_data}))
             return await self.get_post_by_id(post_id)
         return None
 
@@ -253,6 +295,13 @@ class BlogService:
         categories = await self.posts_collection.distinct("category", {"published": True})
         return sorted(categories)
 
+    @staticmethod
+    def _suggestion_usage(post_doc: dict) -> Counter:
+        """Tags et catégorie d'un article pour l'autocomplétion (articles publiés seulement)"""
+        if not post_doc.get("published"):
+            return Counter()
+        return content_usage(post_doc.get("tags"), post_doc.get("category"))
+
     def _post_to_response(self, post_doc: dict) -> BlogPostResponse:
         """Convertir un document post en réponse"""
         return BlogPostResponse(
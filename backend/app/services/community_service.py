@@ -1,14 +1,41 @@
+from collections import Counter
 from typing import List, Optional, Dict
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING, DESCENDING, ReturnDocument
 from bson import ObjectId
 from datetime import datetime, timedelta
-import re
 
 from app.models.community import (
     CommunityPostCreate, CommunityPostUpdate, CommunityPostInDB, CommunityPostResponse,
     CommunityCommentCreate, CommunityCommentInDB, CommunityCommentResponse, AuthorInfo
 )
 from app.services.user_service import UserService
+from app.core.presence import presence
+from app.core.typeahead import USER, content_usage, record_usage
+from app.core.search import (
+    LANGUAGE_FIELD, detect_language, find_by_relevance, refresh_search_language,
+    sanitize_text_search, text_filter, text_index
+)
+
+INDEXES = {
+    "community_posts": [
+        # Tri du fil : épinglés en premier, puis par activité récente
+        IndexModel([("is_pinned", DESCENDING), ("last_activity", DESCENDING)]),
+        # Statistiques : questions résolues aujourd'hui
+        IndexModel([("is_solved", ASCENDING), ("updated_at", DESCENDING)]),
+        # Recherche : titre, puis tags, puis contenu
+        text_index("community_posts_text", {"title": 10, "tags": 5, "content": 1}),
+    ],
+    "community_comments": [
+        IndexModel([("post_id", ASCENDING), ("parent_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+}
+
+# Tri : épinglés en premier, puis par activité récente
+POSTS_SORT = [("is_pinned", DESCENDING), ("last_activity", DESCENDING)]
+
+# Champs texte d'un post, utilisés pour détecter sa langue
+TEXT_FIELDS = ("title", "content")
 
 class CommunityService:
     def __init__(self, database: AsyncIOMotorDatabase):
@@ -29,6 +56,31 @@ class CommunityService:
         solved_only: bool = False
     ) -> List[CommunityPostResponse]:
         """Récupérer les posts de la communauté avec filtres"""
+        query = self._build_query(
+            post_type, category, search, trending_only, unanswered_only, solved_only
+        )
+        
+        if "$text" in query:
+            # Recherche : les plus pertinents d'abord, puis par activité récente
+            posts = await find_by_relevance(
+                self.posts_collection, query, None, [("last_activity", DESCENDING)], skip, limit
+            )
+        else:
+            cursor = self.posts_collection.find(query).sort(POSTS_SORT).skip(skip).limit(limit)
+            posts = await cursor.to_list(length=limit)
+        
+        return [self._post_to_response(post) for post in posts]
+
+    @staticmethod
+    def _build_query(
+        post_type: Optional[str] = None,
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        trending_only: bool = False,
+        unanswered_only: bool = False,
+        solved_only: bool = False
+    ) -> dict:
+        """Construire le filtre MongoDB du fil de la communauté"""
         query = {}
         
         if post_type:
@@ -46,20 +98,11 @@ class CommunityService:
         if solved_only:
             query["is_solved"] = True
             
-        if search:
-            query["$or"] = [
-                {"title": {"$regex": search, "$options": "i"}},
-                {"content": {"$regex": search, "$options": "i"}},
-                {"tags": {"$in": [re.compile(search, re.IGNORECASE)]}}
-            ]
-
-        # Tri : épinglés en premier, puis par activité récente
-        sort_criteria = [("is_pinned", -1), ("last_activity", -1)]
-        
-        cursor = self.posts_collection.find(query).sort(sort_criteria).skip(skip).limit(limit)
-        posts = await cursor.to_list(length=limit)
-        
-        return [self._post_to_response(post) for post in posts]
+        terms = sanitize_text_search(search)
+        if terms:
+            query.update(text_filter(terms, detect_language(terms)))
+
+        return query
 
     async def get_post_by_id(self, post_id: str) -> Optional[CommunityPostResponse]:
         """Récupérer un post par ID"""
@@ -96,12 +139,18 @@ class CommunityService:
             "is_pinned": False,
             "is_solved": False,
             "is_trending": False,
+            LANGUAGE_FIELD: detect_language(post_data.title, post_data.content),
             "last_activity": datetime.utcnow(),
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
 
         result = await self.posts_collection.insert_one(post_dict)
+
+        usage = content_usage(post_data.tags, post_data.category)
+        usage[(USER, user.username)] += 1
+        await record_usage(Counter(), usage)
+
         created_post = await self.posts_collection.find_one({"_id": result.inserted_id})
         
         # Mettre à jour le trending si nécessaire
@@ -117,12 +166,20 @@ class CommunityService:
         update_data = {k: v for k, v in post_data.dict().items() if v is not None}
         update_data["updated_at"] = datetime.utcnow()
 
-        result = await self.posts_collection.update_one(
+        previous = await self.posts_collection.find_one_and_update(
             {"_id": ObjectId(post_id), "author_email": author_email},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"tags": 1, "category": 1, LANGUAGE_FIELD: 1, **dict.fromkeys(TEXT_FIELDS, 1)},
+            return_document=ReturnDocument.BEFORE
         )
 
-        if result.modified_count:
+        if previous:
+            await refresh_search_language(self.posts_collection, previous, update_data, TEXT_FIELDS)
+            updated = {**previous, **update_data}
+            await record_usage(
+                content_usage(previous.get("tags"), previous.get("category")),
+                content_usage(updated.get("tags"), updated.get("category"))
+            )
             return await self.get_post_by_id(post_id)
         return None
 
@@ -234,7 +291,7 @@ class CommunityService:
         return {
             "total_posts": total_posts,
             "total_members": total_members,
-            "online_now": 234,  # Mock - en production, utiliser Redis ou WebSocket
+            "online_now": await presence.count(),
             "solved_today": solved_today
         }
 
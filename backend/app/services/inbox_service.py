@@ -0,0 +1,148 @@
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING, DESCENDING, UpdateOne, UpdateMany
+from datetime import datetime
+
+from app.core.write_buffer import write_buffer
+from app.services.message_store import utcnow_millis
+
+INDEXES = {
+    "inbox": [
+        IndexModel([("conversation_id", ASCENDING), ("owner_email", ASCENDING)], unique=True),
+        IndexModel([("owner_email", ASCENDING), ("updated_at", DESCENDING)]),
+        IndexModel([("owner_email", ASCENDING), ("changed_at", ASCENDING)]),
+        IndexModel([("peers.email", ASCENDING)]),
+    ],
+}
+
+# Dates des messages non lus gardées par entrée (les plus récentes), pour recalculer le compteur à la lecture
+UNREAD_TIMES_MAX = 100
+
+# Champs du profil copiés dans les inbox des autres participants
+PROFILE_FIELDS = {"email", "full_name", "avatar_url"}
+
+def peer_info(profile: dict) -> dict:
+    """Informations d'affichage d'un participant, copiées dans l'inbox"""
+    return {"email": profile["email"], "name": profile["full_name"], "avatar_url": profile.get("avatar_url")}
+
+class InboxService:
+    """Vue matérialisée des conversations : une entrée par (utilisateur, conversation).
+
+    Chaque entrée contient déjà le nom et l'avatar des autres participants, le
+    dernier message et le nombre de non-lus : la liste des conversations d'un
+    utilisateur se lit en une seule requête indexée.
+    """
+
+    def __init__(self, database: AsyncIOMotorDatabase):
+        self.collection = database.inbox
+
+    async def get_entries(self, owner_email: str) -> List[dict]:
+        """Entrées de l'utilisateur, de la plus récemment active à la plus ancienne"""
+        cursor = self.collection.find({"owner_email": owner_email}).sort("updated_at", -1)
+        return await cursor.to_list(length=None)
+
+    async def get_entry(self, conversation_id: str, owner_email: str) -> Optional[dict]:
+        return await self.collection.find_one({"conversation_id": conversation_id, "owner_email": owner_email})
+
+    async def get_changed_entries(self, owner_email: str, since: datetime) -> List[dict]:
+        """Entrées modifiées depuis ``since`` (changed_at : tout changement, y compris la lecture)"""
+        cursor = self.collection.find({"owner_email": owner_email, "changed_at": {"$gte": since}})
+        return await cursor.to_list(length=None)
+
+    async def add_conversation(self, conv: dict, profiles: Dict[str, dict]):
+        """Créer l'entrée de chaque participant d'une conversation (sans écraser une entrée existante)"""
+        conversation_id = str(conv["_id"])
+        operations = []
+        for owner_email in conv["participants"]:
+            entry = {
+                "name": conv.get("name"),
+                "conversation_type": conv["conversation_type"],
+                "peers": [
+                    peer_info(profiles[email])
+                    for email in conv["participants"]
+                    if email != owner_email and email in profiles
+                ],
+                "last_message": conv.get("last_message"),
+                "last_message_time": conv.get("last_message_time"),
+                "unread_count": conv.get("unread_count", {}).get(owner_email, 0),
+                "created_at": conv["created_at"],
+                "updated_at": conv["updated_at"],
+                "changed_at": utcnow_millis()
+            }
+            operations.append(UpdateOne(
+                {"conversation_id": conversation_id, "owner_email": owner_email},
+                {"$setOnInsert": entry},
+                upsert=True
+            ))
+
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def record_message(self, conversation_id: str, sender_email: str, preview: str, sent_at: datetime):
+        """Nouveau message : aperçu et date pour tous, un non-lu de plus pour les destinataires"""
+        last_message = {"last_message": preview, "last_message_time": sent_at, "updated_at": sent_at, "changed_at": sent_at}
+        await self.collection.bulk_write([
+            UpdateMany(
+                {"conversation_id": conversation_id, "owner_email": {"$ne": sender_email}},
+                {
+                    "$set": last_message,
+                    "$inc": {"unread_count": 1},
+                    "$push": {"unread_times": {"$each": [sent_at], "$slice": -UNREAD_TIMES_MAX}}
+                }
+            ),
+            UpdateOne(
+                {"conversation_id": conversation_id, "owner_email": sender_email},
+                {"$set": last_message}
+            ),
+        ], ordered=False)
+
+    def schedule_mark_read(self, conversation_id: str, owner_email: str, read_at: datetime):
+        """Marquer comme lus les messages antérieurs à ``read_at`` lors du prochain lot d'écritures différées.
+
+        Le compteur est recalculé depuis les dates des non-lus : un message
+        arrivé entre la lecture et l'écriture reste non lu. Aucune écriture si
+        le compteur recalculé est inchangé (en particulier s'il est déjà à zéro).
+        """
+        times = {"$ifNull": ["$unread_times", []]}
+        unread = {"$filter": {"input": times, "as": "sent_at", "cond": {"$gt": ["$$sent_at", read_at]}}}
+        unread_count = {"$cond": [
+            # Liste pleine et entièrement postérieure à la lecture : des non-lus plus
+            # anciens, hors de la liste, peuvent l'être aussi, le compteur est gardé
+            {"$and": [
+                {"$gte": [{"$size": times}, UNREAD_TIMES_MAX]},
+                {"$eq": [{"$size": unread}, {"$size": times}]}
+            ]},
+            "$unread_count",
+            {"$size": unread}
+        ]}
+        write_buffer.schedule(
+            ("inbox_read", conversation_id, owner_email),
+            self.collection,
+            {
+                "conversation_id": conversation_id,
+                "owner_email": owner_email,
+                "unread_count": {"$gt": 0},
+                "$expr": {"$ne": [unread_count, "$unread_count"]}
+            },
+            [{"$set": {
+                "unread_count": unread_count,
+                "unread_times": unread,
+                "changed_at": "$$NOW"
+            }}]
+        )
+
+    async def update_peer_profile(self, previous_email: str, profile: dict):
+        """Propager un changement de nom, d'avatar ou d'email dans les inbox où l'utilisateur apparaît"""
+        now = utcnow_millis()
+        peer = peer_info(profile)
+        operations = [UpdateMany(
+            {"peers.email": previous_email},
+            {"$set": {**{f"peers.$.{field}": value for field, value in peer.items()}, "changed_at": now}}
+        )]
+        if profile["email"] != previous_email:
+            # Les entrées de l'utilisateur suivent son nouvel email
+            operations.append(UpdateMany(
+                {"owner_email": previous_email},
+                {"$set": {"owner_email": profile["email"], "changed_at": now}}
+            ))
+        await self.collection.bulk_write(operations, ordered=False)
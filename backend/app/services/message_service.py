@@ -1,96 +1,209 @@
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Set, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
-from datetime import datetime
-import re
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
+import asyncio
+import base64
+import binascii
 
 from app.models.messages import (
-    ConversationCreate, ConversationInDB, ConversationResponse, ParticipantInfo,
+    ConversationTypeEnum, ConversationCreate, ConversationInDB, ConversationResponse, ParticipantInfo,
     MessageCreate, MessageInDB, MessageResponse, MessageReaction,
-    BastionCreate, BastionInDB, BastionResponse
+    BastionCreate, BastionInDB, BastionResponse, BastionTagFacet, SyncMessageResponse, SyncResponse
 )
 from app.services.user_service import UserService
+from app.services.inbox_service import InboxService
+from app.services.message_store import create_message_store, utcnow_millis
+from app.core.realtime import connection_manager, chat_channel
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.write_buffer import write_buffer
+from app.core.presence import presence
+from app.core.search import TEXT_SCORE, sanitize_text_search, text_filter, text_sort
+
+DEFAULT_AVATAR = "https://images.pexels.com/photos/220453/pexels-photo-220453.jpeg?auto=compress&cs=tinysrgb&w=50&h=50&fit=crop"
+
+INDEXES = {
+    "conversations": [
+        IndexModel([("participants", ASCENDING), ("updated_at", DESCENDING)]),
+        IndexModel(
+            [("participants_key", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"participants_key": {"$exists": True}}
+        ),
+    ],
+    "bastions": [
+        IndexModel([("members", ASCENDING), ("last_activity", DESCENDING)]),
+        IndexModel([("is_private", ASCENDING), ("last_activity", DESCENDING)]),
+        # Recherche des bastions publics : is_private en préfixe (égalité), nom prioritaire
+        IndexModel(
+            [("is_private", ASCENDING), ("name", TEXT), ("tags", TEXT), ("description", TEXT)],
+            weights={"name": 10, "tags": 5, "description": 2},
+            default_language="french",
+            name="bastions_text"
+        ),
+    ],
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+# Listes de bastions : members_count suffit, inutile de charger la liste des membres
+BASTION_LIST_PROJECTION = {"members": 0}
+
+# Capacité des bastions créés avant que max_members soit enregistré
+DEFAULT_MAX_MEMBERS = BastionCreate.model_fields["max_members"].default
+
+# Recouvrement entre deux synchronisations (écritures encore en cours au moment de la lecture)
+SYNC_OVERLAP = timedelta(seconds=5)
+
+def participants_key(participants: List[str]) -> str:
+    """Clé canonique d'une conversation directe : emails uniques, triés"""
+    return "|".join(sorted(set(participants)))
+
+# Membres de chaque bastion (set d'emails), pour autoriser lecture et envoi sans requête
+bastion_members_cache = TTLCache(
+    settings.BASTION_MEMBERS_CACHE_MAX_SIZE,
+    settings.BASTION_MEMBERS_CACHE_TTL_SECONDS if settings.BROKER_URL
+    else settings.BASTION_MEMBERS_CACHE_TTL_WITHOUT_BROKER_SECONDS
+)
+
+# Canal interne : invalider le cache des membres sur tous les workers
+BASTION_MEMBERS_CHANNEL = "system:bastion_members"
+
+# Tags des bastions publics (facettes), par recherche
+bastion_tags_cache = TTLCache(1000, settings.BASTION_TAGS_CACHE_TTL_SECONDS)
+
+# Indicateurs de frappe : un signal par (conversation, utilisateur) et par intervalle
+typing_throttle = TTLCache(10000, settings.TYPING_THROTTLE_SECONDS)
+
+connection_manager.listen(
+    BASTION_MEMBERS_CHANNEL,
+    lambda events: bastion_members_cache.invalidate(*(event["bastion_id"] for event in events))
+)
+
+class InvalidCursorError(ValueError):
+    """Curseur de pagination illisible"""
+
+def encode_cursor(created_at: datetime, message_id: str) -> str:
+    """Encoder la position (created_at, _id) d'un message en curseur opaque"""
+    millis = (created_at.replace(tzinfo=None) - EPOCH) // timedelta(milliseconds=1)
+    return base64.urlsafe_b64encode(f"{millis}:{message_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Décoder un curseur produit par encode_cursor"""
+    try:
+        millis, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return EPOCH + timedelta(milliseconds=int(millis)), ObjectId(message_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, InvalidId):
+        raise InvalidCursorError("Curseur invalide")
+
+def encode_sync_cursor(since: datetime, after_id: Optional[ObjectId] = None) -> str:
+    """Encoder la position d'une synchronisation (date, et _id du dernier message reçu) en curseur opaque"""
+    millis = (since - EPOCH) // timedelta(milliseconds=1)
+    position = f"{millis}:{after_id}" if after_id else str(millis)
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_sync_cursor(cursor: str) -> Tuple[datetime, Optional[ObjectId]]:
+    """Décoder un curseur produit par encode_sync_cursor (les curseurs sans _id restent valides)"""
+    try:
+        millis, _, after_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition(":")
+        return EPOCH + timedelta(milliseconds=int(millis)), ObjectId(after_id) if after_id else None
+    except (binascii.Error, UnicodeDecodeError, ValueError, OverflowError, InvalidId):
+        raise InvalidCursorError("Curseur invalide")
 
 class MessageService:
     def __init__(self, database: AsyncIOMotorDatabase):
         self.db = database
         self.conversations_collection = database.conversations
-        self.messages_collection = database.messages
+        self.message_store = create_message_store(database)
         self.bastions_collection = database.bastions
         self.user_service = UserService(database)
+        self.inbox_service = InboxService(database)
 
     # CONVERSATIONS DIRECTES
     async def get_user_conversations(self, user_email: str) -> List[ConversationResponse]:
-        """Récupérer toutes les conversations de l'utilisateur"""
-        cursor = self.conversations_collection.find(
-            {"participants": user_email}
-        ).sort("updated_at", -1)
-        
-        conversations = await cursor.to_list(length=None)
-        responses = []
-        
+        """Récupérer toutes les conversations de l'utilisateur (une lecture de son inbox)"""
+        entries = await self._get_inbox_entries(user_email)
+        return await self._inbox_entries_to_response(entries)
+
+    async def _get_inbox_entries(self, user_email: str) -> List[dict]:
+        """Entrées d'inbox de l'utilisateur, créées depuis ``conversations`` si son inbox est vide"""
+        entries = await self.inbox_service.get_entries(user_email)
+        if entries:
+            return entries
+
+        # Conversations antérieures à l'inbox, pas encore reprises par la migration
+        conversations = await self.conversations_collection.find({"participants": user_email}).to_list(length=None)
+        if not conversations:
+            return []
+        profiles = await self.user_service.get_many_by_email(
+            [email for conv in conversations for email in conv["participants"]]
+        )
         for conv in conversations:
-            participants_info = []
-            for participant_email in conv["participants"]:
-                if participant_email != user_email:  # Exclure l'utilisateur actuel
-                    user = await self.user_service.get_by_email(participant_email)
-                    if user:
-                        participants_info.append(ParticipantInfo(
-                            email=participant_email,
-                            name=user.full_name,
-                            avatar=user.avatar_url or "https://images.pexels.com/photos/220453/pexels-photo-220453.jpeg?auto=compress&cs=tinysrgb&w=50&h=50&fit=crop",
-                            is_online=False  # Mock - en production, utiliser Redis
-                        ))
-            
-            unread_count = conv.get("unread_count", {}).get(user_email, 0)
-            
-            responses.append(ConversationResponse(
-                id=str(conv["_id"]),
-                name=conv.get("name"),
-                conversation_type=conv["conversation_type"],
-                participants=participants_info,
-                last_message=conv.get("last_message"),
-                last_message_time=conv.get("last_message_time"),
-                unread_count=unread_count,
-                created_at=conv["created_at"]
-            ))
-        
-        return responses
+            await self.inbox_service.add_conversation(conv, profiles)
+        return await self.inbox_service.get_entries(user_email)
 
     async def create_conversation(self, conversation_data: ConversationCreate, creator_email: str) -> ConversationResponse:
-        """Créer une nouvelle conversation directe"""
-        # Vérifier que la conversation n'existe pas déjà
-        existing = await self.conversations_collection.find_one({
-            "conversation_type": "direct",
-            "participants": {"$all": [creator_email] + conversation_data.participants}
-        })
-        
-        if existing:
-            return await self._conversation_to_response(existing, creator_email)
-
+        """Créer une nouvelle conversation directe (ou retourner celle qui existe déjà)"""
+        participants = list(dict.fromkeys([creator_email] + conversation_data.participants))
+        conv_id = ObjectId()
+        now = utcnow_millis()
         conv_dict = {
             **conversation_data.dict(),
-            "participants": [creator_email] + conversation_data.participants,
+            "_id": conv_id,
+            "participants": participants,
             "last_message": None,
             "last_message_time": None,
-            "unread_count": {},
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "created_at": now,
+            "updated_at": now
         }
 
-        result = await self.conversations_collection.insert_one(conv_dict)
-        created_conv = await self.conversations_collection.find_one({"_id": result.inserted_id})
-        
-        return await self._conversation_to_response(created_conv, creator_email)
+        if conversation_data.conversation_type == ConversationTypeEnum.DIRECT:
+            # Clé canonique + index unique : une seule conversation directe par groupe de participants
+            key = participants_key(participants)
+            conv_dict["participants_key"] = key
+            try:
+                conv = await self.conversations_collection.find_one_and_update(
+                    {"participants_key": key},
+                    {"$setOnInsert": conv_dict},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                # Upsert concurrent : l'autre requête a créé la conversation
+                conv = await self.conversations_collection.find_one({"participants_key": key})
+        else:
+            await self.conversations_collection.insert_one(conv_dict)
+            conv = conv_dict
+
+        if conv["_id"] != conv_id:
+            # Conversation existante : l'inbox porte le dernier message et les non-lus
+            entry = await self.inbox_service.get_entry(str(conv["_id"]), creator_email)
+            if entry:
+                return (await self._inbox_entries_to_response([entry]))[0]
+            return await self._conversation_to_response(conv, creator_email)
+
+        # Nouvelle conversation : créer les entrées d'inbox et abonner les participants connectés
+        profiles = await self.user_service.get_many_by_email(participants)
+        await asyncio.gather(
+            self.inbox_service.add_conversation(conv, profiles),
+            connection_manager.subscribe_users(participants, chat_channel(str(conv_id)))
+        )
+        return await self._conversation_to_response(conv, creator_email, profiles)
 
     async def get_conversation_messages(
         self, 
         conversation_id: str, 
         user_email: str, 
         skip: int = 0, 
-        limit: int = 50
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None
     ) -> List[MessageResponse]:
-        """Récupérer les messages d'une conversation"""
+        """Récupérer les messages d'une conversation (par skip ou par curseur before/after)"""
         # Vérifier que l'utilisateur fait partie de la conversation
         conv = await self.conversations_collection.find_one({
             "_id": ObjectId(conversation_id),
@@ -100,67 +213,125 @@ class MessageService:
         if not conv:
             raise ValueError("Conversation non trouvée ou accès non autorisé")
 
-        cursor = self.messages_collection.find(
-            {"conversation_id": conversation_id}
-        ).sort("created_at", -1).skip(skip).limit(limit)
+        messages = await self._find_messages_page(conversation_id, skip, limit, before, after)
         
-        messages = await cursor.to_list(length=limit)
+        # Marquer les messages comme lus (écriture différée, seulement s'il y avait des non-lus)
+        self._schedule_mark_read(conversation_id, user_email)
         
-        # Marquer les messages comme lus
-        await self._mark_messages_as_read(conversation_id, user_email)
-        
-        return [self._message_to_response(msg) for msg in reversed(messages)]
+        return messages
 
     async def send_message(self, conversation_id: str, message_data: MessageCreate, sender_email: str) -> MessageResponse:
         """Envoyer un message dans une conversation"""
-        # Vérifier que l'utilisateur fait partie de la conversation
-        conv = await self.conversations_collection.find_one({
-            "_id": ObjectId(conversation_id),
-            "participants": sender_email
-        })
+        # Vérifier l'appartenance à la conversation et charger l'expéditeur en parallèle
+        conv, sender = await asyncio.gather(
+            self.conversations_collection.find_one(
+                {"_id": ObjectId(conversation_id), "participants": sender_email},
+                {"participants": 1}
+            ),
+            self.user_service.get_cached_profile(sender_email)
+        )
         
         if not conv:
             raise ValueError("Conversation non trouvée ou accès non autorisé")
-
-        # Récupérer les infos de l'expéditeur
-        user = await self.user_service.get_by_email(sender_email)
-        if not user:
+        if not sender:
             raise ValueError("Utilisateur non trouvé")
 
-        message_dict = {
-            **message_data.dict(),
-            "conversation_id": conversation_id,
-            "sender_email": sender_email,
-            "sender_name": user.full_name,
-            "sender_avatar": user.avatar_url or "https://images.pexels.com/photos/220453/pexels-photo-220453.jpeg?auto=compress&cs=tinysrgb&w=50&h=50&fit=crop",
-            "reactions": [],
-            "created_at": datetime.utcnow(),
-            "edited_at": None
-        }
+        message_dict = self._build_message(conversation_id, message_data, sender)
+        now = message_dict["created_at"]
 
-        result = await self.messages_collection.insert_one(message_dict)
-        
-        # Mettre à jour la conversation
-        unread_updates = {}
-        for participant in conv["participants"]:
-            if participant != sender_email:
-                current_unread = conv.get("unread_count", {}).get(participant, 0)
-                unread_updates[f"unread_count.{participant}"] = current_unread + 1
-
-        await self.conversations_collection.update_one(
-            {"_id": ObjectId(conversation_id)},
-            {
-                "$set": {
-                    "last_message": message_data.content[:100] + "..." if len(message_data.content) > 100 else message_data.content,
-                    "last_message_time": datetime.utcnow(),
-                    "updated_at": datetime.utcnow(),
-                    **unread_updates
-                }
+        # Mettre à jour la conversation (les non-lus sont comptés dans l'inbox de chaque participant)
+        preview = message_data.content[:100] + "..." if len(message_data.content) > 100 else message_data.content
+        conversation_update = {
+            "$set": {
+                "last_message": preview,
+                "last_message_time": now,
+                "updated_at": now
             }
+        }
+
+        await asyncio.gather(
+            self.message_store.insert(message_dict),
+            self.conversations_collection.update_one({"_id": conv["_id"]}, conversation_update),
+            self.inbox_service.record_message(conversation_id, sender_email, preview, now)
         )
 
-        created_message = await self.messages_collection.find_one({"_id": result.inserted_id})
-        return self._message_to_response(created_message)
+        message = self._message_to_response(message_dict)
+        await self._publish_message(conversation_id, message)
+        return message
+
+    # SIGNAUX ÉPHÉMÈRES (rien n'est écrit en base sur le chemin critique)
+    async def send_typing(self, conversation_id: str, user_email: str):
+        """Signaler aux abonnés que l'utilisateur écrit (au plus un signal par intervalle)"""
+        throttle_key = (conversation_id, user_email)
+        if typing_throttle.get(throttle_key):
+            return
+        typing_throttle.set(throttle_key, True)
+
+        await connection_manager.publish(chat_channel(conversation_id), {
+            "type": "typing",
+            "conversation_id": conversation_id,
+            "user": user_email
+        })
+
+    async def mark_read(
+        self,
+        conversation_id: str,
+        user_email: str,
+        message_id: Optional[str] = None,
+        is_bastion: bool = False
+    ):
+        """Accusé de lecture : diffusé tout de suite, position de lecture écrite plus tard par lots"""
+        if message_id is not None and not ObjectId.is_valid(message_id):
+            raise ValueError("ID de message invalide")
+
+        # Les bastions n'ont pas d'inbox : rien à écrire
+        if not is_bastion:
+            self._schedule_mark_read(conversation_id, user_email)
+
+        await connection_manager.publish(chat_channel(conversation_id), {
+            "type": "read",
+            "conversation_id": conversation_id,
+            "user": user_email,
+            "message_id": message_id
+        })
+
+    # SYNCHRONISATION
+    async def sync(self, user_email: str, since: Optional[str] = None, limit: int = 500) -> SyncResponse:
+        """Changements depuis ``since`` : nouveaux messages, réactions et conversations modifiées.
+
+        Sans ``since``, seules les conversations sont renvoyées, avec le curseur
+        de départ. Le curseur recouvre SYNC_OVERLAP pour ne pas manquer une
+        écriture concurrente : le client remplace simplement les éléments déjà reçus.
+        """
+        started_at = utcnow_millis()
+        since_at, after_id = decode_sync_cursor(since) if since else (None, None)
+
+        if since_at is None:
+            messages = []
+            entries = await self._get_inbox_entries(user_email)
+        else:
+            chat_ids = await self._get_user_chat_ids(user_email)
+            messages, entries = await asyncio.gather(
+                self.message_store.find_changed(chat_ids, since_at, limit, after_id),
+                self.inbox_service.get_changed_entries(user_email, since_at)
+            )
+
+        # Page pleine : reprendre juste après le dernier changement renvoyé
+        has_more = len(messages) >= limit
+        if has_more:
+            cursor = encode_sync_cursor(messages[-1]["updated_at"], messages[-1]["_id"])
+        else:
+            cursor = encode_sync_cursor(started_at - SYNC_OVERLAP)
+
+        return SyncResponse(
+            messages=[
+                SyncMessageResponse(**self._message_to_response(msg).dict(), conversation_id=msg["conversation_id"])
+                for msg in messages
+            ],
+            conversations=await self._inbox_entries_to_response(entries),
+            cursor=cursor,
+            has_more=has_more
+        )
 
     # BASTIONS
     async def get_available_bastions(
@@ -170,38 +341,73 @@ class MessageService:
         skip: int = 0,
         limit: int = 20
     ) -> List[BastionResponse]:
-        """Récupérer les bastions disponibles"""
+        """Récupérer les bastions disponibles (par pertinence si une recherche est donnée)"""
         query = {"is_private": False}
+        projection = dict(BASTION_LIST_PROJECTION)
+        sort = [("last_activity", DESCENDING)]
         
-        if search:
-            query["$or"] = [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"description": {"$regex": search, "$options": "i"}}
-            ]
+        terms = sanitize_text_search(search)
+        if terms:
+            query.update(text_filter(terms))
+            projection["score"] = TEXT_SCORE
+            sort = text_sort(("last_activity", DESCENDING))
         
         if tags:
             query["tags"] = {"$in": tags}
 
-        cursor = self.bastions_collection.find(query).sort("last_activity", -1).skip(skip).limit(limit)
-        bastions = await cursor.to_list(length=limit)
+        cursor = self.bastions_collection.find(query, projection).sort(sort).skip(skip).limit(limit)
+        bastions = await self._with_members_count(await cursor.to_list(length=limit))
         
         return [self._bastion_to_response(bastion) for bastion in bastions]
 
+    async def get_bastion_tags(self, search: Optional[str] = None, limit: int = 20) -> List[BastionTagFacet]:
+        """Tags les plus utilisés par les bastions publics (correspondant à la recherche)"""
+        terms = sanitize_text_search(search)
+        cache_key = (terms, limit)
+        facets = bastion_tags_cache.get(cache_key)
+        if facets is None:
+            match = {"is_private": False}
+            if terms:
+                match.update(text_filter(terms))
+
+            cursor = self.bastions_collection.aggregate([
+                {"$match": match},
+                {"$unwind": "$tags"},
+                {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+                {"$limit": limit}
+            ])
+            facets = [BastionTagFacet(tag=doc["_id"], count=doc["count"]) async for doc in cursor]
+            bastion_tags_cache.set(cache_key, facets)
+        return facets
+
     async def get_user_bastions(self, user_email: str) -> List[BastionResponse]:
         """Récupérer les bastions de l'utilisateur"""
         cursor = self.bastions_collection.find(
-            {"members": user_email}
+            {"members": user_email}, BASTION_LIST_PROJECTION
         ).sort("last_activity", -1)
         
-        bastions = await cursor.to_list(length=None)
+        bastions = await self._with_members_count(await cursor.to_list(length=None))
         return [self._bastion_to_response(bastion) for bastion in bastions]
 
+    async def _with_members_count(self, bastions: List[dict]) -> List[dict]:
+        """Compléter members_count des bastions antérieurs au compteur (projection sans members)"""
+        legacy = [bastion["_id"] for bastion in bastions if "members_count" not in bastion]
+        if legacy:
+            cursor = self.bastions_collection.find({"_id": {"$in": legacy}}, {"members": 1})
+            counts = {doc["_id"]: len(doc.get("members", [])) async for doc in cursor}
+            for bastion in bastions:
+                if bastion["_id"] in counts:
+                    bastion["members_count"] = counts[bastion["_id"]]
+        return bastions
+
     async def create_bastion(self, bastion_data: BastionCreate, creator_email: str) -> BastionResponse:
         """Créer un nouveau bastion"""
         bastion_dict = {
             **bastion_data.dict(),
             "creator_email": creator_email,
             "members": [creator_email],  # Le créateur est automatiquement membre
+            "members_count": 1,
             "avatar": "🏰",
             "last_activity": datetime.utcnow(),
             "created_at": datetime.utcnow()
@@ -217,165 +423,257 @@ class MessageService:
         if not ObjectId.is_valid(bastion_id):
             return False
 
-        bastion = await self.bastions_collection.find_one({"_id": ObjectId(bastion_id)})
-        if not bastion:
-            return False
-
-        # Vérifier si l'utilisateur n'est pas déjà membre
-        if user_email in bastion.get("members", []):
-            return True
-
-        # Vérifier si le bastion n'est pas plein
-        if len(bastion.get("members", [])) >= bastion.get("max_members", 15):
-            return False
-
-        # Ajouter l'utilisateur
-        result = await self.bastions_collection.update_one(
-            {"_id": ObjectId(bastion_id)},
+        # Ajouter l'utilisateur seulement s'il n'est pas déjà membre et s'il reste de la place
+        joined = await self._update_members(
+            bastion_id,
             {
-                "$push": {"members": user_email},
+                "members": {"$ne": user_email},
+                "$expr": {"$lt": ["$members_count", {"$ifNull": ["$max_members", DEFAULT_MAX_MEMBERS]}]}
+            },
+            {
+                "$addToSet": {"members": user_email},
+                "$inc": {"members_count": 1},
                 "$set": {"last_activity": datetime.utcnow()}
             }
         )
 
-        return result.modified_count > 0
+        if joined:
+            await self._invalidate_bastion_members(bastion_id)
+            await connection_manager.subscribe_users([user_email], chat_channel(bastion_id))
+            return True
+
+        # Refus : bastion plein ou inexistant, sauf si l'utilisateur en est déjà membre
+        return await self.bastions_collection.count_documents(
+            {"_id": ObjectId(bastion_id), "members": user_email}, limit=1
+        ) > 0
 
     async def leave_bastion(self, bastion_id: str, user_email: str) -> bool:
         """Quitter un bastion"""
         if not ObjectId.is_valid(bastion_id):
             return False
 
-        result = await self.bastions_collection.update_one(
-            {"_id": ObjectId(bastion_id)},
+        left = await self._update_members(
+            bastion_id,
+            {"members": user_email},
             {
                 "$pull": {"members": user_email},
+                "$inc": {"members_count": -1},
                 "$set": {"last_activity": datetime.utcnow()}
             }
         )
 
-        return result.modified_count > 0
+        if left:
+            await self._invalidate_bastion_members(bastion_id)
+            await connection_manager.unsubscribe_users([user_email], chat_channel(bastion_id))
+            return True
+        return False
+
+    async def _update_members(self, bastion_id: str, query: dict, update: dict) -> bool:
+        """Modifier members et members_count ensemble; retourne True si le bastion a été modifié.
+
+        Un bastion créé avant le compteur le reçoit d'abord : sans lui, $inc
+        repartirait de zéro et la limite max_members ne serait pas appliquée.
+        """
+        query = {"_id": ObjectId(bastion_id), "members_count": {"$exists": True}, **query}
+        result = await self.bastions_collection.update_one(query, update)
+        if result.modified_count == 0:
+            counted = await self.bastions_collection.update_one(
+                {"_id": ObjectId(bastion_id), "members_count": {"$exists": False}},
+                [{"$set": {"members_count": {"$size": {"$ifNull": ["$members", []]}}}}]
+            )
+            if counted.modified_count:
+                result = await self.bastions_collection.update_one(query, update)
+        if result.modified_count == 0:
+            return False
+
+        # Cache de ce processus vidé tout de suite, sans attendre la diffusion aux autres workers
+        bastion_members_cache.invalidate(bastion_id)
+        return True
 
     async def get_bastion_messages(
         self, 
         bastion_id: str, 
         user_email: str, 
         skip: int = 0, 
-        limit: int = 50
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None
     ) -> List[MessageResponse]:
-        """Récupérer les messages d'un bastion"""
+        """Récupérer les messages d'un bastion (par skip ou par curseur before/after)"""
         # Vérifier que l'utilisateur est membre du bastion
-        bastion = await self.bastions_collection.find_one({
-            "_id": ObjectId(bastion_id),
-            "members": user_email
-        })
-        
-        if not bastion:
+        if user_email not in await self._get_bastion_members(bastion_id):
             raise ValueError("Bastion non trouvé ou accès non autorisé")
 
-        cursor = self.messages_collection.find(
-            {"conversation_id": bastion_id}
-        ).sort("created_at", -1).skip(skip).limit(limit)
-        
-        messages = await cursor.to_list(length=limit)
-        return [self._message_to_response(msg) for msg in reversed(messages)]
+        return await self._find_messages_page(bastion_id, skip, limit, before, after)
 
     async def send_bastion_message(self, bastion_id: str, message_data: MessageCreate, sender_email: str) -> MessageResponse:
         """Envoyer un message dans un bastion"""
-        # Vérifier que l'utilisateur est membre du bastion
-        bastion = await self.bastions_collection.find_one({
-            "_id": ObjectId(bastion_id),
-            "members": sender_email
-        })
+        # Vérifier l'appartenance au bastion et charger l'expéditeur (tous deux en cache)
+        members, sender = await asyncio.gather(
+            self._get_bastion_members(bastion_id),
+            self.user_service.get_cached_profile(sender_email)
+        )
         
-        if not bastion:
+        if sender_email not in members:
             raise ValueError("Bastion non trouvé ou accès non autorisé")
-
-        # Récupérer les infos de l'expéditeur
-        user = await self.user_service.get_by_email(sender_email)
-        if not user:
+        if not sender:
             raise ValueError("Utilisateur non trouvé")
 
-        message_dict = {
-            **message_data.dict(),
-            "conversation_id": bastion_id,
-            "sender_email": sender_email,
-            "sender_name": user.full_name,
-            "sender_avatar": user.avatar_url or "https://images.pexels.com/photos/220453/pexels-photo-220453.jpeg?auto=compress&cs=tinysrgb&w=50&h=50&fit=crop",
-            "reactions": [],
-            "created_at": datetime.utcnow(),
-            "edited_at": None
-        }
+        message_dict = self._build_message(bastion_id, message_data, sender)
+        await self.message_store.insert(message_dict)
 
-        result = await self.messages_collection.insert_one(message_dict)
-        
-        # Mettre à jour l'activité du bastion
-        await self.bastions_collection.update_one(
+        # Activité du bastion : écriture différée, au plus une par bastion et par intervalle
+        write_buffer.schedule(
+            ("bastion_activity", bastion_id),
+            self.bastions_collection,
             {"_id": ObjectId(bastion_id)},
-            {"$set": {"last_activity": datetime.utcnow()}}
+            {"$max": {"last_activity": message_dict["created_at"]}}
         )
 
-        created_message = await self.messages_collection.find_one({"_id": result.inserted_id})
-        return self._message_to_response(created_message)
+        message = self._message_to_response(message_dict)
+        await self._publish_message(bastion_id, message)
+        return message
 
     async def add_reaction(self, message_id: str, emoji: str, user_email: str) -> Dict[str, any]:
-        """Ajouter une réaction à un message"""
+        """Ajouter (ou retirer si déjà présente) une réaction à un message"""
         if not ObjectId.is_valid(message_id):
             raise ValueError("ID de message invalide")
 
-        message = await self.messages_collection.find_one({"_id": ObjectId(message_id)})
+        message = await self.message_store.toggle_reaction(ObjectId(message_id), emoji, user_email)
         if not message:
             raise ValueError("Message non trouvé")
 
         reactions = message.get("reactions", [])
-        
-        # Chercher si la réaction existe déjà
-        for reaction in reactions:
-            if reaction["emoji"] == emoji:
-                if user_email in reaction["users"]:
-                    # Retirer la réaction
-                    reaction["users"].remove(user_email)
-                    reaction["count"] -= 1
-                    if reaction["count"] == 0:
-                        reactions.remove(reaction)
-                else:
-                    # Ajouter la réaction
-                    reaction["users"].append(user_email)
-                    reaction["count"] += 1
-                break
-        else:
-            # Nouvelle réaction
-            reactions.append({
-                "emoji": emoji,
-                "count": 1,
-                "users": [user_email]
-            })
-
-        await self.messages_collection.update_one(
-            {"_id": ObjectId(message_id)},
-            {"$set": {"reactions": reactions}}
-        )
+        await connection_manager.publish(chat_channel(message["conversation_id"]), {
+            "type": "reaction",
+            "conversation_id": message["conversation_id"],
+            "message_id": message_id,
+            "reactions": reactions
+        })
 
         return {"success": True, "reactions": reactions}
 
-    async def _mark_messages_as_read(self, conversation_id: str, user_email: str):
-        """Marquer les messages comme lus"""
-        await self.conversations_collection.update_one(
-            {"_id": ObjectId(conversation_id)},
-            {"$set": {f"unread_count.{user_email}": 0}}
+    def _build_message(self, conversation_id: str, message_data: MessageCreate, sender: dict) -> dict:
+        """Construire le document d'un nouveau message (avec son _id, sans relecture après insertion)"""
+        now = utcnow_millis()
+        return {
+            **message_data.dict(),
+            "_id": ObjectId(),
+            "conversation_id": conversation_id,
+            "sender_email": sender["email"],
+            "sender_name": sender["full_name"],
+            "sender_avatar": sender.get("avatar_url") or DEFAULT_AVATAR,
+            "reactions": [],
+            "created_at": now,
+            "updated_at": now,
+            "edited_at": None
+        }
+
+    async def _get_bastion_members(self, bastion_id: str) -> Set[str]:
+        """Membres d'un bastion, depuis le cache (set vide si le bastion n'existe pas)"""
+        members = bastion_members_cache.get(bastion_id)
+        if members is None:
+            bastion = None
+            if ObjectId.is_valid(bastion_id):
+                bastion = await self.bastions_collection.find_one({"_id": ObjectId(bastion_id)}, {"members": 1})
+            members = frozenset(bastion.get("members", [])) if bastion else frozenset()
+            bastion_members_cache.set(bastion_id, members)
+        return members
+
+    async def _invalidate_bastion_members(self, bastion_id: str):
+        """Vider le cache des membres sur les autres workers (celui de ce processus l'est par _update_members)"""
+        await connection_manager.publish(BASTION_MEMBERS_CHANNEL, {"type": "invalidate", "bastion_id": bastion_id})
+
+    async def get_user_chats(self, user_email: str) -> Tuple[List[str], List[str]]:
+        """Identifiants des conversations directes et des bastions de l'utilisateur"""
+        conversations, bastions = await asyncio.gather(
+            self.conversations_collection.find({"participants": user_email}, {"_id": 1}).to_list(length=None),
+            self.bastions_collection.find({"members": user_email}, {"_id": 1}).to_list(length=None)
         )
+        return [str(doc["_id"]) for doc in conversations], [str(doc["_id"]) for doc in bastions]
+
+    async def _get_user_chat_ids(self, user_email: str) -> List[str]:
+        """Identifiants des conversations et bastions de l'utilisateur"""
+        conversation_ids, bastion_ids = await self.get_user_chats(user_email)
+        return conversation_ids + bastion_ids
+
+    async def _publish_message(self, conversation_id: str, message: MessageResponse):
+        """Pousser un nouveau message aux clients abonnés"""
+        await connection_manager.publish(chat_channel(conversation_id), {
+            "type": "message",
+            "conversation_id": conversation_id,
+            "message": message
+        })
+
+    async def _find_messages_page(
+        self,
+        conversation_id: str,
+        skip: int,
+        limit: int,
+        before: Optional[str],
+        after: Optional[str]
+    ) -> List[MessageResponse]:
+        """Lire une page de messages, du plus ancien au plus récent.
+
+        Avec ``before``/``after``, la page est lue par position (created_at, _id)
+        directement dans l'index au lieu de parcourir les messages sautés.
+        """
+        if after:
+            messages = await self.message_store.find_range(
+                conversation_id, limit, newest_first=False, bound=decode_cursor(after)
+            )
+            return [self._message_to_response(msg) for msg in messages]
+
+        if before:
+            messages = await self.message_store.find_range(conversation_id, limit, bound=decode_cursor(before))
+        else:
+            messages = await self.message_store.find_range(conversation_id, limit, skip=skip)
+
+        return [self._message_to_response(msg) for msg in reversed(messages)]
 
-    async def _conversation_to_response(self, conv_doc: dict, user_email: str) -> ConversationResponse:
+    @staticmethod
+    def next_cursor(messages: List[MessageResponse], limit: int, after: Optional[str] = None) -> Optional[str]:
+        """Curseur de la page suivante : plus récent message en mode after, plus ancien sinon"""
+        if after:
+            if not messages:
+                return after
+            return encode_cursor(messages[-1].created_at, messages[-1].id)
+
+        if len(messages) < limit:
+            return None
+        return encode_cursor(messages[0].created_at, messages[0].id)
+
+    def _schedule_mark_read(self, conversation_id: str, user_email: str):
+        """Marquer les messages comme lus au prochain lot d'écritures différées.
+
+        Les lectures répétées d'une même conversation ne coûtent qu'une écriture
+        par intervalle, et aucune s'il n'y a pas de non-lus.
+        """
+        self.inbox_service.schedule_mark_read(conversation_id, user_email, utcnow_millis())
+
+    async def _conversation_to_response(
+        self,
+        conv_doc: dict,
+        user_email: str,
+        profiles: Optional[Dict[str, dict]] = None
+    ) -> ConversationResponse:
         """Convertir un document conversation en réponse"""
+        if profiles is None:
+            profiles = await self.user_service.get_many_by_email(
+                [email for email in conv_doc["participants"] if email != user_email]
+            )
+        online = await presence.online_emails(profiles)
+
         participants_info = []
         for participant_email in conv_doc["participants"]:
             if participant_email != user_email:
-                user = await self.user_service.get_by_email(participant_email)
-                if user:
+                profile = profiles.get(participant_email)
+                if profile:
                     participants_info.append(ParticipantInfo(
                         email=participant_email,
-                        name=user.full_name,
-                        avatar=user.avatar_url or "https://images.pexels.com/photos/220453/pexels-photo-220453.jpeg?auto=compress&cs=tinysrgb&w=50&h=50&fit=crop",
-                        is_online=False
+                        name=profile["full_name"],
+                        avatar=profile.get("avatar_url") or DEFAULT_AVATAR,
+                        is_online=participant_email in online
                     ))
         
         unread_count = conv_doc.get("unread_count", {}).get(user_email, 0)
@@ -391,6 +689,34 @@ class MessageService:
             created_at=conv_doc["created_at"]
         )
 
+    async def _inbox_entries_to_response(self, entries: List[dict]) -> List[ConversationResponse]:
+        """Convertir des entrées d'inbox, avec la présence de tous les participants lue en un lot"""
+        online = await presence.online_emails(
+            peer["email"] for entry in entries for peer in entry.get("peers", [])
+        )
+        return [self._inbox_entry_to_response(entry, online) for entry in entries]
+
+    def _inbox_entry_to_response(self, entry: dict, online: Set[str]) -> ConversationResponse:
+        """Convertir une entrée d'inbox en réponse (aucune lecture en base)"""
+        return ConversationResponse(
+            id=entry["conversation_id"],
+            name=entry.get("name"),
+            conversation_type=entry["conversation_type"],
+            participants=[
+                ParticipantInfo(
+                    email=peer["email"],
+                    name=peer["name"],
+                    avatar=peer.get("avatar_url") or DEFAULT_AVATAR,
+                    is_online=peer["email"] in online
+                )
+                for peer in entry.get("peers", [])
+            ],
+            last_message=entry.get("last_message"),
+            last_message_time=entry.get("last_message_time"),
+            unread_count=entry.get("unread_count", 0),
+            created_at=entry["created_at"]
+        )
+
     def _message_to_response(self, msg_doc: dict) -> MessageResponse:
         """Convertir un document message en réponse"""
         return MessageResponse(
@@ -412,10 +738,11 @@ class MessageService:
             name=bastion_doc["name"],
             description=bastion_doc["description"],
             is_private=bastion_doc["is_private"],
-            max_members=bastion_doc["max_members"],
+            max_members=bastion_doc.get("max_members", DEFAULT_MAX_MEMBERS),
             tags=bastion_doc.get("tags", []),
             avatar=bastion_doc.get("avatar", "🏰"),
-            members_count=len(bastion_doc.get("members", [])),
+            # Bastion antérieur au compteur (migration pas encore passée)
+            members_count=bastion_doc.get("members_count", len(bastion_doc.get("members", []))),
             last_activity=bastion_doc["last_activity"],
             created_at=bastion_doc["created_at"]
         )
\ No newline at end of file
@@ -0,0 +1,386 @@
+from typing import Iterator, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+from datetime import datetime
+import asyncio
+
+from app.core.config import settings
+
+INDEXES = {
+    "messages": [
+        IndexModel([("conversation_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("conversation_id", ASCENDING), ("updated_at", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "message_buckets": [
+        IndexModel([("conversation_id", ASCENDING), ("last_at", DESCENDING)]),
+        IndexModel([("conversation_id", ASCENDING), ("first_at", ASCENDING)]),
+        IndexModel([("conversation_id", ASCENDING), ("open", ASCENDING), ("count", ASCENDING)]),
+        # Un seul bucket ouvert par conversation, même quand deux insertions se croisent
+        IndexModel(
+            [("conversation_id", ASCENDING)],
+            name="conversation_id_1_open_bucket",
+            unique=True,
+            partialFilterExpression={"open": True}
+        ),
+        IndexModel([("conversation_id", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("messages._id", ASCENDING)]),
+    ],
+}
+
+# Ordre de l'historique : plus récents en premier, _id pour départager les égalités
+MESSAGES_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+def utcnow_millis() -> datetime:
+    """Heure UTC tronquée à la milliseconde, la précision des dates stockées par MongoDB"""
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+# Position d'un message dans l'historique : (created_at, _id)
+Position = Tuple[datetime, ObjectId]
+
+# Ordre des changements pour la synchronisation : (updated_at, _id)
+CHANGES_SORT = [("updated_at", ASCENDING), ("_id", ASCENDING)]
+
+def change_position(message: dict) -> Tuple[datetime, ObjectId]:
+    return message["updated_at"], message["_id"]
+
+def changed_since(since: datetime, after_id: Optional[ObjectId], prefix: str = "") -> dict:
+    """Filtre des changements postérieurs à ``since``, ou à la position (since, after_id) si elle est donnée"""
+    updated_at, _id = f"{prefix}updated_at", f"{prefix}_id"
+    if after_id is None:
+        return {updated_at: {"$gte": since}}
+    return {"$or": [{updated_at: {"$gt": since}}, {updated_at: since, _id: {"$gt": after_id}}]}
+
+# Champs communs à tout le bucket, retirés des messages qu'il contient
+BUCKET_SHARED_FIELDS = ("conversation_id", "sender_name", "sender_avatar")
+
+def message_position(message: dict) -> Position:
+    return message["created_at"], message["_id"]
+
+def pack_message(message: dict) -> dict:
+    """Message tel que stocké dans un bucket (expéditeur réduit à son email)"""
+    return {key: value for key, value in message.items() if key not in BUCKET_SHARED_FIELDS}
+
+def merge_messages(documents: List[dict], bucketed: List[dict]) -> List[dict]:
+    """Fusionner les deux stockages : un message présent des deux côtés (compaction en cours) est lu dans ``messages``"""
+    document_ids = {message["_id"] for message in documents}
+    return documents + [message for message in bucketed if message["_id"] not in document_ids]
+
+def message_sender(message: dict) -> dict:
+    return {"email": message["sender_email"], "name": message["sender_name"], "avatar": message["sender_avatar"]}
+
+def unpack_bucket(bucket: dict) -> Iterator[dict]:
+    """Reconstituer les documents message d'un bucket"""
+    senders = {sender["email"]: sender for sender in bucket.get("senders", [])}
+    for message in bucket.get("messages", []):
+        sender = senders[message["sender_email"]]
+        yield {
+            **message,
+            "conversation_id": bucket["conversation_id"],
+            "sender_name": sender["name"],
+            "sender_avatar": sender["avatar"],
+        }
+
+def toggled_reactions(reactions: str, emoji: str, user_email: str) -> dict:
+    """Expression d'agrégation : ``reactions`` après ajout ou retrait de la réaction de l'utilisateur.
+
+    Évaluée par MongoDB dans une mise à jour par pipeline, la bascule est
+    atomique : deux réactions simultanées ne s'écrasent plus. Les valeurs
+    fournies par l'utilisateur passent par $literal (un emoji commençant par
+    « $ » serait sinon lu comme un chemin de champ).
+    """
+    emoji, user_email = {"$literal": emoji}, {"$literal": user_email}
+    current = {"$ifNull": [reactions, []]}
+    toggled = {
+        "$map": {
+            "input": current,
+            "as": "reaction",
+            "in": {
+                "$cond": [
+                    {"$ne": ["$$reaction.emoji", emoji]},
+                    "$$reaction",
+                    {
+                        "$let": {
+                            "vars": {
+                                "users": {
+                                    "$cond": [
+                                        {"$in": [user_email, "$$reaction.users"]},
+                                        {"$filter": {
+                                            "input": "$$reaction.users",
+                                            "as": "user",
+                                            "cond": {"$ne": ["$$user", user_email]}
+                                        }},
+                                        {"$concatArrays": ["$$reaction.users", [user_email]]}
+                                    ]
+                                }
+                            },
+                            "in": {"emoji": emoji, "count": {"$size": "$$users"}, "users": "$$users"}
+                        }
+                    }
+                ]
+            }
+        }
+    }
+    return {
+        "$cond": [
+            {"$in": [emoji, {"$map": {"input": current, "as": "reaction", "in": "$$reaction.emoji"}}]},
+            # Réaction existante : basculer l'utilisateur, retirer la réaction si plus personne
+            {"$filter": {"input": toggled, "as": "reaction", "cond": {"$gt": ["$$reaction.count", 0]}}},
+            # Nouvelle réaction
+            {"$concatArrays": [current, [{"emoji": emoji, "count": 1, "users": [user_email]}]]}
+        ]
+    }
+
+class DocumentMessageStore:
+    """Un document par message dans la collection messages"""
+
+    def __init__(self, database: AsyncIOMotorDatabase):
+        self.collection = database.messages
+
+    async def insert(self, message: dict):
+        await self.collection.insert_one(message)
+
+    async def find_range(
+        self,
+        conversation_id: str,
+        limit: int,
+        newest_first: bool = True,
+        bound: Optional[Position] = None,
+        skip: int = 0
+    ) -> List[dict]:
+        """Lire des messages à partir d'une position (exclue), dans l'ordre demandé"""
+        query = {"conversation_id": conversation_id}
+        operator, direction = ("$lt", DESCENDING) if newest_first else ("$gt", ASCENDING)
+
+        if bound:
+            created_at, message_id = bound
+            query["$or"] = [
+                {"created_at": {operator: created_at}},
+                {"created_at": created_at, "_id": {operator: message_id}}
+            ]
+
+        cursor = self.collection.find(query).sort(
+            [("created_at", direction), ("_id", direction)]
+        ).skip(skip).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def find_changed(
+        self,
+        conversation_ids: List[str],
+        since: datetime,
+        limit: int,
+        after_id: Optional[ObjectId] = None
+    ) -> List[dict]:
+        """Messages créés ou modifiés (updated_at) depuis ``since``, du plus ancien changement au plus récent.
+
+        Avec ``after_id``, la lecture reprend strictement après la position
+        (since, after_id) : une page pleine de changements de la même
+        milliseconde ne bloque pas la synchronisation.
+        """
+        cursor = self.collection.find(
+            {"conversation_id": {"$in": conversation_ids}, **changed_since(since, after_id)}
+        ).sort(CHANGES_SORT).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def toggle_reaction(self, message_id: ObjectId, emoji: str, user_email: str) -> Optional[dict]:
+        """Ajouter ou retirer la réaction en une seule mise à jour; retourne le message modifié"""
+        return await self.collection.find_one_and_update(
+            {"_id": message_id},
+            [{"$set": {
+                "reactions": toggled_reactions("$reactions", emoji, user_email),
+                "updated_at": utcnow_millis()
+            }}],
+            projection={"conversation_id": 1, "reactions": 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+# Tentatives d'insertion dans le bucket ouvert avant d'abandonner
+INSERT_ATTEMPTS = 3
+
+class BucketMessageStore(DocumentMessageStore):
+    """Messages regroupés par conversation dans des buckets d'au plus ``bucket_size`` messages.
+
+    Le nom et l'avatar des expéditeurs sont stockés une fois par bucket. Les
+    messages encore stockés un par un (pas encore compactés, voir
+    ``app.jobs.compact_messages``) restent lisibles : chaque lecture fusionne
+    les deux collections.
+    """
+
+    def __init__(self, database: AsyncIOMotorDatabase, bucket_size: int):
+        super().__init__(database)
+        self.buckets = database.message_buckets
+        self.bucket_size = bucket_size
+
+    async def insert(self, message: dict):
+        conversation_id = message["conversation_id"]
+        update = {
+            "$push": {"messages": pack_message(message)},
+            "$addToSet": {"senders": message_sender(message)},
+            "$inc": {"count": 1},
+            "$min": {"first_at": message["created_at"]},
+            "$max": {"last_at": message["created_at"], "updated_at": message["updated_at"]}
+        }
+
+        # Ajouter au bucket ouvert de la conversation, ou en créer un nouveau
+        for _ in range(INSERT_ATTEMPTS - 1):
+            try:
+                await self.buckets.update_one(
+                    {"conversation_id": conversation_id, "open": True, "count": {"$lt": self.bucket_size}},
+                    update,
+                    upsert=True
+                )
+                return
+            except DuplicateKeyError:
+                # Un bucket ouvert existe déjà : créé par une insertion concurrente
+                # (la prochaine tentative le trouve), ou plein, et alors on le ferme
+                await self.buckets.update_one(
+                    {"conversation_id": conversation_id, "open": True, "count": {"$gte": self.bucket_size}},
+                    {"$set": {"open": False}}
+                )
+        await self.buckets.update_one(
+            {"conversation_id": conversation_id, "open": True, "count": {"$lt": self.bucket_size}},
+            update,
+            upsert=True
+        )
+
+    async def find_range(
+        self,
+        conversation_id: str,
+        limit: int,
+        newest_first: bool = True,
+        bound: Optional[Position] = None,
+        skip: int = 0
+    ) -> List[dict]:
+        count = skip + limit
+        documents, bucketed = await asyncio.gather(
+            super().find_range(conversation_id, count, newest_first, bound),
+            self._find_bucketed_range(conversation_id, count, newest_first, bound)
+        )
+        messages = sorted(merge_messages(documents, bucketed), key=message_position, reverse=newest_first)
+        return messages[skip:count]
+
+    async def _find_bucketed_range(
+        self,
+        conversation_id: str,
+        count: int,
+        newest_first: bool,
+        bound: Optional[Position]
+    ) -> List[dict]:
+        """Lire les buckets un par un jusqu'à avoir ``count`` messages au-delà de la position"""
+        query = {"conversation_id": conversation_id}
+        if newest_first:
+            edge, direction = "last_at", DESCENDING
+            if bound:
+                query["first_at"] = {"$lte": bound[0]}
+        else:
+            edge, direction = "first_at", ASCENDING
+            if bound:
+                query["last_at"] = {"$gte": bound[0]}
+
+        def beyond_bound(message: dict) -> bool:
+            if bound is None:
+                return True
+            position = message_position(message)
+            return position < bound if newest_first else position > bound
+
+        messages: List[dict] = []
+        cursor = self.buckets.find(query).sort(edge, direction).batch_size(2)
+        async for bucket in cursor:
+            if len(messages) >= count:
+                # Les buckets suivants ne contiennent que des messages plus éloignés
+                furthest = messages[count - 1]["created_at"]
+                if (bucket[edge] < furthest) if newest_first else (bucket[edge] > furthest):
+                    break
+
+            messages.extend(message for message in unpack_bucket(bucket) if beyond_bound(message))
+            messages.sort(key=message_position, reverse=newest_first)
+
+        return messages[:count]
+
+    async def find_changed(
+        self,
+        conversation_ids: List[str],
+        since: datetime,
+        limit: int,
+        after_id: Optional[ObjectId] = None
+    ) -> List[dict]:
+        documents, bucketed = await asyncio.gather(
+            super().find_changed(conversation_ids, since, limit, after_id),
+            self._find_bucketed_changes(conversation_ids, since, limit, after_id)
+        )
+        return sorted(merge_messages(documents, bucketed), key=change_position)[:limit]
+
+    async def _find_bucketed_changes(
+        self,
+        conversation_ids: List[str],
+        since: datetime,
+        limit: int,
+        after_id: Optional[ObjectId]
+    ) -> List[dict]:
+        """Messages modifiés des buckets, triés et limités par MongoDB (seuls ``limit`` messages sont lus)"""
+        pipeline = [
+            # updated_at d'un bucket : changement le plus récent parmi ses messages
+            {"$match": {"conversation_id": {"$in": conversation_ids}, "updated_at": {"$gte": since}}},
+            {"$project": {
+                "conversation_id": 1,
+                "senders": 1,
+                "messages": {"$filter": {
+                    "input": "$messages",
+                    "as": "message",
+                    "cond": {"$gte": ["$$message.updated_at", since]}
+                }}
+            }},
+            {"$unwind": "$messages"},
+            {"$match": changed_since(since, after_id, prefix="messages.")},
+            {"$sort": {"messages.updated_at": 1, "messages._id": 1}},
+            {"$limit": limit},
+        ]
+        return [
+            message
+            async for row in self.buckets.aggregate(pipeline)
+            for message in unpack_bucket({**row, "messages": [row["messages"]]})
+        ]
+
+    async def toggle_reaction(self, message_id: ObjectId, emoji: str, user_email: str) -> Optional[dict]:
+        # Le document fait foi tant qu'il existe : la compaction ne supprime que les
+        # documents inchangés depuis leur copie dans le bucket
+        message = await super().toggle_reaction(message_id, emoji, user_email)
+        if message:
+            return message
+
+        now = utcnow_millis()
+        bucket = await self.buckets.find_one_and_update(
+            {"messages._id": message_id},
+            [{"$set": {
+                "messages": {
+                    "$map": {
+                        "input": "$messages",
+                        "as": "message",
+                        "in": {
+                            "$cond": [
+                                {"$eq": ["$$message._id", message_id]},
+                                {"$mergeObjects": ["$$message", {
+                                    "reactions": toggled_reactions("$$message.reactions", emoji, user_email),
+                                    "updated_at": now
+                                }]},
+                                "$$message"
+                            ]
+                        }
+                    }
+                },
+                "updated_at": {"$max": ["$updated_at", now]}
+            }}],
+            projection={"conversation_id": 1, "senders": 1, "messages": {"$elemMatch": {"_id": message_id}}},
+            return_document=ReturnDocument.AFTER
+        )
+        if bucket:
+            return next(unpack_bucket(bucket))
+        return None
+
+def create_message_store(database: AsyncIOMotorDatabase) -> DocumentMessageStore:
+    """Stockage des messages choisi par MESSAGE_STORAGE ("document" ou "bucket")"""
+    if settings.MESSAGE_STORAGE == "bucket":
+        return BucketMessageStore(database, settings.MESSAGE_BUCKET_SIZE)
+    return DocumentMessageStore(database)
@@ -1,12 +1,128 @@
-from typing import List, Optional, Dict
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from collections import Counter
+from typing import Any, List, Optional, Dict
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import IndexModel, ASCENDING, DESCENDING, ReturnDocument
 from bson import ObjectId
 from datetime import datetime
-import re
+import asyncio
+import time
+import uuid
 
 from app.models.project import (
-    ProjectCreate, ProjectUpdate, ProjectInDB, Project, ProjectResponse
+    ProjectCreate, ProjectUpdate, ProjectInDB, Project, ProjectResponse, ProjectStepsPage,
+    ProjectFacetCount, ProjectFacets
 )
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.realtime import connection_manager
+from app.core.typeahead import content_usage, record_usage
+from app.core.search import (
+    LANGUAGE_FIELD, detect_language, find_by_relevance, refresh_search_language,
+    sanitize_text_search, text_filter, text_index, text_match
+)
+
+INDEXES = {
+    "projects": [
+        IndexModel([("language", ASCENDING)]),
+        IndexModel([("difficulty", ASCENDING)]),
+        IndexModel([("type", ASCENDING)]),
+        # Catalogue : projets publiés, plus récents en premier
+        IndexModel([("is_published", ASCENDING), ("created_at", DESCENDING)]),
+        # Recherche : titre, puis tags, puis description
+        text_index("projects_text", {"title": 10, "tags": 5, "description": 2}),
+    ],
+}
+
+PROJECTS_SORT = [("created_at", DESCENDING)]
+
+# Champs texte d'un projet, utilisés pour détecter sa langue
+TEXT_FIELDS = ("title", "description")
+
+# Listes : uniquement les champs de ProjectResponse, jamais les étapes (code de départ, consignes, indices)
+PROJECT_LIST_PROJECTION = {
+    field: 1 for field in ProjectResponse.model_fields if field != "id"
+}
+
+# Canal interne : invalider le catalogue sur tous les workers
+PROJECT_CATALOG_CHANNEL = "system:project_catalog"
+
+class ProjectCatalog:
+    """Catalogue des projets publiés, gardé en mémoire et versionné.
+
+    Le catalogue est chargé en une requête puis filtré et paginé en mémoire.
+    Chaque écriture (ou expiration après ``ttl`` secondes) change sa version :
+    ``etag`` identifie donc exactement le contenu servi par ce processus.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.version = 0
+        self.loads = 0
+        # Les versions de deux démarrages (ou de deux workers) ne se confondent pas
+        self._boot_id = uuid.uuid4().hex[:8]
+        self._projects: Optional[List[ProjectResponse]] = None
+        self._expires_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def etag(self) -> str:
+        return f'W/"{self._boot_id}-{self.version}"'
+
+    async def get(self, collection: AsyncIOMotorCollection) -> List[ProjectResponse]:
+        """Projets publiés, plus récents en premier (chargés au besoin)"""
+        if self._projects is not None and self._expires_at > time.monotonic():
+            return self._projects
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._projects is not None and self._expires_at > time.monotonic():
+                return self._projects
+
+            if self._projects is not None:
+                # Expiré : le contenu a pu changer sur un autre worker
+                self.version += 1
+            version = self.version
+            cursor = collection.find({"is_published": True}, PROJECT_LIST_PROJECTION).sort(PROJECTS_SORT)
+            projects = [ProjectService._project_to_response(doc) async for doc in cursor]
+            self.loads += 1
+
+            # Une écriture pendant le chargement rend ce résultat périmé : ne pas le garder
+            if version == self.version:
+                self._projects = projects
+                self._expires_at = time.monotonic() + self.ttl
+            return projects
+
+    def invalidate(self):
+        """Oublier le catalogue (il sera rechargé à la prochaine lecture)"""
+        self.version += 1
+        self._projects = None
+
+    def increment_completed(self, project_id: str):
+        """Répercuter une complétion sans recharger le catalogue"""
+        for index, project in enumerate(self._projects or []):
+            if project.id == project_id:
+                self._projects[index] = project.model_copy(update={"completed_by": project.completed_by + 1})
+                self.version += 1
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "loaded": self._projects is not None,
+            "size": len(self._projects or []),
+            "loads": self.loads,
+        }
+
+project_catalog = ProjectCatalog(settings.PROJECT_CATALOG_TTL_SECONDS)
+
+# Champs comptés dans la barre de filtres du catalogue
+FACET_FIELDS = ("language", "difficulty", "type")
+
+# Comptes par facette, par version du catalogue et par combinaison de filtres
+project_facets_cache = TTLCache(1000, settings.PROJECT_CATALOG_TTL_SECONDS)
+
+connection_manager.listen(PROJECT_CATALOG_CHANNEL, lambda events: project_catalog.invalidate())
 
 class ProjectService:
     def __init__(self, database: AsyncIOMotorDatabase):
@@ -23,6 +139,74 @@ class ProjectService:
         search: Optional[str] = None
     ) -> List[ProjectResponse]:
         """Récupérer les projets avec filtres"""
+        if not sanitize_text_search(search):
+            projects = [
+                project for project in await project_catalog.get(self.collection)
+                if (not language or project.language == language)
+                and (not difficulty or project.difficulty == difficulty)
+                and (not project_type or project.type == project_type)
+            ]
+            return projects[skip:skip + limit]
+
+        # Recherche : les plus pertinents d'abord, puis les plus récents
+        query = self._build_query(language, difficulty, project_type, search)
+        projects = await find_by_relevance(self.collection, query, PROJECT_LIST_PROJECTION, PROJECTS_SORT, skip, limit)
+        
+        return [self._project_to_response(project) for project in projects]
+
+    async def get_facets(
+        self,
+        language: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        project_type: Optional[str] = None,
+        search: Optional[str] = None
+    ) -> ProjectFacets:
+        """Compter les projets par langage, difficulté et type en une seule agrégation"""
+        # Les écritures changent la version du catalogue : les anciennes entrées ne sont plus lues
+        cache_key = (project_catalog.version, language, difficulty, project_type, search)
+        facets = project_facets_cache.get(cache_key)
+        if facets is not None:
+            return facets
+
+        # Chaque facette applique les autres filtres actifs, mais pas le sien
+        filters = {"language": language, "difficulty": difficulty, "type": project_type}
+        pipelines = {}
+        for field in FACET_FIELDS:
+            others = {other: value for other, value in filters.items() if value and other != field}
+            pipelines[field] = ([{"$match": others}] if others else []) + [
+                {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1, "_id": 1}},
+            ]
+
+        # Mêmes langues de recherche que la liste : les comptes correspondent aux résultats
+        match = self._build_query(search=search)
+        if "$text" in match:
+            match = await text_match(self.collection, match)
+
+        result = await self.collection.aggregate([
+            {"$match": match},
+            {"$facet": pipelines},
+        ]).to_list(length=1)
+        counts = result[0] if result else {}
+
+        facets = ProjectFacets(**{
+            field: [
+                ProjectFacetCount(value=bucket["_id"], count=bucket["count"])
+                for bucket in counts.get(field, []) if bucket["_id"] is not None
+            ]
+            for field in FACET_FIELDS
+        })
+        project_facets_cache.set(cache_key, facets)
+        return facets
+
+    @staticmethod
+    def _build_query(
+        language: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        project_type: Optional[str] = None,
+        search: Optional[str] = None
+    ) -> dict:
+        """Construire le filtre MongoDB du catalogue"""
         query = {"is_published": True}
         
         if language:
@@ -34,17 +218,11 @@ class ProjectService:
         if project_type:
             query["type"] = project_type
             
-        if search:
-            query["$or"] = [
-                {"title": {"$regex": search, "$options": "i"}},
-                {"description": {"$regex": search, "$options": "i"}},
-                {"tags": {"$in": [re.compile(search, re.IGNORECASE)]}}
-            ]
+        terms = sanitize_text_search(search)
+        if terms:
+            query.update(text_filter(terms, detect_language(terms)))
 
-        cursor = self.collection.find(query).sort("created_at", -1).skip(skip).limit(limit)
-        projects = await cursor.to_list(length=limit)
-        
-        return [self._project_to_response(project) for project in projects]
+        return query
 
     async def get_project_by_id(self, project_id: str) -> Optional[Project]:
         """Récupérer un projet complet par ID"""
@@ -56,6 +234,25 @@ class ProjectService:
             return self._project_to_full(project_doc)
         return None
 
+    async def get_project_steps(self, project_id: str, skip: int = 0, limit: int = 1) -> Optional[ProjectStepsPage]:
+        """Récupérer une page d'étapes d'un projet sans charger les autres"""
+        if not ObjectId.is_valid(project_id):
+            return None
+
+        project_doc = await self.collection.find_one(
+            {"_id": ObjectId(project_id)},
+            {"steps": {"$slice": [skip, limit]}, "steps_count": {"$size": {"$ifNull": ["$steps", []]}}}
+        )
+        if not project_doc:
+            return None
+
+        return ProjectStepsPage(
+            project_id=project_id,
+            total=project_doc["steps_count"],
+            skip=skip,
+            steps=project_doc.get("steps", [])
+        )
+
     async def create_project(self, project_data: ProjectCreate, creator_email: str) -> Project:
         """Créer un nouveau projet"""
         project_dict = {
@@ -63,11 +260,14 @@ class ProjectService:
             "completed_by": 0,
             "created_by": creator_email,
             "is_published": True,
+            LANGUAGE_FIELD: detect_language(project_data.title, project_data.description),
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
 
         result = await self.collection.insert_one(project_dict)
+        await self._invalidate_catalog()
+        await record_usage(Counter(), self._suggestion_usage(project_dict))
         created_project = await self.collection.find_one({"_id": result.inserted_id})
         return self._project_to_full(created_project)
 
@@ -79,34 +279,51 @@ class ProjectService:
         update_data = {k: v for k, v in project_data.dict().items() if v is not None}
         update_data["updated_at"] = datetime.utcnow()
 
-        result = await self.collection.update_one(
+        previous = await self.collection.find_one_and_update(
             {"_id": ObjectId(project_id), "created_by": creator_email},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"tags": 1, "type": 1, LANGUAGE_FIELD: 1, **dict.fromkeys(TEXT_FIELDS, 1)},
+            return_document=ReturnDocument.BEFORE
         )
 
-        if result.modified_count:
+        if previous:
+            await refresh_search_language(self.collection, previous, update_data, TEXT_FIELDS)
+            await self._invalidate_catalog()
+            await record_usage(self._suggestion_usage(previous), self._suggestion_usage({**previous, **update_data}))
             return await self.get_project_by_id(project_id)
         return None
 
     async def increment_completed(self, project_id: str):
         """Incrémenter le nombre de complétions"""
         if ObjectId.is_valid(project_id):
-            await self.collection.update_one(
+            result = await self.collection.update_one(
                 {"_id": ObjectId(project_id)},
                 {"$inc": {"completed_by": 1}}
             )
+            if result.modified_count:
+                project_catalog.increment_completed(project_id)
 
     async def get_languages(self) -> List[str]:
         """Récupérer tous les langages"""
-        languages = await self.collection.distinct("language", {"is_published": True})
-        return sorted(languages)
+        return sorted({project.language for project in await project_catalog.get(self.collection)})
 
     async def get_categories(self) -> List[str]:
         """Récupérer toutes les catégories"""
-        categories = await self.collection.distinct("type", {"is_published": True})
-        return sorted(categories)
+        return sorted({project.type for project in await project_catalog.get(self.collection)})
+
+    async def _invalidate_catalog(self):
+        project_catalog.invalidate()
+        await connection_manager.publish(PROJECT_CATALOG_CHANNEL, {"type": "invalidate"})
+
+    @staticmethod
+    def _suggestion_usage(project_doc: dict) -> Counter:
+        """Tags et type d'un projet pour l'autocomplétion"""
+        project_type = project_doc.get("type")
+        # Les modèles donnent l'enum, la base la chaîne
+        return content_usage(project_doc.get("tags"), getattr(project_type, "value", project_type))
 
-    def _project_to_response(self, project_doc: dict) -> ProjectResponse:
+    @staticmethod
+    def _project_to_response(project_doc: dict) -> ProjectResponse:
         """Convertir un document projet en réponse simple"""
         return ProjectResponse(
             id=str(project_doc["_id"]),
@@ -0,0 +1,53 @@
+from collections import Counter
+from typing import List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.models.suggest import Suggestion
+from app.core.typeahead import typeahead, TAG, USER, CATEGORY
+
+class SuggestService:
+    def __init__(self, database: AsyncIOMotorDatabase):
+        self.db = database
+
+    async def load(self) -> int:
+        """Construire l'index d'autocomplétion depuis la base; retourne le nombre d'entrées"""
+        counts = Counter()
+
+        # (collection, contenus comptés, champ de catégorie)
+        sources = [
+            (self.db.blog_posts, {"published": True}, "category"),
+            (self.db.community_posts, {}, "category"),
+            (self.db.projects, {"is_published": True}, "type"),
+        ]
+        for collection, match, category_field in sources:
+            async for row in collection.aggregate([
+                {"$match": match},
+                {"$unwind": "$tags"},
+                {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+            ]):
+                counts[(TAG, row["_id"])] += row["count"]
+            async for row in collection.aggregate([
+                {"$match": match},
+                {"$group": {"_id": f"${category_field}", "count": {"$sum": 1}}},
+            ]):
+                if row["_id"]:
+                    counts[(CATEGORY, row["_id"])] += row["count"]
+
+        # Un nom d'utilisateur compte une fois, plus une fois par article ou post publié
+        posts_by_author = Counter()
+        for collection in (self.db.blog_posts, self.db.community_posts):
+            async for row in collection.aggregate([{"$group": {"_id": "$author_email", "count": {"$sum": 1}}}]):
+                posts_by_author[row["_id"]] += row["count"]
+        async for user in self.db.users.find({}, {"email": 1, "username": 1}):
+            if user.get("username"):
+                counts[(USER, user["username"])] += 1 + posts_by_author[user.get("email")]
+
+        typeahead.replace(counts)
+        return len(counts)
+
+    def suggest(self, prefix: str, limit: int = 10, kind: Optional[str] = None) -> List[Suggestion]:
+        """Suggestions pour un préfixe, les plus utilisées d'abord"""
+        return [
+            Suggestion(value=value, kind=entry_kind, count=count)
+            for entry_kind, value, count in typeahead.suggest(prefix, limit, kind)
+        ]
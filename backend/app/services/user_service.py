@@ -1,10 +1,30 @@
-from typing import Optional, List
+from collections import Counter
+from typing import Optional, List, Dict
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, IndexModel, ASCENDING
 from bson import ObjectId
 from datetime import datetime
 
 from app.models.user import UserCreate, UserInDB, User, UserUpdate, UserResponse
-from app.core.security import get_password_hash, verify_password
+from app.core.security import get_password_hash_async, verify_password_async, user_cache
+from app.core.typeahead import USER, typeahead, record_usage
+from app.services.inbox_service import PROFILE_FIELDS, InboxService
+
+# Champs nécessaires pour afficher un utilisateur (nom, avatar) sans charger tout le document
+PUBLIC_PROFILE_PROJECTION = {"_id": 1, "email": 1, "username": 1, "full_name": 1, "avatar_url": 1}
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("username", ASCENDING)], unique=True),
+    ],
+    "user_progress": [
+        IndexModel([("user_id", ASCENDING), ("project_id", ASCENDING)], unique=True),
+    ],
+    "user_badges": [
+        IndexModel([("user_id", ASCENDING)]),
+    ],
+}
 
 class UserService:
     def __init__(self, database: AsyncIOMotorDatabase):
@@ -19,7 +39,7 @@ class UserService:
     async def create_user(self, user_data: UserCreate) -> UserResponse:
         """Créer un nouvel utilisateur"""
         # Hacher le mot de passe
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash_async(user_data.password)
         
         # Créer l'objet utilisateur
         user_dict = {
@@ -40,6 +60,7 @@ class UserService:
         
         # Insérer en base
         result = await self.collection.insert_one(user_dict)
+        await record_usage(Counter(), Counter({(USER, user_data.username): 1}))
         
         # Retourner l'utilisateur créé
         created_user = await self.collection.find_one({"_id": result.inserted_id})
@@ -52,6 +73,28 @@ class UserService:
             return UserInDB(**user_doc)
         return None
 
+    async def get_cached_profile(self, email: str) -> Optional[dict]:
+        """Récupérer le document d'un utilisateur (sans hash) via le cache des utilisateurs"""
+        user_doc = user_cache.get(email)
+        if user_doc is None:
+            user_doc = await self.collection.find_one({"email": email}, {"hashed_password": 0})
+            if user_doc:
+                user_cache.set(email, user_doc)
+        return user_doc
+
+    async def get_many_by_email(self, emails: List[str]) -> Dict[str, dict]:
+        """Récupérer les profils publics de plusieurs utilisateurs en une seule requête"""
+        unique_emails = list(set(emails))
+        if not unique_emails:
+            return {}
+
+        cursor = self.collection.find(
+            {"email": {"$in": unique_emails}},
+            PUBLIC_PROFILE_PROJECTION
+        )
+        profiles = await cursor.to_list(length=len(unique_emails))
+        return {profile["email"]: profile for profile in profiles}
+
     async def get_by_username(self, username: str) -> Optional[UserInDB]:
         """Récupérer un utilisateur par nom d'utilisateur"""
         user_doc = await self.collection.find_one({"username": username})
@@ -83,7 +126,7 @@ class UserService:
             return None
             
         # Vérifier le mot de passe
-        if not verify_password(password, user_doc["hashed_password"]):
+        if not await verify_password_async(password, user_doc["hashed_password"]):
             return None
             
         return self._user_to_response(user_doc)
@@ -96,13 +139,26 @@ class UserService:
         update_data = {k: v for k, v in user_update.dict().items() if v is not None}
         update_data["updated_at"] = datetime.utcnow()
         
-        result = await self.collection.update_one(
+        previous = await self.collection.find_one_and_update(
             {"_id": ObjectId(user_id)},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"email": 1, "username": 1},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count:
-            return await self.get_by_id(user_id)
+        if previous:
+            user_cache.invalidate(previous["email"], update_data.get("email"))
+            if user_update.username and user_update.username != previous["username"]:
+                # Le nouveau nom reprend le compte d'utilisations de l'ancien
+                count = max(1, typeahead.count(USER, previous["username"]))
+                await record_usage(
+                    Counter({(USER, previous["username"]): count}),
+                    Counter({(USER, user_update.username): count})
+                )
+            user = await self.get_by_id(user_id)
+            if user and PROFILE_FIELDS & update_data.keys():
+                await InboxService(self.db).update_peer_profile(previous["email"], user.dict())
+            return user
         return None
 
     async def add_xp(self, user_id: str, xp_amount: int) -> Optional[UserResponse]:
@@ -129,6 +185,7 @@ class UserService:
                 }
             }
         )
+        user_cache.invalidate(user.email)
         
         return await self.get_by_id(user_id)
 
@@ -0,0 +1,65 @@
+"""Microbenchmark : latence de l'envoi d'un message (p50, p99).
+
+Mesure ``MessageService.send_message`` sur une base simulée en mémoire : seul
+le coût du service est mesuré, pas les allers-retours réseau vers MongoDB
+(une lecture par envoi, voir ``tests/test_send_message.py``). Pour mesurer
+contre un vrai serveur, passer ``--mongodb-url``.
+
+    python -m benchmarks.send_message
+    python -m benchmarks.send_message --mongodb-url mongodb://localhost:27017
+"""
+from typing import Optional
+import argparse
+import asyncio
+import statistics
+import time
+
+from mongomock_motor import AsyncMongoMockClient
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.realtime import connection_manager
+from app.models.messages import ConversationCreate, MessageCreate
+from app.services.message_service import MessageService
+import tests.conftest  # noqa: F401  (bulk_write des UpdateOne sous mongomock, voir conftest)
+
+SENDER = "bench@example.com"
+PEER = "peer@example.com"
+
+def _percentile(durations, percent: int) -> float:
+    return statistics.quantiles(durations, n=100)[percent - 1]
+
+async def main(iterations: int, mongodb_url: Optional[str]):
+    client = AsyncIOMotorClient(mongodb_url) if mongodb_url else AsyncMongoMockClient()
+    database = client["codeswitch_benchmark"]
+    await database.users.delete_many({"email": {"$in": [SENDER, PEER]}})
+    await database.users.insert_many([
+        {"email": email, "username": email.split("@")[0], "full_name": "Bench", "hashed_password": "x"}
+        for email in (SENDER, PEER)
+    ])
+
+    service = MessageService(database)
+    conversation = await service.create_conversation(
+        ConversationCreate(conversation_type="direct", participants=[PEER]), SENDER
+    )
+    message = MessageCreate(content="Bonjour")
+    await service.send_message(conversation.id, message, SENDER)  # échauffement, profil en cache
+
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await service.send_message(conversation.id, message, SENDER)
+        durations.append((time.perf_counter() - start) * 1e3)
+
+    print(f"p50 {_percentile(durations, 50):.2f} ms   p99 {_percentile(durations, 99):.2f} ms")
+
+    if mongodb_url:
+        await client.drop_database("codeswitch_benchmark")
+    client.close()
+    await connection_manager.broker.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesurer la latence de l'envoi d'un message")
+    parser.add_argument("--iterations", type=int, default=1000, help="messages envoyés")
+    parser.add_argument("--mongodb-url", help="serveur MongoDB (base simulée par défaut)")
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations, args.mongodb_url))
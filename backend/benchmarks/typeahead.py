@@ -0,0 +1,51 @@
+"""Microbenchmark : temps de réponse de l'autocomplétion, cache vidé.
+
+Mesure ``PrefixIndex.suggest`` sur un index de valeurs aléatoires, pour des
+préfixes de longueur croissante (les plus courts sont les plus coûteux sans
+correspondances tenues à jour). Objectif : moins d'une milliseconde.
+
+    python -m benchmarks.typeahead
+"""
+import argparse
+import random
+import string
+import time
+
+from app.core.typeahead import TAG, USER, PrefixIndex
+
+PREFIXES = ["p", "py", "pyt", "pyth"]
+
+def _index(size: int) -> PrefixIndex:
+    generator = random.Random(1)
+    index = PrefixIndex()
+    index.replace({
+        (generator.choice([TAG, USER]), "".join(generator.choices(string.ascii_lowercase, k=generator.randint(3, 12)))):
+            generator.randint(1, 500)
+        for _ in range(size)
+    })
+    return index
+
+def _per_call(index: PrefixIndex, prefix: str, iterations: int) -> float:
+    """Durée moyenne d'une suggestion sans cache, en microsecondes"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        index._cache.clear()
+        index.suggest(prefix)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def main(size: int, iterations: int):
+    start = time.perf_counter()
+    index = _index(size)
+    print(f"index de {size} valeurs construit en {time.perf_counter() - start:.2f} s")
+
+    print(f"{'préfixe':<10} {'sans cache':>12}")
+    for prefix in PREFIXES:
+        _per_call(index, prefix, max(1, iterations // 10))  # échauffement
+        best = min(_per_call(index, prefix, iterations) for _ in range(5))
+        print(f"{prefix:<10} {best:>9.1f} µs")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesurer le temps de réponse de l'autocomplétion")
+    parser.add_argument("--size", type=int, default=50_000, help="valeurs dans l'index")
+    parser.add_argument("--iterations", type=int, default=200, help="suggestions par mesure")
+    main(**vars(parser.parse_args()))
@@ -0,0 +1,68 @@
+"""Microbenchmark : coût de la vérification du token JWT, avec et sans cache.
+
+Mesure ``verify_token`` seul, puis des requêtes complètes sur deux routes
+authentifiées très sollicitées (base simulée en mémoire, sans serveur).
+
+    python -m benchmarks.verify_token
+"""
+from datetime import timedelta
+import argparse
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+from app.core.security import create_access_token, token_cache, user_cache, verify_token
+from app.core.database import get_database
+from app.main import app
+
+ROUTES = ["/api/v1/progress/", "/api/v1/messages/conversations"]
+
+def _per_call(function, iterations: int) -> float:
+    """Durée moyenne d'un appel, en microsecondes"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def _measure(function, iterations: int, rounds: int = 5):
+    """(sans cache, avec cache) en microsecondes par appel : meilleure de ``rounds`` mesures alternées"""
+    _per_call(function, max(1, iterations // 10))  # échauffement
+    uncached, cached = [], []
+    for _ in range(rounds):
+        with token_cache.bypass():
+            uncached.append(_per_call(function, iterations))
+        function()  # remplir le cache
+        cached.append(_per_call(function, iterations))
+    return min(uncached), min(cached)
+
+def _report(name: str, uncached: float, cached: float):
+    print(f"{name:<36} {uncached:>9.1f} µs {cached:>9.1f} µs {uncached - cached:>9.1f} µs")
+
+def main(iterations: int):
+    token = create_access_token({"sub": "bench@example.com"}, timedelta(minutes=30))
+
+    database = AsyncMongoMockClient()["benchmark"]
+    asyncio.run(database.users.insert_one({
+        "email": "bench@example.com", "username": "bench", "full_name": "Bench", "hashed_password": "x"
+    }))
+    app.dependency_overrides[get_database] = lambda: database
+    app.router.on_startup.clear()
+    app.router.on_shutdown.clear()
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    print(f"{'':<36} {'sans cache':>12} {'avec cache':>12} {'gain':>12}")
+    _report("verify_token", *_measure(lambda: verify_token(token), iterations * 10))
+    for route in ROUTES:
+        def request():
+            response = client.get(route, headers=headers)
+            assert response.status_code == 200, response.text
+        user_cache.clear()
+        _report(f"GET {route}", *_measure(request, iterations))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesurer le gain du cache des tokens JWT")
+    parser.add_argument("--iterations", type=int, default=200, help="requêtes par mesure")
+    main(parser.parse_args().iterations)
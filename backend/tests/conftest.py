@@ -0,0 +1,76 @@
+"""Fixtures communes.
+
+``mock_db`` est une base MongoDB simulée en mémoire (mongomock), suffisante
+pour la logique des services. ``mongo_db`` est une base temporaire sur le
+serveur de ``MONGODB_URL`` : les tests qui en dépendent (plans d'exécution,
+concurrence) sont ignorés si aucun serveur ne répond.
+"""
+from collections import Counter
+import pytest
+import mongomock.collection
+from mongomock_motor import AsyncMongoMockClient
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+
+# pymongo >= 4.11 transmet ``sort`` aux UpdateOne d'un bulk_write, que mongomock ne connaît pas
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+def _add_update_without_sort(self, *args, sort=None, **kwargs):
+    return _add_update(self, *args, **kwargs)
+
+mongomock.collection.BulkOperationBuilder.add_update = _add_update_without_sort
+
+READ_METHODS = {"find", "find_one", "aggregate", "count_documents", "distinct"}
+
+class _CountingCollection:
+    def __init__(self, collection, counter: Counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name in READ_METHODS:
+            def counted(*args, **kwargs):
+                self._counter[self._collection.name] += 1
+                return attribute(*args, **kwargs)
+            return counted
+        return attribute
+
+class CountingDatabase:
+    """Base dont les lectures sont comptées par collection (``queries``)"""
+
+    def __init__(self, database):
+        self._database = database
+        self.queries: Counter = Counter()
+
+    def __getattr__(self, name):
+        return self[name]
+
+    def __getitem__(self, name):
+        return _CountingCollection(self._database[name], self.queries)
+
+@pytest.fixture
+def mock_db():
+    return AsyncMongoMockClient()["codeswitch_test"]
+
+async def connect_mongo_or_skip() -> AsyncIOMotorClient:
+    """Client du serveur MongoDB de test; ignore le test si aucun serveur ne répond"""
+    client = AsyncIOMotorClient(settings.MONGODB_URL, serverSelectionTimeoutMS=1000)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        pytest.skip(f"serveur MongoDB indisponible ({settings.MONGODB_URL})")
+    return client
+
+@pytest.fixture
+async def mongo_db():
+    client = await connect_mongo_or_skip()
+    name = f"{settings.DATABASE_NAME}_tests"
+    await client.drop_database(name)
+    try:
+        yield client[name]
+    finally:
+        await client.drop_database(name)
+        client.close()
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import pytest
+
+from app.core.realtime import connection_manager
+from app.jobs.backfill_members_count import backfill_members_count
+from app.services.message_service import DEFAULT_MAX_MEMBERS, MessageService
+
+async def _legacy_bastion(database, members, max_members=None):
+    """Bastion créé avant le compteur members_count (et, sans max_members, avant la capacité)"""
+    bastion = {
+        "name": "Ancien", "description": "Créé avant members_count", "is_private": False,
+        "tags": [], "creator_email": members[0], "members": members,
+        "last_activity": datetime.utcnow(), "created_at": datetime.utcnow()
+    }
+    if max_members is not None:
+        bastion["max_members"] = max_members
+    result = await database.bastions.insert_one(bastion)
+    return str(result.inserted_id)
+
+async def test_bastion_lists_accept_bastions_without_counter(mock_db):
+    await _legacy_bastion(mock_db, ["a@example.com", "b@example.com"], 10)
+    service = MessageService(mock_db)
+
+    [available] = await service.get_available_bastions()
+    [mine] = await service.get_user_bastions("a@example.com")
+
+    assert available.name == mine.name == "Ancien"
+    assert available.members_count == mine.members_count == 2
+
+async def test_join_counts_existing_members_of_bastions_without_counter(mock_db):
+    bastion_id = await _legacy_bastion(mock_db, ["a@example.com", "b@example.com"], 3)
+    service = MessageService(mock_db)
+
+    assert await service.join_bastion(bastion_id, "c@example.com")
+    assert not await service.join_bastion(bastion_id, "d@example.com")
+
+    stored = await mock_db.bastions.find_one({})
+    assert stored["members"] == ["a@example.com", "b@example.com", "c@example.com"]
+    assert stored["members_count"] == 3
+
+async def test_bastions_without_capacity_use_the_default(mock_db):
+    members = [f"member{i}@example.com" for i in range(DEFAULT_MAX_MEMBERS - 1)]
+    bastion_id = await _legacy_bastion(mock_db, members)
+    service = MessageService(mock_db)
+
+    assert await service.join_bastion(bastion_id, "last@example.com")
+    assert not await service.join_bastion(bastion_id, "extra@example.com")
+    [bastion] = await service.get_available_bastions()
+    assert (bastion.members_count, bastion.max_members) == (DEFAULT_MAX_MEMBERS, DEFAULT_MAX_MEMBERS)
+
+async def test_leave_counts_existing_members_of_bastions_without_counter(mock_db):
+    bastion_id = await _legacy_bastion(mock_db, ["a@example.com", "b@example.com"], 3)
+
+    assert await MessageService(mock_db).leave_bastion(bastion_id, "b@example.com")
+
+    stored = await mock_db.bastions.find_one({})
+    assert stored["members_count"] == 1
+
+async def test_member_loses_access_as_soon_as_they_leave(mock_db, monkeypatch):
+    bastion_id = await _legacy_bastion(mock_db, ["a@example.com", "b@example.com"], 3)
+    service = MessageService(mock_db)
+    assert "b@example.com" in await service._get_bastion_members(bastion_id)
+
+    # Aucune diffusion : l'invalidation ne doit pas dépendre du broker
+    async def lost_publish(channel, event):
+        pass
+    monkeypatch.setattr(connection_manager, "publish", lost_publish)
+
+    assert await service.leave_bastion(bastion_id, "b@example.com")
+
+    with pytest.raises(ValueError):
+        await service.get_bastion_messages(bastion_id, "b@example.com")
+
+async def test_backfill_adds_counter_and_capacity(mock_db):
+    await _legacy_bastion(mock_db, ["a@example.com", "b@example.com"])
+
+    await backfill_members_count(mock_db)
+
+    stored = await mock_db.bastions.find_one({})
+    assert (stored["members_count"], stored["max_members"]) == (2, DEFAULT_MAX_MEMBERS)
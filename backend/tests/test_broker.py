@@ -0,0 +1,82 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.core import broker as broker_module
+from app.core.broker import Broker, InMemoryBroker, RedisBroker
+
+class Recorder:
+    def __init__(self):
+        self.received = []
+        self.delivered = asyncio.Event()
+
+    async def __call__(self, channel, events):
+        self.received.append((channel, list(events)))
+        self.delivered.set()
+
+class FlakyBroker(Broker):
+    """Échoue sur les ``failures`` premiers envois"""
+
+    def __init__(self, handler, failures: int):
+        super().__init__(handler)
+        self.failures_left = failures
+
+    async def _send(self, batch):
+        if self.failures_left:
+            self.failures_left -= 1
+            raise ConnectionError("broker indisponible")
+        for channel, events in batch.items():
+            await self.handler(channel, events)
+
+def test_broker_is_abstract():
+    with pytest.raises(TypeError):
+        Broker(Recorder())
+
+async def test_events_are_batched_per_channel():
+    recorder = Recorder()
+    broker = InMemoryBroker(recorder)
+
+    for i in range(3):
+        await broker.publish("chat:1", {"n": i})
+    await asyncio.wait_for(recorder.delivered.wait(), 1)
+    await broker.close()
+
+    assert recorder.received == [("chat:1", [{"n": 0}, {"n": 1}, {"n": 2}])]
+
+async def test_failed_batch_is_sent_again_in_order(monkeypatch):
+    monkeypatch.setattr(broker_module, "RETRY_DELAY_SECONDS", 0.01)
+    recorder = Recorder()
+    broker = FlakyBroker(recorder, failures=2)
+
+    await broker.publish("chat:1", {"n": 0})
+    await asyncio.sleep(0)
+    await broker.publish("chat:1", {"n": 1})
+    await asyncio.wait_for(recorder.delivered.wait(), 1)
+    await broker.close()
+
+    assert [event for _, events in recorder.received for event in events] == [{"n": 0}, {"n": 1}]
+    assert broker.stats()["send_failures"] == 2
+
+async def test_pending_events_are_bounded_during_an_outage(monkeypatch):
+    monkeypatch.setattr(broker_module, "MAX_PENDING_EVENTS", 5)
+    broker = FlakyBroker(Recorder(), failures=1)
+
+    broker._requeue({"chat:1": [{"n": i} for i in range(8)]})
+
+    assert broker._pending["chat:1"] == [{"n": i} for i in range(3, 8)]
+    assert broker.dropped == 3
+
+async def test_redis_broker_leaves_a_provided_client_open():
+    client = fakeredis.aioredis.FakeRedis()
+    recorder = Recorder()
+    broker = RedisBroker(recorder, client=client)
+    await broker.start()
+
+    await broker.publish("chat:1", {"n": 1})
+    await asyncio.wait_for(recorder.delivered.wait(), 3)
+    await broker.close()
+
+    assert recorder.received == [("chat:1", [{"n": 1}])]
+    assert await client.ping()
+    await client.aclose()
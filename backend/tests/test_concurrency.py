@@ -0,0 +1,71 @@
+"""Écritures concurrentes des services.
+
+Lance en parallèle des opérations qui se marchaient dessus quand elles étaient
+faites en lecture-modification-écriture, sur le serveur MongoDB configuré
+(mongomock ne reproduit pas l'atomicité des mises à jour) : ignorés si aucun
+serveur ne répond.
+"""
+from typing import List
+import asyncio
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+import pytest
+
+from app.core.config import settings
+from app.models.messages import BastionCreate
+from app.services.message_service import MessageService
+from app.services.message_store import BucketMessageStore, DocumentMessageStore, utcnow_millis
+
+CONCURRENCY = 100
+
+def _message(conversation_id: str) -> dict:
+    now = utcnow_millis()
+    return {
+        "_id": ObjectId(), "conversation_id": conversation_id, "content": "Bonjour", "message_type": "text",
+        "sender_email": "sender@example.com", "sender_name": "Sender", "sender_avatar": "",
+        "reactions": [], "created_at": now, "updated_at": now, "edited_at": None
+    }
+
+async def _stored_reactions(database: AsyncIOMotorDatabase, message_id: ObjectId) -> List[dict]:
+    message = await database.messages.find_one({"_id": message_id})
+    if message:
+        return message["reactions"]
+    bucket = await database.message_buckets.find_one(
+        {"messages._id": message_id},
+        {"messages": {"$elemMatch": {"_id": message_id}}}
+    )
+    return bucket["messages"][0]["reactions"]
+
+@pytest.mark.parametrize("create_store", [
+    DocumentMessageStore,
+    lambda database: BucketMessageStore(database, settings.MESSAGE_BUCKET_SIZE),
+])
+async def test_simultaneous_reactions_are_all_kept(mongo_db, create_store):
+    store = create_store(mongo_db)
+    users = [f"user{i}@example.com" for i in range(CONCURRENCY)]
+    message = _message("reactions")
+    await store.insert(message)
+
+    await asyncio.gather(*(store.toggle_reaction(message["_id"], "👍", user) for user in users))
+    [reaction] = await _stored_reactions(mongo_db, message["_id"])
+    assert reaction["count"] == CONCURRENCY
+    assert sorted(reaction["users"]) == sorted(users)
+
+    await asyncio.gather(*(store.toggle_reaction(message["_id"], "👍", user) for user in users))
+    assert await _stored_reactions(mongo_db, message["_id"]) == []
+
+async def test_simultaneous_joins_respect_bastion_capacity(mongo_db):
+    message_service = MessageService(mongo_db)
+    bastion = await message_service.create_bastion(
+        BastionCreate(name="Capacité", description="Vérification des adhésions simultanées", max_members=15),
+        "creator@example.com"
+    )
+    users = [f"user{i}@example.com" for i in range(CONCURRENCY)]
+
+    joined = await asyncio.gather(*(message_service.join_bastion(bastion.id, user) for user in users))
+
+    stored = await mongo_db.bastions.find_one({"_id": ObjectId(bastion.id)})
+    assert len(stored["members"]) == bastion.max_members
+    assert stored["members_count"] == bastion.max_members
+    assert sum(joined) == bastion.max_members - 1
@@ -0,0 +1,39 @@
+import pytest
+
+from app.models.messages import ConversationCreate
+from app.services.message_service import MessageService
+from tests.conftest import CountingDatabase
+
+async def _create_users(database, emails):
+    await database.users.insert_many([
+        {"email": email, "username": email.split("@")[0], "full_name": email.upper(), "hashed_password": "x"}
+        for email in emails
+    ])
+
+@pytest.mark.parametrize("conversations", [1, 20, 100])
+async def test_conversation_list_reads_users_a_constant_number_of_times(mock_db, conversations):
+    owner = "owner@example.com"
+    peers = [f"peer{i}@example.com" for i in range(conversations)]
+    await _create_users(mock_db, [owner, *peers])
+
+    service = MessageService(mock_db)
+    for peer in peers:
+        await service.create_conversation(ConversationCreate(conversation_type="direct", participants=[peer]), owner)
+
+    database = CountingDatabase(mock_db)
+    result = await MessageService(database).get_user_conversations(owner)
+
+    assert len(result) == conversations
+    assert {participant.email for conversation in result for participant in conversation.participants} == set(peers)
+    assert database.queries["users"] <= 1
+
+async def test_get_many_by_email_is_a_single_query(mock_db):
+    emails = [f"user{i}@example.com" for i in range(50)]
+    await _create_users(mock_db, emails)
+
+    database = CountingDatabase(mock_db)
+    profiles = await MessageService(database).user_service.get_many_by_email(emails + emails[:10])
+
+    assert set(profiles) == set(emails)
+    assert "hashed_password" not in profiles[emails[0]]
+    assert database.queries["users"] == 1
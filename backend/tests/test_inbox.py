@@ -0,0 +1,47 @@
+from app.jobs.backfill_inbox import backfill_inbox
+from app.models.messages import ConversationCreate
+from app.services.inbox_service import InboxService
+from app.services.message_service import MessageService
+from tests.test_conversation_queries import _create_users
+
+OWNER = "owner@example.com"
+PEERS = ["peer0@example.com", "peer1@example.com"]
+
+async def _legacy_conversations(database):
+    """Conversations créées avant l'inbox : aucune entrée"""
+    await _create_users(database, [OWNER, *PEERS])
+    service = MessageService(database)
+    for peer in PEERS:
+        await service.create_conversation(ConversationCreate(conversation_type="direct", participants=[peer]), OWNER)
+    await database.inbox.delete_many({})
+    return service
+
+async def test_empty_inbox_falls_back_to_conversations(mock_db):
+    service = await _legacy_conversations(mock_db)
+
+    result = await service.get_user_conversations(OWNER)
+
+    assert {participant.email for conversation in result for participant in conversation.participants} == set(PEERS)
+    assert await mock_db.inbox.count_documents({"owner_email": OWNER}) == len(PEERS)
+
+async def test_backfill_only_processes_conversations_without_entries(mock_db):
+    service = await _legacy_conversations(mock_db)
+    await service.get_user_conversations(PEERS[0])
+
+    assert await backfill_inbox(mock_db) == 1
+    assert await backfill_inbox(mock_db) == 0
+    assert await mock_db.inbox.count_documents({}) == 2 * len(PEERS)
+
+async def test_profile_change_follows_the_new_email(mock_db):
+    await _create_users(mock_db, [OWNER, *PEERS])
+    service = MessageService(mock_db)
+    await service.create_conversation(ConversationCreate(conversation_type="direct", participants=[PEERS[0]]), OWNER)
+
+    profile = {"email": "renamed@example.com", "full_name": "Renamed", "avatar_url": "avatar.png"}
+    await InboxService(mock_db).update_peer_profile(PEERS[0], profile)
+
+    [conversation] = await service.get_user_conversations(OWNER)
+    [peer] = [participant for participant in conversation.participants if participant.email != OWNER]
+    assert (peer.email, peer.name, peer.avatar) == ("renamed@example.com", "Renamed", "avatar.png")
+    assert await mock_db.inbox.count_documents({"owner_email": "renamed@example.com"}) == 1
+    assert await mock_db.inbox.count_documents({"owner_email": PEERS[0]}) == 0
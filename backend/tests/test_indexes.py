@@ -0,0 +1,42 @@
+from pymongo import ASCENDING, IndexModel
+
+from app.core import indexes
+from app.core.indexes import index_signature, reconcile_indexes
+from app.core.search import text_index
+
+def _declare(monkeypatch, **specs):
+    monkeypatch.setattr(indexes, "collect_index_specs", lambda: specs)
+
+async def test_index_with_other_options_is_reported_then_rebuilt(mock_db, monkeypatch):
+    await mock_db.users.create_index([("email", ASCENDING)], name="email_1")
+    _declare(monkeypatch, users=[IndexModel([("email", ASCENDING)], name="email_1", unique=True)])
+
+    plan = await reconcile_indexes(mock_db)
+    assert plan["users"] == {"missing": [], "changed": ["email_1"], "extra": []}
+    assert not (await mock_db.users.index_information())["email_1"].get("unique")
+
+    await reconcile_indexes(mock_db, rebuild=True)
+    assert (await mock_db.users.index_information())["email_1"]["unique"]
+    assert (await reconcile_indexes(mock_db))["users"]["changed"] == []
+
+async def test_index_with_other_keys_is_reported(mock_db, monkeypatch):
+    await mock_db.users.create_index([("email", ASCENDING)], name="profile")
+    _declare(monkeypatch, users=[IndexModel([("email", ASCENDING), ("username", ASCENDING)], name="profile")])
+
+    assert (await reconcile_indexes(mock_db))["users"]["changed"] == ["profile"]
+
+def test_text_index_matches_its_server_form():
+    declared = text_index("posts_text", {"title": 10, "content": 1})
+    stored = {
+        "key": [("_fts", "text"), ("_ftsx", 1)], "v": 2, "weights": {"title": 10, "content": 1},
+        "default_language": "french", "language_override": "search_language", "textIndexVersion": 3
+    }
+    assert index_signature(declared.document) == index_signature(stored)
+    assert index_signature(declared.document) != index_signature({**stored, "language_override": "language"})
+
+async def test_declared_indexes_are_up_to_date_after_creation(mongo_db):
+    await reconcile_indexes(mongo_db)
+
+    plan = await reconcile_indexes(mongo_db)
+
+    assert all(not changes["missing"] and not changes["changed"] for changes in plan.values())
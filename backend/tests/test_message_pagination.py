@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+import pytest
+
+from app.services.message_service import MessageService
+from app.services.message_store import BucketMessageStore, DocumentMessageStore
+
+USER = "user@example.com"
+
+@pytest.fixture(params=["document", "bucket"])
+async def service(request, mock_db):
+    service = MessageService(mock_db)
+    if request.param == "bucket":
+        service.message_store = BucketMessageStore(mock_db, 4)
+    else:
+        service.message_store = DocumentMessageStore(mock_db)
+    return service
+
+async def _conversation(service: MessageService) -> str:
+    result = await service.conversations_collection.insert_one({
+        "participants": [USER, "peer@example.com"], "conversation_type": "direct", "created_at": datetime.utcnow()
+    })
+    conversation_id = str(result.inserted_id)
+
+    # Groupes de messages de la même milliseconde, à cheval sur les limites des pages de 3
+    start = datetime.utcnow().replace(microsecond=0)
+    for second, size in enumerate([2, 4, 1, 5]):
+        for _ in range(size):
+            created_at = start + timedelta(seconds=second)
+            await service.message_store.insert({
+                "_id": ObjectId(), "conversation_id": conversation_id, "content": "Bonjour", "message_type": "text",
+                "sender_email": USER, "sender_name": "User", "sender_avatar": "", "reactions": [],
+                "created_at": created_at, "updated_at": created_at, "edited_at": None
+            })
+    return conversation_id
+
+def _chronological(messages) -> bool:
+    return [(message.created_at, message.id) for message in messages] == sorted(
+        (message.created_at, message.id) for message in messages
+    )
+
+async def test_before_cursor_pages_through_equal_timestamps(service):
+    conversation_id = await _conversation(service)
+
+    received, before = [], None
+    while True:
+        page = await service.get_conversation_messages(conversation_id, USER, limit=3, before=before)
+        assert _chronological(page)
+        received = page + received
+        before = service.next_cursor(page, 3)
+        if before is None:
+            break
+
+    assert len(received) == 12
+    assert len({message.id for message in received}) == 12
+    assert _chronological(received)
+
+async def test_after_cursor_pages_through_equal_timestamps(service):
+    conversation_id = await _conversation(service)
+    oldest = await service.get_conversation_messages(conversation_id, USER, skip=11, limit=1)
+
+    received, after = list(oldest), service.next_cursor(oldest, 1)
+    while True:
+        page = await service.get_conversation_messages(conversation_id, USER, limit=3, after=after)
+        assert _chronological(page)
+        received.extend(page)
+        if len(page) < 3:
+            break
+        after = service.next_cursor(page, 3, after)
+
+    assert len(received) == 12
+    assert len({message.id for message in received}) == 12
+    assert _chronological(received)
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+import asyncio
+
+from bson import ObjectId
+import pytest
+
+from app.core.indexes import reconcile_indexes
+from app.jobs.compact_messages import compact_messages
+from app.services.message_service import decode_sync_cursor, encode_sync_cursor
+from app.services.message_store import BucketMessageStore, DocumentMessageStore, pack_message, message_sender
+
+CONVERSATION_ID = "conversation"
+
+def _message(created_at: datetime, **fields) -> dict:
+    return {
+        "_id": ObjectId(), "conversation_id": CONVERSATION_ID, "content": "Bonjour", "message_type": "text",
+        "sender_email": "sender@example.com", "sender_name": "Sender", "sender_avatar": "",
+        "reactions": [], "created_at": created_at, "updated_at": created_at, "edited_at": None,
+        **fields
+    }
+
+def _old_messages(count: int):
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(days=2)
+    return [_message(start + timedelta(seconds=i)) for i in range(count)]
+
+async def _interrupted_compaction(database, messages):
+    """Bucket écrit par une compaction interrompue avant la suppression des documents"""
+    await database.message_buckets.insert_one({
+        "_id": messages[0]["_id"],
+        "conversation_id": CONVERSATION_ID,
+        "open": False,
+        "count": len(messages),
+        "first_at": messages[0]["created_at"],
+        "last_at": messages[-1]["created_at"],
+        "updated_at": messages[-1]["updated_at"],
+        "senders": [message_sender(messages[0])],
+        "messages": [pack_message(message) for message in messages],
+    })
+
+async def test_find_range_prefers_the_document_during_compaction(mock_db):
+    messages = _old_messages(3)
+    await mock_db.messages.insert_many(messages)
+    await _interrupted_compaction(mock_db, messages)
+    await mock_db.messages.update_one({"_id": messages[1]["_id"]}, {"$set": {"content": "Modifié"}})
+
+    page = await BucketMessageStore(mock_db, 10).find_range(CONVERSATION_ID, 10)
+
+    assert [message["_id"] for message in page] == [message["_id"] for message in reversed(messages)]
+    assert page[1]["content"] == "Modifié"
+
+async def test_compaction_keeps_changes_made_after_the_copy(mock_db):
+    messages = _old_messages(3)
+    await mock_db.messages.insert_many(messages)
+    await _interrupted_compaction(mock_db, messages)
+
+    # Réaction arrivée entre l'écriture du bucket et la suppression des documents
+    reacted_at = messages[1]["updated_at"] + timedelta(days=1)
+    reactions = [{"emoji": "👍", "count": 1, "users": ["user@example.com"]}]
+    await mock_db.messages.update_one(
+        {"_id": messages[1]["_id"]},
+        {"$set": {"reactions": reactions, "updated_at": reacted_at}}
+    )
+
+    report = await compact_messages(mock_db, bucket_size=10, older_than=timedelta(hours=1))
+
+    assert report == {CONVERSATION_ID: 3}
+    assert await mock_db.messages.count_documents({}) == 0
+    bucket = await mock_db.message_buckets.find_one({"_id": messages[0]["_id"]})
+    assert bucket["count"] == 3
+    assert bucket["messages"][1]["reactions"] == reactions
+    assert bucket["updated_at"] == reacted_at
+
+async def test_compaction_moves_every_message_once(mock_db):
+    messages = _old_messages(5)
+    await mock_db.messages.insert_many(messages)
+
+    report = await compact_messages(mock_db, bucket_size=2, older_than=timedelta(hours=1))
+
+    assert report == {CONVERSATION_ID: 5}
+    page = await BucketMessageStore(mock_db, 2).find_range(CONVERSATION_ID, 10, newest_first=False)
+    assert [message["_id"] for message in page] == [message["_id"] for message in messages]
+
+async def test_concurrent_inserts_share_one_open_bucket(mongo_db):
+    await reconcile_indexes(mongo_db)
+    store = BucketMessageStore(mongo_db, 10)
+    messages = [_message(datetime.utcnow().replace(microsecond=0)) for _ in range(25)]
+
+    await asyncio.gather(*(store.insert(message) for message in messages))
+
+    assert await mongo_db.message_buckets.count_documents({"open": True}) == 1
+    buckets = await mongo_db.message_buckets.find().to_list(None)
+    assert sum(bucket["count"] for bucket in buckets) == 25
+    assert all(bucket["count"] <= 10 for bucket in buckets)
+
+@pytest.mark.parametrize("create_store", [DocumentMessageStore, lambda database: BucketMessageStore(database, 4)])
+async def test_changes_of_the_same_millisecond_are_paginated(mock_db, create_store):
+    store = create_store(mock_db)
+    created_at = datetime.utcnow().replace(microsecond=0)
+    messages = [_message(created_at) for _ in range(10)]
+    for message in messages:
+        await store.insert(message)
+
+    received, since, after_id = [], created_at, None
+    for _ in range(len(messages)):
+        page = await store.find_changed([CONVERSATION_ID], since, 3, after_id)
+        received.extend(message["_id"] for message in page)
+        if len(page) < 3:
+            break
+        since, after_id = decode_sync_cursor(encode_sync_cursor(page[-1]["updated_at"], page[-1]["_id"]))
+
+    assert received == sorted(message["_id"] for message in messages)
+
+def test_sync_cursor_without_position_is_still_accepted():
+    since = datetime(2024, 1, 2, 3, 4, 5, 6000)
+    assert decode_sync_cursor(encode_sync_cursor(since)) == (since, None)
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+import asyncio
+
+from app.core.indexes import reconcile_indexes
+from app.jobs.backfill_participants_key import backfill_participants_key
+from app.models.messages import ConversationCreate
+from app.services.message_service import MessageService, participants_key
+
+ALICE = "alice@example.com"
+BOB = "bob@example.com"
+
+async def _users(database):
+    await database.users.insert_many([
+        {"email": email, "username": email.split("@")[0], "full_name": email.upper(), "hashed_password": "x"}
+        for email in (ALICE, BOB)
+    ])
+
+async def _legacy_conversation(database, *participants: str, conversation_type: str = "direct", age: int = 0):
+    created_at = datetime.utcnow() - timedelta(days=age)
+    result = await database.conversations.insert_one({
+        "participants": list(participants), "conversation_type": conversation_type,
+        "created_at": created_at, "updated_at": created_at
+    })
+    return result.inserted_id
+
+async def _check_concurrent_creates(database):
+    await _users(database)
+    service = MessageService(database)
+
+    conversations = await asyncio.gather(
+        service.create_conversation(ConversationCreate(conversation_type="direct", participants=[BOB]), ALICE),
+        service.create_conversation(ConversationCreate(conversation_type="direct", participants=[ALICE]), BOB),
+        *(service.create_conversation(ConversationCreate(conversation_type="direct", participants=[BOB]), ALICE)
+          for _ in range(8))
+    )
+
+    assert len({conversation.id for conversation in conversations}) == 1
+    assert await database.conversations.count_documents({}) == 1
+
+async def _check_backfill(database):
+    await _users(database)
+    direct = await _legacy_conversation(database, BOB, ALICE)
+    group = await _legacy_conversation(database, ALICE, BOB, conversation_type="group")
+
+    report = await backfill_participants_key(database)
+
+    assert report == {"updated": [str(direct)], "duplicates": []}
+    assert (await database.conversations.find_one({"_id": direct}))["participants_key"] == participants_key([ALICE, BOB])
+    assert "participants_key" not in await database.conversations.find_one({"_id": group})
+
+    # La conversation reprise est retrouvée au lieu d'en créer une nouvelle
+    conversation = await MessageService(database).create_conversation(
+        ConversationCreate(conversation_type="direct", participants=[BOB]), ALICE
+    )
+    assert conversation.id == str(direct)
+
+async def test_concurrent_creates_share_one_conversation(mock_db):
+    await _check_concurrent_creates(mock_db)
+
+async def test_concurrent_creates_share_one_conversation_on_the_server(mongo_db):
+    await reconcile_indexes(mongo_db)
+    await _check_concurrent_creates(mongo_db)
+
+async def test_backfill_keys_legacy_direct_conversations(mock_db):
+    await _check_backfill(mock_db)
+
+async def test_backfill_keys_legacy_direct_conversations_on_the_server(mongo_db):
+    await reconcile_indexes(mongo_db)
+    await _check_backfill(mongo_db)
+
+async def test_backfill_keeps_the_oldest_duplicate(mongo_db):
+    await reconcile_indexes(mongo_db)
+    oldest = await _legacy_conversation(mongo_db, ALICE, BOB, age=2)
+    duplicate = await _legacy_conversation(mongo_db, BOB, ALICE, age=1)
+
+    report = await backfill_participants_key(mongo_db)
+
+    assert report == {"updated": [str(oldest)], "duplicates": [str(duplicate)]}
@@ -0,0 +1,50 @@
+import time
+
+import fakeredis
+
+from app.core.presence import InMemoryPresenceBackend, PresenceService, RedisPresenceBackend
+
+async def test_heartbeats_do_not_grow_the_heap():
+    backend = InMemoryPresenceBackend(shards=1)
+    emails = [f"user{i}@example.com" for i in range(10)]
+    now = time.time()
+
+    for beat in range(1000):
+        for email in emails:
+            await backend.touch(email, now + beat)
+
+    assert len(backend._heaps[0]) <= 2 * len(emails) + 16
+    assert await backend.count(now) == len(emails)
+    assert await backend.online(emails, now + 998) == set(emails)
+
+async def test_presence_survives_until_the_last_connection_closes():
+    service = PresenceService(ttl=60)
+
+    await service.connect("user@example.com")
+    await service.connect("user@example.com")
+    await service.disconnect("user@example.com")
+    assert await service.online_emails(["user@example.com"]) == {"user@example.com"}
+
+    await service.disconnect("user@example.com")
+    assert await service.online_emails(["user@example.com"]) == set()
+
+async def test_redis_presence_counts_connections_of_every_worker():
+    client = fakeredis.aioredis.FakeRedis()
+    workers = [PresenceService(ttl=60), PresenceService(ttl=60)]
+    for worker in workers:
+        await worker.use_backend(RedisPresenceBackend(client=client))
+
+    await workers[0].connect("user@example.com")
+    await workers[1].connect("user@example.com")
+    await workers[0].disconnect("user@example.com")
+    assert await workers[0].online_emails(["user@example.com"]) == {"user@example.com"}
+    assert await workers[0].count() == 1
+
+    await workers[1].disconnect("user@example.com")
+    assert await workers[0].online_emails(["user@example.com"]) == set()
+    assert await workers[1].count() == 0
+
+    for worker in workers:
+        await worker.backend.close()
+    assert await client.ping()
+    await client.aclose()
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from fastapi import Response
+from starlette.requests import Request
+
+from app.api.v1.endpoints.projects import get_languages
+from app.services.project_service import project_catalog
+
+async def _publish(database, language: str):
+    await database.projects.insert_one({
+        "title": f"Projet {language}", "description": "Un projet du catalogue", "language": language,
+        "difficulty": "beginner", "type": "guided", "xp_reward": 100, "estimated_time": "1h",
+        "is_published": True, "created_at": datetime.utcnow()
+    })
+
+def _request(etag: str = "") -> Request:
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+async def test_etag_matches_the_catalog_served_after_expiry(mock_db):
+    project_catalog.invalidate()
+    await _publish(mock_db, "html")
+    response = Response()
+    assert await get_languages(_request(), response, mock_db) == ["html"]
+    etag = response.headers["ETag"]
+
+    # Projet publié par un autre worker, puis expiration du catalogue
+    await _publish(mock_db, "css")
+    project_catalog._expires_at = 0
+
+    response = Response()
+    languages = await get_languages(_request(etag), response, mock_db)
+
+    assert languages == ["css", "html"]
+    assert response.headers["ETag"] != etag
+
+async def test_unchanged_catalog_is_not_modified(mock_db):
+    project_catalog.invalidate()
+    await _publish(mock_db, "html")
+    response = Response()
+    await get_languages(_request(), response, mock_db)
+
+    result = await get_languages(_request(response.headers["ETag"]), Response(), mock_db)
+
+    assert result.status_code == 304
@@ -0,0 +1,63 @@
+from datetime import datetime
+from itertools import product
+
+from app.services.project_service import FACET_FIELDS, ProjectService, project_catalog, project_facets_cache
+
+LANGUAGES = ["python", "javascript"]
+DIFFICULTIES = ["beginner", "advanced"]
+TYPES = ["guided", "challenge"]
+
+async def _publish(database, language: str, difficulty: str, project_type: str, count: int = 1):
+    await database.projects.insert_many([{
+        "title": f"Projet {language} {difficulty}", "description": "Un projet du catalogue", "language": language,
+        "difficulty": difficulty, "type": project_type, "xp_reward": 100, "estimated_time": "1h",
+        "is_published": True, "created_at": datetime.utcnow()
+    } for _ in range(count)])
+
+def _counts(facets, field: str):
+    return {bucket.value: bucket.count for bucket in getattr(facets, field)}
+
+async def test_facet_counts_match_the_listed_projects(mock_db):
+    project_catalog.invalidate()
+    project_facets_cache.clear()
+    for index, (language, difficulty, project_type) in enumerate(product(LANGUAGES, DIFFICULTIES, TYPES)):
+        await _publish(mock_db, language, difficulty, project_type, count=index + 1)
+    service = ProjectService(mock_db)
+
+    filters = {"language": "python", "difficulty": "advanced", "project_type": None}
+    facets = await service.get_facets(**filters)
+
+    # Chaque facette applique les autres filtres, pas le sien : chaque compte est
+    # le nombre de projets listés si l'on choisit cette valeur
+    for field, parameter in zip(FACET_FIELDS, ("language", "difficulty", "project_type")):
+        for value, count in _counts(facets, field).items():
+            listed = await service.get_projects(limit=1000, **{**filters, parameter: value})
+            assert count == len(listed), (field, value)
+    assert set(_counts(facets, "language")) == set(LANGUAGES)
+
+async def test_catalog_version_bump_invalidates_cached_facets(mock_db):
+    project_catalog.invalidate()
+    project_facets_cache.clear()
+    await _publish(mock_db, "python", "beginner", "guided")
+    service = ProjectService(mock_db)
+    assert _counts(await service.get_facets(), "language") == {"python": 1}
+
+    # Écriture hors service : la version n'a pas changé, le cache répond encore
+    await _publish(mock_db, "javascript", "beginner", "guided")
+    assert _counts(await service.get_facets(), "language") == {"python": 1}
+
+    project_catalog.invalidate()
+    assert _counts(await service.get_facets(), "language") == {"python": 1, "javascript": 1}
+
+async def test_cached_facets_are_kept_per_filter_combination(mock_db):
+    project_catalog.invalidate()
+    project_facets_cache.clear()
+    await _publish(mock_db, "python", "beginner", "guided")
+    await _publish(mock_db, "javascript", "advanced", "guided")
+    service = ProjectService(mock_db)
+
+    python = await service.get_facets(language="python")
+    javascript = await service.get_facets(language="javascript")
+
+    assert _counts(python, "difficulty") == {"beginner": 1}
+    assert _counts(javascript, "difficulty") == {"advanced": 1}
@@ -0,0 +1,224 @@
+"""Plans d'exécution des requêtes des services.
+
+Sur une base temporaire du serveur MongoDB de test, insère un jeu de données,
+applique les index déclarés (voir ``app.core.indexes``) puis lance ``explain()``
+sur chaque forme de requête émise par les services. Un plan qui retombe sur un
+COLLSCAN ou un tri en mémoire (SORT) fait échouer le test.
+"""
+from datetime import datetime, timedelta
+from itertools import product
+from typing import FrozenSet, Iterator, List, NamedTuple, Optional
+
+import pytest
+import pytest_asyncio
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.core.indexes import reconcile_indexes
+from tests.conftest import connect_mongo_or_skip
+
+pytestmark = pytest.mark.asyncio(loop_scope="module")
+
+FORBIDDEN_STAGES = {"COLLSCAN", "SORT"}
+
+class QueryShape(NamedTuple):
+    name: str
+    collection: str
+    filter: dict
+    sort: Optional[list] = None
+    # Étapes tolérées : le tri par pertinence d'une recherche texte se fait forcément en mémoire
+    allowed_stages: FrozenSet[str] = frozenset()
+
+def collect_query_shapes() -> List[QueryShape]:
+    """Formes de requêtes find() émises par les services"""
+    from app.services.project_service import ProjectService, PROJECTS_SORT
+    from app.services.blog_service import BlogService, POSTS_SORT as BLOG_POSTS_SORT
+    from app.services.community_service import CommunityService, POSTS_SORT as COMMUNITY_POSTS_SORT
+    from app.services.message_store import MESSAGES_SORT
+    from app.core.search import text_filter, text_sort
+
+    shapes = [
+        QueryShape("users.by_email", "users", {"email": "user1@example.com"}),
+        QueryShape("users.by_username", "users", {"username": "user1"}),
+        QueryShape("users.authenticate", "users", {"$or": [{"email": "user1"}, {"username": "user1"}]}),
+        QueryShape("users.many_by_email", "users", {"email": {"$in": ["user1@example.com", "user2@example.com"]}}),
+        QueryShape("user_progress.by_user", "user_progress", {"user_id": "u1"}),
+        QueryShape("user_progress.by_project", "user_progress", {"user_id": "u1", "project_id": "p1"}),
+        QueryShape("blog_comments.by_post", "blog_comments", {"post_id": "p1", "parent_id": None}, [("created_at", -1)]),
+        QueryShape("community_comments.by_post", "community_comments", {"post_id": "p1", "parent_id": None}, [("created_at", -1)]),
+        QueryShape("community_posts.solved_today", "community_posts", {"is_solved": True, "updated_at": {"$gte": datetime.utcnow() - timedelta(days=1)}}),
+        QueryShape("conversations.by_participant", "conversations", {"participants": "user1@example.com"}, [("updated_at", -1)]),
+        QueryShape("inbox.by_owner", "inbox", {"owner_email": "user1@example.com"}, [("updated_at", -1)]),
+        QueryShape("inbox.by_conversation", "inbox", {"conversation_id": "c1", "owner_email": {"$ne": "user1@example.com"}}),
+        QueryShape("inbox.changed", "inbox", {"owner_email": "user1@example.com", "changed_at": {"$gte": datetime.utcnow()}}),
+        QueryShape("messages.changed", "messages", {"conversation_id": {"$in": ["c1", "c2"]}, "updated_at": {"$gte": datetime.utcnow()}}, [("updated_at", 1), ("_id", 1)]),
+        QueryShape("message_buckets.changed", "message_buckets", {"conversation_id": {"$in": ["c1", "c2"]}, "updated_at": {"$gte": datetime.utcnow()}}),
+        QueryShape("inbox.by_peer", "inbox", {"peers.email": "user1@example.com"}),
+        QueryShape("messages.by_conversation", "messages", {"conversation_id": "c1"}, MESSAGES_SORT),
+        QueryShape("messages.before_cursor", "messages", {
+            "conversation_id": "c1",
+            "$or": [{"created_at": {"$lt": datetime.utcnow()}}, {"created_at": datetime.utcnow(), "_id": {"$lt": ObjectId()}}]
+        }, MESSAGES_SORT),
+        QueryShape("messages.after_cursor", "messages", {
+            "conversation_id": "c1",
+            "$or": [{"created_at": {"$gt": datetime.utcnow()}}, {"created_at": datetime.utcnow(), "_id": {"$gt": ObjectId()}}]
+        }, [("created_at", 1), ("_id", 1)]),
+        QueryShape("message_buckets.open", "message_buckets", {"conversation_id": "c1", "open": True, "count": {"$lt": 200}}),
+        QueryShape("message_buckets.latest", "message_buckets", {"conversation_id": "c1"}, [("last_at", -1)]),
+        QueryShape("message_buckets.before", "message_buckets", {"conversation_id": "c1", "first_at": {"$lte": datetime.utcnow()}}, [("last_at", -1)]),
+        QueryShape("message_buckets.after", "message_buckets", {"conversation_id": "c1", "last_at": {"$gte": datetime.utcnow()}}, [("first_at", 1)]),
+        QueryShape("message_buckets.by_message", "message_buckets", {"messages._id": ObjectId()}),
+        QueryShape("bastions.by_member", "bastions", {"members": "user1@example.com"}, [("last_activity", -1)]),
+        QueryShape("bastions.available", "bastions", {"is_private": False}, [("last_activity", -1)]),
+        QueryShape(
+            "bastions.search", "bastions", {"is_private": False, **text_filter("python")},
+            text_sort(("last_activity", -1)), frozenset({"SORT"})
+        ),
+        QueryShape(
+            "projects.search", "projects", ProjectService._build_query("python", search="formulaire"),
+            text_sort(*PROJECTS_SORT), frozenset({"SORT"})
+        ),
+        QueryShape(
+            "blog_posts.search", "blog_posts", BlogService._build_query(search="tutoriel"),
+            text_sort(*BLOG_POSTS_SORT), frozenset({"SORT"})
+        ),
+        QueryShape(
+            "community_posts.search", "community_posts", CommunityService._build_query(search="erreur"),
+            text_sort(("last_activity", -1)), frozenset({"SORT"})
+        ),
+        QueryShape("bastions.available_tags", "bastions", {"is_private": False, "tags": {"$in": ["python"]}}, [("last_activity", -1)]),
+    ]
+
+    # Liste du catalogue : filtrée en mémoire (ProjectCatalog), MongoDB ne sert que le chargement
+    shapes.append(QueryShape(
+        "projects.catalog", "projects", ProjectService._build_query(), PROJECTS_SORT
+    ))
+
+    for category, featured_only in product([None, "tutorial"], [False, True]):
+        shapes.append(QueryShape(
+            f"blog_posts.list(category={category}, featured={featured_only})",
+            "blog_posts",
+            BlogService._build_query(category, featured_only=featured_only),
+            BLOG_POSTS_SORT
+        ))
+
+    for post_type, category, trending, unanswered, solved in product(
+        [None, "question"], [None, "python"], [False, True], [False, True], [False, True]
+    ):
+        shapes.append(QueryShape(
+            f"community_posts.list(type={post_type}, category={category}, trending={trending}, "
+            f"unanswered={unanswered}, solved={solved})",
+            "community_posts",
+            CommunityService._build_query(post_type, category, None, trending, unanswered, solved),
+            COMMUNITY_POSTS_SORT
+        ))
+
+    return shapes
+
+async def seed(database: AsyncIOMotorDatabase, count: int = 200):
+    """Insérer un jeu de données représentatif dans chaque collection"""
+    now = datetime.utcnow()
+
+    def dates(i: int) -> datetime:
+        return now - timedelta(minutes=i)
+
+    await database.users.insert_many([
+        {"email": f"user{i}@example.com", "username": f"user{i}", "full_name": f"User {i}", "created_at": dates(i)}
+        for i in range(count)
+    ])
+    await database.projects.insert_many([
+        {
+            "title": f"Projet {i}", "language": ["python", "html", "css"][i % 3],
+            "difficulty": ["beginner", "advanced"][i % 2], "type": ["guided", "challenge"][i % 2],
+            "is_published": i % 5 != 0, "created_at": dates(i)
+        }
+        for i in range(count)
+    ])
+    await database.user_progress.insert_many([
+        {"user_id": f"u{i % 20}", "project_id": f"p{i}"} for i in range(count)
+    ])
+    for collection in ("blog_comments", "community_comments"):
+        await database[collection].insert_many([
+            {"post_id": f"p{i % 20}", "parent_id": None, "created_at": dates(i)} for i in range(count)
+        ])
+    await database.blog_posts.insert_many([
+        {
+            "title": f"Article {i}", "category": ["tutorial", "news"][i % 2],
+            "featured": i % 7 == 0, "published": i % 5 != 0, "created_at": dates(i)
+        }
+        for i in range(count)
+    ])
+    await database.community_posts.insert_many([
+        {
+            "title": f"Post {i}", "post_type": ["question", "showcase"][i % 2], "category": ["python", "css"][i % 2],
+            "is_pinned": i % 50 == 0, "is_trending": i % 9 == 0, "is_solved": i % 4 == 0, "replies": i % 3,
+            "last_activity": dates(i), "updated_at": dates(i), "created_at": dates(i)
+        }
+        for i in range(count)
+    ])
+    await database.conversations.insert_many([
+        {"participants": [f"user{i}@example.com", f"user{i + 1}@example.com"], "updated_at": dates(i)}
+        for i in range(count)
+    ])
+    await database.inbox.insert_many([
+        {
+            "owner_email": f"user{i}@example.com", "conversation_id": f"c{i}",
+            "peers": [{"email": f"user{i + 1}@example.com"}], "updated_at": dates(i), "changed_at": dates(i)
+        }
+        for i in range(count)
+    ])
+    await database.messages.insert_many([
+        {"conversation_id": f"c{i % 20}", "content": "Bonjour", "created_at": dates(i), "updated_at": dates(i)}
+        for i in range(count)
+    ])
+    await database.message_buckets.insert_many([
+        {
+            "conversation_id": f"c{i % 20}", "open": i < 20, "count": 1,
+            "first_at": dates(i + 1), "last_at": dates(i), "updated_at": dates(i),
+            "messages": [{"_id": ObjectId(), "content": "Bonjour", "created_at": dates(i)}]
+        }
+        for i in range(count)
+    ])
+    await database.bastions.insert_many([
+        {
+            "name": f"Bastion {i}", "is_private": i % 4 == 0, "tags": [["python"], ["css"]][i % 2],
+            "members": [f"user{i}@example.com", f"user{i + 1}@example.com"], "last_activity": dates(i)
+        }
+        for i in range(count)
+    ])
+
+def plan_stages(plan) -> Iterator[str]:
+    """Parcourir récursivement un plan d'exécution et renvoyer ses étapes"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from plan_stages(item)
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def seeded_db():
+    client = await connect_mongo_or_skip()
+    name = f"{settings.DATABASE_NAME}_query_plans"
+    await client.drop_database(name)
+    database = client[name]
+    try:
+        await seed(database)
+        await reconcile_indexes(database)
+        yield database
+    finally:
+        await client.drop_database(name)
+        client.close()
+
+@pytest.mark.parametrize("shape", collect_query_shapes(), ids=lambda shape: shape.name)
+async def test_query_uses_an_index(seeded_db, shape: QueryShape):
+    cursor = seeded_db[shape.collection].find(shape.filter)
+    if shape.sort:
+        cursor = cursor.sort(shape.sort)
+    explain = await cursor.limit(20).explain()
+
+    stages = set(plan_stages(explain["queryPlanner"]["winningPlan"]))
+    assert not stages & FORBIDDEN_STAGES - shape.allowed_stages, explain["queryPlanner"]["winningPlan"]
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.write_buffer import write_buffer
+from app.models.messages import BastionCreate, ConversationCreate
+from app.services.message_service import MessageService, bastion_members_cache
+from tests.conftest import CountingDatabase
+from tests.test_conversation_queries import _create_users
+
+OWNER = "owner@example.com"
+PEER = "peer@example.com"
+
+async def _conversation(database):
+    await _create_users(database, [OWNER, PEER])
+    service = MessageService(database)
+    conversation = await service.create_conversation(
+        ConversationCreate(conversation_type="direct", participants=[PEER]), OWNER
+    )
+    return service, conversation.id
+
+async def _unread(database, conversation_id):
+    entry = await database.inbox.find_one({"conversation_id": conversation_id, "owner_email": OWNER})
+    return entry["unread_count"]
+
+async def test_message_received_before_the_flush_stays_unread(mock_db):
+    service, conversation_id = await _conversation(mock_db)
+    start = datetime(2024, 1, 1)
+    for i in range(3):
+        await service.inbox_service.record_message(conversation_id, PEER, "Bonjour", start + timedelta(seconds=i))
+
+    service.inbox_service.schedule_mark_read(conversation_id, OWNER, start + timedelta(seconds=2))
+    await service.inbox_service.record_message(conversation_id, PEER, "Encore", start + timedelta(seconds=3))
+    await write_buffer.flush()
+
+    assert await _unread(mock_db, conversation_id) == 1
+
+async def test_read_resets_counters_from_before_unread_times(mock_db):
+    service, conversation_id = await _conversation(mock_db)
+    await mock_db.inbox.update_one({"conversation_id": conversation_id, "owner_email": OWNER}, {"$set": {"unread_count": 4}})
+
+    await service.mark_read(conversation_id, OWNER)
+    await write_buffer.flush()
+
+    assert await _unread(mock_db, conversation_id) == 0
+
+async def test_bastion_read_schedules_no_write(mock_db):
+    service = MessageService(mock_db)
+    bastion = await service.create_bastion(BastionCreate(name="Bastion", description="Accusés de lecture"), OWNER)
+    pending = write_buffer.stats()["pending"]
+
+    await service.mark_read(bastion.id, OWNER, is_bastion=True)
+
+    assert write_buffer.stats()["pending"] == pending
+
+async def test_direct_read_does_not_look_up_bastions(mock_db):
+    _, conversation_id = await _conversation(mock_db)
+    database = CountingDatabase(mock_db)
+
+    await MessageService(database).mark_read(conversation_id, OWNER)
+
+    assert database.queries["bastions"] == 0
+    assert bastion_members_cache.get(conversation_id) is None
+
+async def test_unchanged_unread_count_is_not_rewritten(mock_db):
+    service, conversation_id = await _conversation(mock_db)
+    start = datetime(2024, 1, 1)
+    await service.inbox_service.record_message(conversation_id, PEER, "Bonjour", start + timedelta(seconds=5))
+
+    # Lecture antérieure au seul non-lu : le compteur recalculé ne change pas
+    service.inbox_service.schedule_mark_read(conversation_id, OWNER, start)
+    _, operation = write_buffer._pending[("inbox_read", conversation_id, OWNER)]
+    assert await mock_db.inbox.count_documents(operation._filter) == 0
+
+    service.inbox_service.schedule_mark_read(conversation_id, OWNER, start + timedelta(seconds=5))
+    _, operation = write_buffer._pending[("inbox_read", conversation_id, OWNER)]
+    assert await mock_db.inbox.count_documents(operation._filter) == 1
+    await write_buffer.flush()
+
+async def test_invalid_message_id_is_rejected(mock_db):
+    service, conversation_id = await _conversation(mock_db)
+    with pytest.raises(ValueError):
+        await service.mark_read(conversation_id, OWNER, "pas-un-id")
@@ -0,0 +1,96 @@
+from datetime import datetime
+
+from app.core.indexes import reconcile_indexes
+from app.core.search import LANGUAGE_FIELD, query_languages, refresh_search_language, text_filter, text_match
+from app.services.project_service import ProjectService, project_facets_cache
+
+FIELDS = ("title", "content")
+
+def test_short_query_is_searched_in_both_languages():
+    assert query_languages("tutorials") == ("french", "english")
+    assert query_languages("how to deploy") == ("english",)
+    assert query_languages("comment déployer") == ("french",)
+
+async def _post(database, **fields) -> dict:
+    document = {"title": "Titre", "content": "", **fields}
+    document["_id"] = (await database.posts.insert_one(document)).inserted_id
+    return document
+
+async def test_language_is_detected_from_the_merged_document(mock_db):
+    # Seul le titre change : le contenu, resté anglais, décide encore de la langue
+    previous = await _post(
+        mock_db, title="Guide", content="How to write the tests of your API with pytest", **{LANGUAGE_FIELD: "english"}
+    )
+    update = {"title": "Nouveau titre"}
+    await mock_db.posts.update_one({"_id": previous["_id"]}, {"$set": update})
+
+    await refresh_search_language(mock_db.posts, previous, update, FIELDS)
+
+    assert (await mock_db.posts.find_one({"_id": previous["_id"]}))[LANGUAGE_FIELD] == "english"
+
+async def test_language_changes_with_the_text(mock_db):
+    previous = await _post(mock_db, content="How to write the tests", **{LANGUAGE_FIELD: "english"})
+    update = {"content": "Comment écrire les tests de votre API avec pytest"}
+    await mock_db.posts.update_one({"_id": previous["_id"]}, {"$set": update})
+
+    await refresh_search_language(mock_db.posts, previous, update, FIELDS)
+
+    assert (await mock_db.posts.find_one({"_id": previous["_id"]}))[LANGUAGE_FIELD] == "french"
+
+async def test_language_is_kept_when_the_text_changed_since(mock_db):
+    previous = await _post(mock_db, content="How to write the tests", **{LANGUAGE_FIELD: "english"})
+    update = {"content": "Comment écrire les tests de votre API avec pytest"}
+    # Modification concurrente : c'est elle qui recalculera la langue
+    await mock_db.posts.update_one({"_id": previous["_id"]}, {"$set": {"content": "Another edit of the post"}})
+
+    await refresh_search_language(mock_db.posts, previous, update, FIELDS)
+
+    assert (await mock_db.posts.find_one({"_id": previous["_id"]}))[LANGUAGE_FIELD] == "english"
+
+class _StemmedCollection:
+    """Collection dont chaque racinisation trouve des documents différents ($text absent de mongomock)"""
+
+    def __init__(self, matches):
+        self.matches = matches
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        documents = [{"_id": _id} for _id in self.matches[query["$text"]["$language"]]]
+
+        class Cursor:
+            async def to_list(self, length=None):
+                return documents
+        return Cursor()
+
+async def test_ambiguous_search_matches_documents_of_both_languages():
+    collection = _StemmedCollection({"french": [1, 2], "english": [2, 3]})
+
+    match = await text_match(collection, {"is_published": True, **text_filter("tutorials")})
+
+    assert sorted(match["_id"]["$in"]) == [1, 2, 3]
+    assert [query["$text"]["$language"] for query in collection.queries] == ["french", "english"]
+
+async def test_search_in_one_language_keeps_the_query():
+    collection = _StemmedCollection({})
+
+    match = await text_match(collection, {"is_published": True, **text_filter("how to deploy")})
+
+    assert match == {"is_published": True, **text_filter("how to deploy", "english")}
+    assert collection.queries == []
+
+async def test_facet_counts_match_an_ambiguous_search(mongo_db):
+    await reconcile_indexes(mongo_db)
+    for title, language in [("Tutorials for beginners", "english"), ("Les tutorials du débutant", "french")]:
+        await mongo_db.projects.insert_one({
+            "title": title, "description": "", "language": "python", "difficulty": "beginner", "type": "guided",
+            "xp_reward": 100, "estimated_time": "1h", "is_published": True, "created_at": datetime.utcnow(),
+            LANGUAGE_FIELD: language
+        })
+    project_facets_cache.clear()
+    service = ProjectService(mongo_db)
+
+    listed = await service.get_projects(search="tutorial")
+    facets = await service.get_facets(search="tutorial")
+
+    assert sum(bucket.count for bucket in facets.language) == len(listed) == 2
@@ -0,0 +1,45 @@
+import asyncio
+
+from app.core.security import user_cache
+from app.models.messages import ConversationCreate, MessageCreate
+from app.services.message_service import MessageService
+from tests.conftest import CountingDatabase
+
+SENDER = "sender@example.com"
+PEER = "peer@example.com"
+
+async def _conversation(database) -> str:
+    await database.users.insert_many([
+        {"email": email, "username": email.split("@")[0], "full_name": email.upper(), "hashed_password": "x"}
+        for email in (SENDER, PEER)
+    ])
+    conversation = await MessageService(database).create_conversation(
+        ConversationCreate(conversation_type="direct", participants=[PEER]), SENDER
+    )
+    return conversation.id
+
+async def test_send_reads_only_the_membership(mock_db):
+    user_cache.clear()
+    conversation_id = await _conversation(mock_db)
+    service = MessageService(mock_db)
+    await service.send_message(conversation_id, MessageCreate(content="Premier"), SENDER)
+
+    # Expéditeur en cache : ni relecture du message inséré, ni lecture du profil ou des compteurs
+    database = CountingDatabase(mock_db)
+    message = await MessageService(database).send_message(conversation_id, MessageCreate(content="Bonjour"), SENDER)
+
+    assert message.content == "Bonjour"
+    assert dict(database.queries) == {"conversations": 1}
+
+async def test_concurrent_sends_count_every_unread_message(mock_db):
+    conversation_id = await _conversation(mock_db)
+    service = MessageService(mock_db)
+
+    await asyncio.gather(*(
+        service.send_message(conversation_id, MessageCreate(content=f"Message {i}"), SENDER) for i in range(10)
+    ))
+
+    peer_entry = await service.inbox_service.get_entry(conversation_id, PEER)
+    sender_entry = await service.inbox_service.get_entry(conversation_id, SENDER)
+    assert peer_entry["unread_count"] == 10
+    assert sender_entry["unread_count"] == 0
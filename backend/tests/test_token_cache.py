@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import security
+from app.core.security import create_access_token, token_cache, verify_token
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+    token_cache.clear()
+    yield
+    token_cache.clear()
+
+@pytest.fixture
+def decode_calls(monkeypatch):
+    calls = []
+    decode = security.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(security.jwt, "decode", counting_decode)
+    return calls
+
+def test_token_is_decoded_once(decode_calls):
+    token = create_access_token({"sub": "user@example.com"}, timedelta(minutes=30))
+
+    for _ in range(100):
+        token_data = verify_token(token)
+
+    assert token_data.email == "user@example.com"
+    assert len(decode_calls) == 1
+
+def test_cache_entry_expires_with_the_token(decode_calls, monkeypatch):
+    token = create_access_token({"sub": "user@example.com"}, timedelta(seconds=30))
+    verify_token(token)
+
+    # 31 secondes plus tard, l'entrée du cache a expiré avec le token
+    later = security.time.monotonic() + 31
+    monkeypatch.setattr("app.core.cache.time.monotonic", lambda: later)
+    verify_token(token)
+
+    assert len(decode_calls) == 2
+
+def test_invalid_token_is_not_cached(decode_calls):
+    for _ in range(3):
+        with pytest.raises(HTTPException):
+            verify_token("not-a-token")
+
+    assert len(decode_calls) == 3
+    assert token_cache.stats()["size"] == 0
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(token_cache, "max_size", 10)
+    tokens = [create_access_token({"sub": f"user{i}@example.com"}, timedelta(minutes=30)) for i in range(25)]
+
+    for token in tokens:
+        verify_token(token)
+
+    assert token_cache.stats()["size"] == 10
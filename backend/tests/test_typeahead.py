@@ -0,0 +1,85 @@
+import random
+import string
+
+import pytest
+
+from app.api.v1.endpoints.users import update_user_me
+from app.core import typeahead as typeahead_module
+from app.core.realtime import connection_manager
+from app.core.typeahead import TAG, USER, PrefixIndex, typeahead
+from app.models.user import UserUpdate
+from app.services.user_service import UserService
+
+def _random_index(size: int) -> PrefixIndex:
+    generator = random.Random(1)
+    index = PrefixIndex()
+    index.replace({
+        (generator.choice([TAG, USER]), "".join(generator.choices(string.ascii_lowercase, k=generator.randint(3, 12)))):
+            generator.randint(1, 500)
+        for _ in range(size)
+    })
+    return index
+
+def _scanned(index: PrefixIndex, prefix: str, kind=None, monkeypatch=None):
+    """Suggestions calculées en parcourant le tableau, sans les correspondances des préfixes courts"""
+    monkeypatch.setattr(typeahead_module, "SHORT_PREFIX_LENGTH", 0)
+    try:
+        index._cache.clear()
+        return index.suggest(prefix, 10, kind)
+    finally:
+        monkeypatch.undo()
+        index._cache.clear()
+
+def test_short_prefixes_follow_every_change(monkeypatch):
+    index = _random_index(2000)
+    index.add(TAG, "Python", 900)
+    index.add(TAG, "python", 300)
+    index.add(TAG, "pythön", 1)
+
+    for prefix in ["p", "py", "a", "zz"]:
+        for kind in [None, TAG, USER]:
+            assert index.suggest(prefix, 10, kind) == _scanned(index, prefix, kind, monkeypatch)
+    assert index.suggest("py")[0] == (TAG, "Python", 1201)
+
+    index.add(TAG, "Python", -900)
+    assert index.suggest("p") == _scanned(index, "p", monkeypatch=monkeypatch)
+    assert (TAG, "python", 301) in index.suggest("py", 50, TAG)
+
+@pytest.fixture
+def empty_typeahead():
+    typeahead.replace({})
+    yield typeahead
+    typeahead.replace({})
+
+async def _user(database, username: str) -> dict:
+    user = {"email": f"{username}@example.com", "username": username, "full_name": "Utilisateur", "hashed_password": "x",
+            "xp": 0, "level": 1, "badges": [], "completed_projects": []}
+    user["_id"] = (await database.users.insert_one(user)).inserted_id
+    return user
+
+async def test_username_change_through_the_endpoint_moves_the_suggestion(mock_db, empty_typeahead, monkeypatch):
+    async def dispatch_now(channel, event):
+        await connection_manager.dispatch(channel, [event])
+
+    monkeypatch.setattr(connection_manager, "publish", dispatch_now)
+    current_user = await _user(mock_db, "ancien")
+    empty_typeahead.add(USER, "ancien", 3)
+
+    user = await update_user_me(UserUpdate(username="nouveau"), current_user, mock_db)
+
+    assert user.username == "nouveau"
+    assert empty_typeahead.count(USER, "ancien") == 0
+    assert empty_typeahead.count(USER, "nouveau") == 3
+
+async def test_publish_failure_does_not_fail_the_write(mock_db, empty_typeahead, monkeypatch):
+    async def failing_publish(channel, message):
+        raise ConnectionError("broker indisponible")
+
+    monkeypatch.setattr(connection_manager, "publish", failing_publish)
+    current_user = await _user(mock_db, "ancien")
+
+    user = await UserService(mock_db).update_user(str(current_user["_id"]), UserUpdate(username="nouveau"))
+
+    assert user.username == "nouveau"
+    assert (await mock_db.users.find_one({"_id": current_user["_id"]}))["username"] == "nouveau"
+    assert empty_typeahead.count(USER, "nouveau") == 1
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.v1.endpoints.admin import toggle_admin_status
+from app.api.v1.endpoints.users import update_user_me
+from app.core.security import (
+    create_access_token, get_admin_user, get_current_user, token_cache, user_cache, verify_token
+)
+from app.models.user import UserUpdate
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    user_cache.clear()
+    token_cache.clear()
+    yield
+    user_cache.clear()
+    token_cache.clear()
+
+async def _user(database, email: str, **fields) -> dict:
+    user = {"email": email, "username": email.split("@")[0], "full_name": "Utilisateur", "hashed_password": "x",
+            "xp": 0, "level": 1, "badges": [], "completed_projects": [], **fields}
+    user["_id"] = (await database.users.insert_one(user)).inserted_id
+    return user
+
+async def _authenticate(database, email: str) -> dict:
+    token = create_access_token({"sub": email}, timedelta(minutes=30))
+    return await get_current_user(verify_token(token), database)
+
+async def test_profile_update_evicts_the_cached_user(mock_db):
+    await _user(mock_db, "user@example.com")
+    current_user = await _authenticate(mock_db, "user@example.com")
+
+    await update_user_me(UserUpdate(full_name="Nouveau nom"), current_user, mock_db)
+
+    assert (await _authenticate(mock_db, "user@example.com"))["full_name"] == "Nouveau nom"
+
+async def test_token_of_a_changed_email_no_longer_authenticates(mock_db):
+    await _user(mock_db, "user@example.com")
+    current_user = await _authenticate(mock_db, "user@example.com")
+
+    await update_user_me(UserUpdate(email="new@example.com"), current_user, mock_db)
+
+    with pytest.raises(HTTPException) as error:
+        await _authenticate(mock_db, "user@example.com")
+    assert error.value.status_code == 404
+
+async def test_revoked_admin_loses_access_immediately(mock_db):
+    admin = await _user(mock_db, "admin@example.com", is_admin=True)
+    demoted = await _user(mock_db, "demoted@example.com", is_admin=True)
+    assert (await _authenticate(mock_db, "demoted@example.com"))["is_admin"]
+
+    await toggle_admin_status(str(demoted["_id"]), admin, mock_db)
+
+    with pytest.raises(HTTPException) as error:
+        await get_admin_user(await _authenticate(mock_db, "demoted@example.com"))
+    assert error.value.status_code == 403
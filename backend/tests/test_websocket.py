@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.database import get_database
+from app.core.realtime import chat_channel, connection_manager
+from app.core.security import create_access_token
+from app.main import app
+
+USER = "user@example.com"
+
+@pytest.fixture
+def client(mock_db):
+    app.dependency_overrides[get_database] = lambda: mock_db
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_database, None)
+
+@pytest.fixture
+def published(monkeypatch):
+    """Canaux sur lesquels un événement est publié"""
+    channels = []
+    publish = connection_manager.publish
+
+    async def recording_publish(channel, event):
+        channels.append(channel)
+        await publish(channel, event)
+
+    monkeypatch.setattr(connection_manager, "publish", recording_publish)
+    return channels
+
+def _conversation(database, *participants: str) -> str:
+    async def insert():
+        result = await database.conversations.insert_one({
+            "participants": list(participants), "conversation_type": "direct", "created_at": datetime.utcnow()
+        })
+        return str(result.inserted_id)
+    return asyncio.run(insert())
+
+def _token(email: str, **claims) -> str:
+    return create_access_token({"sub": email, **claims}, timedelta(minutes=30))
+
+@pytest.mark.parametrize("token", ["not-a-token", _token("guest@codeswitch.com", type="guest")])
+def test_connection_without_a_user_token_is_rejected(client, token):
+    with pytest.raises(WebSocketDisconnect) as error:
+        with client.websocket_connect(f"/api/v1/messages/ws?token={token}") as websocket:
+            websocket.receive_text()
+    assert error.value.code == 1008
+
+@pytest.mark.parametrize("event_type", ["typing", "read"])
+def test_signals_are_relayed_only_to_the_user_conversations(client, mock_db, published, event_type):
+    own = _conversation(mock_db, USER, "peer@example.com")
+    other = _conversation(mock_db, "alice@example.com", "bob@example.com")
+
+    with client.websocket_connect(f"/api/v1/messages/ws?token={_token(USER)}") as websocket:
+        websocket.send_json({"type": event_type, "conversation_id": other})
+        websocket.send_json({"type": event_type, "conversation_id": own})
+
+        # Seul le signal de sa propre conversation revient à l'utilisateur, abonné à ce canal
+        event = websocket.receive_json()
+        assert (event["type"], event["conversation_id"]) == (event_type, own)
+
+    assert chat_channel(own) in published
+    assert chat_channel(other) not in published